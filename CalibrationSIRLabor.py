@@ -0,0 +1,277 @@
+"""
+--------------------------------------------------------------------------------------
+CalibrationSIRLabor - Calibration of SIRLabor_MP (RM Chile)
+
+Runs the simulation of scenario S0 (SIRLaborMP.LaborEpiRM) over a design of values of the
+parameters B, pA, Ks and Kns (a grid or a Latin hypercube), in a pool of processes, and scores
+each point against the observed weekly cumulative detected cases of the RM (RealDRM.csv) and of
+each comuna (RealDCom.csv):
+pD is estimated as in OutcomeProcessSIRLabor.Detected_Series, as the slope of
+RealDetected=pD*Mean(DetectedSimulated,pD=1) (pDest), and the fit is measured with the NSE of
+the series of the RM and of the weekly increments by comuna.
+Optionally, a point is rejected early (EarlyStop): its simulation stops as soon as the detected cases of
+the RM so far fit the observed ones too badly, and the worker goes on with the next point.
+The outcomes of the simulations are kept in memory (no daily files). Each point is appended to
+the table of results (csv) as soon as it is scored, so an interrupted sweep is resumed by running
+it again: the points already in the table are not simulated again.
+
+Before running, go to the end and check the parameters list.
+Input files 'Data1_MP.csv', 'Data2_MP.csv', 'Policies_MP.csv', 'PolicyRules_MP.csv', 'RealDRM.csv'
+and 'RealDCom.csv' must be located in the same folder, with SIRLaborMP.py.
+-------------------------------------------------------------------------------------
+Includes: classes (DetectedAgg, EarlyStop); functions (design_Grid, design_LHS, score_Detected, score_Point,
+read_Table, Calibration, best_Fits).
+"""
+
+import numpy as np
+import csv
+import os
+import time
+import itertools
+import concurrent.futures
+
+import SIRLaborMP
+
+
+Params = [ 'B', 'pA', 'Ks', 'Kns' ] #calibrated parameters
+Columns = [ 'point' ] + Params + [ 'pD', 'NSE_RM', 'NSE_Com', 'Dead', 'stopped' ] #columns of the table of results
+                                                                              #(stopped: day of early rejection, 0 if none)
+
+
+def design_Grid( values ):
+    """
+    This function returns the points of the full grid of values, a dict with
+    the list of values of each parameter in Params.
+    Returns a list of points (dict parameter: value).
+    """
+    return [ dict( zip( Params, p ) ) for p in itertools.product( *[ values[ name ] for name in Params ] ) ]
+
+
+def design_LHS( bounds, n, seed ):
+    """
+    This function returns n points of a Latin hypercube in bounds, a dict with
+    the interval (low, high) of each parameter in Params: the interval of each
+    parameter is split in n strata of the same length, and each point takes a
+    random value in a different stratum. The design only depends on seed, so an
+    interrupted sweep is resumed with the same points.
+    Returns a list of points (dict parameter: value).
+    """
+    rng = np.random.default_rng( seed )
+    points = [ {} for i in range( n ) ]
+    for name in Params:
+        low, high = bounds[ name ]
+        u = ( rng.permutation( n ) + rng.random( n ) )/n
+        for i in range( n ):
+            points[i][ name ] = float( low + u[i]*( high-low ) )
+    return points
+
+
+class DetectedAgg:
+    #Aggregator of SIRLaborMP.LaborEpiRM: keeps in memory the cumulative detected cases by comuna of each
+    #realization, on the days of the observed weekly series (t=6,13,...)
+
+    def __init__( self, realizations, weeks ):
+        self.Weekly = np.zeros( ( realizations, weeks, 51 ) )
+
+    def add_Day( self, rea, day, m_rea ):
+        pass
+
+    def add_Realization( self, rea, Detected_RM, Mobility ):
+        self.Weekly[ rea ] = Detected_RM[ 6::7 ][ :len( self.Weekly[ rea ] ) ]
+
+
+class EarlyStop:
+    #Monitor of SIRLaborMP.LaborEpiRM for the early rejection of a point: at each weekly checkpoint (t=6,13,...)
+    #from week start on, pD is fitted (pDest) to the detected cases of the RM of the realization so far, and
+    #the simulation is stopped if the NSE of the weeks so far is below threshold, or if pD is above pDmax
+    #(None: no limit), i.e. the simulation does not have enough detected cases even with all of them detected
+    
+    def __init__( self, RealRM, threshold, start=4, pDmax=None ):
+        self.RealRM = RealRM
+        self.threshold = threshold
+        self.start = start
+        self.pDmax = pDmax
+        self.stopped = None #( t, pD, NSE ) when the simulation was stopped
+    
+    def __call__( self, rea, t, Detected_RM ):
+        w = ( t-6 )//7 + 1 #weeks so far
+        if t < 6 or ( t-6 ) % 7 != 0 or w < self.start or w > len( self.RealRM ):
+            return False
+        Sim = np.sum( Detected_RM[ 6:t+1:7 ], axis=1 )
+        pD = SIRLaborMP.pDest( Sim, self.RealRM[ :w ] )
+        NSE_w = SIRLaborMP.NSE( pD*Sim, self.RealRM[ :w ] )
+        if NSE_w < self.threshold or ( self.pDmax != None and pD > self.pDmax ):
+            self.stopped = ( t, pD, NSE_w )
+            return True
+        return False
+
+
+def score_Detected( Weekly, RealRM, RealCom ):
+    """
+    This function scores the simulated detected cases (pD=1) against the real
+    ones.
+    Weekly: cumulative detected cases (realizations, weeks, 51), see DetectedAgg
+    RealRM: observed weekly cumulative detected cases of the RM (weeks)
+    RealCom: observed weekly cumulative detected cases by comuna (weeks, 51)
+    Returns pD (see pDest), the NSE of the series of the RM and the NSE of the
+    weekly increments by comuna (see OutcomeProcessSIRLabor.incrementComuna),
+    with the mean of the realizations times pD.
+    """
+    RMSim = np.mean( np.sum( Weekly, axis=2 ), axis=0 )
+    pD = SIRLaborMP.pDest( RMSim, RealRM )
+    ComSim = pD*np.mean( Weekly, axis=0 )
+    NSE_RM = SIRLaborMP.NSE( pD*RMSim, RealRM )
+    NSE_Com = SIRLaborMP.NSE( np.diff( ComSim, axis=0 ), np.diff( RealCom, axis=0 ) )
+    return pD, NSE_RM, NSE_Com
+
+
+def score_Point( k, point, params ):
+    """
+    This function runs the realizations of point k of the design (dict
+    parameter: value) in the system of the worker process (SIRLaborMP.PoolRM)
+    and returns its row of the table of results (see Columns).
+    params: realizations, RealRM, RealCom, stop (None or ( threshold, start, pDmax ) of EarlyStop)
+    and the other parameters of LaborEpiRM
+    A point rejected early gets the pD and NSE of the RM at the day it was stopped, NSE_Com and Dead nan.
+    """
+    params = dict( params )
+    R = params.pop( 'realizations' )
+    RealRM = params.pop( 'RealRM' )
+    RealCom = params.pop( 'RealCom' )
+    stop = params.pop( 'stop' )
+    Agg = DetectedAgg( R, len( RealRM ) )
+    Monitor = None
+    if stop != None:
+        Monitor = EarlyStop( RealRM, *stop )
+    DeadRM = SIRLaborMP.LaborEpiRM( a=0, b=R, SystRM=SIRLaborMP.PoolRM, saveDead=False, output=3, aggregators=[Agg], monitor=Monitor, **point, **params )
+    row = [ k ] + [ point[ name ] for name in Params ]
+    if Monitor != None and Monitor.stopped != None:
+        t, pD, NSE_RM = Monitor.stopped
+        return row + [ pD, NSE_RM, np.nan, np.nan, t ]
+    pD, NSE_RM, NSE_Com = score_Detected( Agg.Weekly, RealRM, RealCom )
+    return row + [ pD, NSE_RM, NSE_Com, float( np.mean( DeadRM ) ), 0 ]
+
+
+def read_Table( table ):
+    """
+    This function reads the table of results (csv, see Columns), if it exists.
+    Returns a dict (values of Params): row
+    """
+    Rows = {}
+    if os.path.exists( table ):
+        with open( table ) as file:
+            for w in csv.DictReader( file ):
+                row = [ int( w['point'] ) ] + [ float( w.get( name, 0 ) ) for name in Columns[1:] ]
+                Rows[ tuple( row[1:len( Params )+1] ) ] = row
+    return Rows
+
+
+def Calibration( design, table, data1, data2, realdrm, realdcom, realizations=10, tmax=154, Nm=10530, q=0.996, tau0=6.0/24.0, tau1=6.0/24.0, seed=None, backend=2, workers=None, cache=None, policies='Policies_MP.csv', rules='PolicyRules_MP.csv', stop=None ):
+    """
+    Runs realizations of scenario S0 (situation=0, pD=1) at each point of design
+    (see design_Grid, design_LHS) that is not yet in the file table, in a pool
+    of (workers) processes (=1: in this process), and appends its row to table
+    as soon as it is scored (see score_Point).
+    realdrm, realdcom: files of observed weekly cumulative detected cases of
+    the RM and by comuna (RealDRM.csv, RealDCom.csv)
+    seed: base seed of the realizations (the same seeds at all the points)
+    backend, cache: system used by the workers (see SIRLaborMP.init_PoolRM)
+    stop: None (default) or ( threshold, start, pDmax ), early rejection of the points (see EarlyStop);
+    the worker of a rejected point goes on with the next one
+    tmax, Nm, q, tau0, tau1, policies, rules: see SIRLaborMP.LaborEpiRM (tmax must cover the weeks of realdrm,
+    tmax >= 7*weeks, otherwise the calibration is not run)
+    Returns the rows of the table (dict, see read_Table)
+    """
+    RealRM = np.loadtxt( realdrm, delimiter="," )
+    RealCom = np.loadtxt( realdcom, delimiter="," )
+    if tmax < 7*len( RealRM ): #(the week w of the observed series is compared at t=7*w+6)
+        print( "Error: tmax =", tmax, "does not cover the", len( RealRM ), "weeks of", realdrm, "(tmax >=", 7*len( RealRM ), "), the calibration is not run" )
+        return read_Table( table )
+    params = dict( sim='Calib', tmax=tmax, Nm=Nm, pD=1, q=q, tau0=tau0, tau1=tau1, situation=0, seed=seed,
+                   policies=policies, rules=rules, realizations=realizations, RealRM=RealRM, RealCom=RealCom, stop=stop )
+
+    Done = read_Table( table )
+    Todo = [ ( k, point ) for k, point in enumerate( design ) if tuple( point[ name ] for name in Params ) not in Done ]
+    print( "Calibration:", len( design ), "points,", len( design )-len( Todo ), "already in", table )
+
+    new = not os.path.exists( table )
+    with open( table, 'a', newline='' ) as file:
+        writer = csv.writer( file )
+        if new:
+            writer.writerow( Columns )
+        if workers == 1:
+            SIRLaborMP.init_PoolRM( data1, data2, backend, cache )
+            for k, point in Todo:
+                writer.writerow( score_Point( k, point, params ) )
+                file.flush()
+        else:
+            with concurrent.futures.ProcessPoolExecutor( max_workers=workers, initializer=SIRLaborMP.init_PoolRM, initargs=( data1, data2, backend, cache ) ) as pool:
+                jobs = [ pool.submit( score_Point, k, point, params ) for k, point in Todo ]
+                for job in concurrent.futures.as_completed( jobs ):
+                    writer.writerow( job.result() )
+                    file.flush()
+
+    return read_Table( table )
+
+
+def best_Fits( Rows, n=5, by='NSE_RM' ):
+    """
+    This function prints and returns the n rows (see read_Table) with the
+    highest score by (NSE_RM or NSE_Com), among the points not rejected early.
+    """
+    col = Columns.index( by )
+    Full = [ row for row in Rows.values() if row[ -1 ] == 0 ]
+    Best = sorted( Full, key=lambda row: row[ col ], reverse=True )[ :n ]
+    print( ",".join( Columns ) )
+    for row in Best:
+        print( ",".join( str( round( v, 4 ) ) for v in row ) )
+    return Best
+
+
+## Parameters setup for calibration
+
+if __name__ == "__main__":
+
+
+    data1_s='Data1_MP.csv'
+    data2_s='Data2_MP.csv'
+    policies_s='Policies_MP.csv'
+    rules_s='PolicyRules_MP.csv'
+    realdrm_s='RealDRM.csv'   #observed weekly cumulative detected cases, RM (22 weeks)
+    realdcom_s='RealDCom.csv' #observed weekly cumulative detected cases by comuna (22 weeks x 51)
+    cache_s='CacheRM' #folder of the build cache of the system (see SIRLaborMP)
+    table_s='Calibration_S0.csv' #table of results; the sweep is resumed from it (delete it to start again)
+
+    design_s = 1 #=0 grid of values grid_s, =1 Latin hypercube of points_s points in bounds_s
+    grid_s = { 'B':[0.21,0.23,0.25], 'pA':[0.03,0.05,0.07], 'Ks':[0.10], 'Kns':[0.56] }
+    bounds_s = { 'B':(0.15,0.30), 'pA':(0.01,0.10), 'Ks':(0.05,0.30), 'Kns':(0.30,0.80) }
+    points_s = 40
+    seed_design_s = 1 #seed of the Latin hypercube
+
+    realizations_s = 10 #realizations of each point
+    tmax_s = 154
+    Nm_s = 10530
+    q_s = 0.996
+    tau0_s = 6.0/24.0
+    tau1_s = 6.0/24.0
+    seed_s = 1 #base seed of the realizations (the same at all the points)
+    stop_s = ( 0.0, 4, 2.0 ) #early rejection: NSE (RM) threshold, first week checked, maximum pD (None: no early rejection)
+
+    backend_s = 2 #system of the simulations (see SIRLaborMP), =2 counts of agents by type and state (fastest)
+    workers_s = None #number of processes (None: number of cores)
+
+    t1=time.time()
+
+    if design_s == 0:
+        design = design_Grid( grid_s )
+    else:
+        design = design_LHS( bounds_s, points_s, seed_design_s )
+
+    Rows = Calibration( design, table_s, data1_s, data2_s, realdrm_s, realdcom_s, realizations=realizations_s, tmax=tmax_s, Nm=Nm_s, q=q_s, tau0=tau0_s, tau1=tau1_s, seed=seed_s, backend=backend_s, workers=workers_s, cache=cache_s, policies=policies_s, rules=rules_s, stop=stop_s )
+
+    print( "Best fits, RM" )
+    best_Fits( Rows, by='NSE_RM' )
+    print( "Best fits, comunas" )
+    best_Fits( Rows, by='NSE_Com' )
+
+    print ( "End", "processing time seconds",time.time()-t1 )
@@ -8,6 +8,9 @@ This program takes the output files of SIRLabourRM and computes the results
 """
 import numpy as np
 import time
+import os
+import warnings
+import concurrent.futures
 
 
 def pDest( x, y ):
@@ -26,6 +29,190 @@ def pDest( x, y ):
     pDe = pDe1/pDe2
     return pDe   
 
+
+Data2Types = { 'nragt':np.int32, 'CUTh':np.int16, 'comm':np.int8, 'activ':np.int8, 'ident':np.int32, 'age':np.int8,
+               'educ':np.int8, 'jornada':np.int8, 'jobcat':np.int8, 'rama':np.int8, 'telew':np.int8, 'sector':np.int8,
+               'CUTw':np.int16, 'idrph':np.int64, 'income':float, 'forml':np.int8, 'risk':np.int8, 'DailyIncome':float,
+               'WactualizationFactor':float, 'ACTIVOS':np.int8, 'TrabajaEnRM':np.int8, 'Commuter':np.int8, 'group':np.int8,
+               'place':np.int8, 'gender':np.int8 } #dtype of each variable of data2 (see VariablesData2.csv)
+
+Data2Tables = {} #tables already read by readData2 (by file)
+
+
+def readData2( data2 ):
+    """
+    This function reads the file data2 (Data2_MP.csv, variables described in
+    VariablesData2.csv) as a table of records (NumPy structured array), one
+    row for each type of agent (row x: ident x), in the order of the file.
+    Variables are accessed by name, e.g. Y['activ'], with the dtype given
+    in Data2Types (integer, except income, DailyIncome and
+    WactualizationFactor; any other variable is read as float).
+    The file is read once per process; the table is read-only.
+    """
+    key = ( os.path.abspath( data2 ), os.path.getmtime( data2 ) )
+    if key not in Data2Tables:
+        with open( data2 ) as file:
+            names = file.readline().strip().split( ',' )
+        dtype = [ ( name, Data2Types.get( name, float ) ) for name in names ]
+        Y = np.loadtxt( data2, delimiter=",", skiprows=1, dtype=dtype, ndmin=1 )
+        Y.flags.writeable = False
+        Data2Tables[ key ] = Y
+    return Data2Tables[ key ]
+
+
+def add_Rows( acc, index, weights ):
+    """
+    This function adds weights[w] to acc[index[w]] for each row w, in the
+    order of the rows (acc: 1-D array, changed in place), with a single
+    bincount. The result is identical (not only up to rounding) to that of
+    the loop acc[index[w]] += weights[w], since bincount adds in the same
+    order, starting from the values of acc.
+    """
+    n = len( acc )
+    acc[:] = np.bincount( np.concatenate( ( np.arange( n ), index ) ), weights=np.concatenate( ( acc, weights ) ), minlength=n )
+
+
+def sum_Groups( X, groups, n ):
+    """
+    This function returns the sums of X (days x types, or one vector of
+    types) by group, an array days x n. groups is the group (0,...,n-1) of
+    each type, or -1 for the types left out: the aggregation matrix
+    (types x groups) kept as a vector. All the days are summed with a single
+    bincount, adding the types in order, so the sums are identical to those
+    of a loop over the types.
+    """
+    X = np.atleast_2d( X )
+    D = len( X )
+    keep = groups >= 0
+    index = ( n*np.arange( D )[:,None] + groups[ keep ] ).ravel( )
+    return np.bincount( index, weights=X[ :, keep ].ravel( ), minlength=n*D ).reshape( ( D, n ) )
+
+
+DistFiles = {} #binary files S_rea.npy already opened (memory-mapped) by read_Day
+
+
+def read_Day( sim, rea, day ):
+    """
+    This function returns the 19584x9 matrix of realization rea and day (day)
+    of simulation sim, read from the binary file of the realization
+    (S_rea.npy, if the simulation was run with output=1) or else from the
+    text file of the day (S_rea_day.csv).
+    """
+    name = "S"+str(sim)+"_rea_"+str(rea)+".npy"
+    if name not in DistFiles and os.path.exists( name ):
+        DistFiles[name] = np.load( name, mmap_mode="r" )
+    if name in DistFiles:
+        return DistFiles[name][day].astype( float )
+    return np.loadtxt( "S"+str(sim)+"_rea_"+str(rea)+"_day_"+str(day)+".csv", delimiter=",")
+
+
+def read_Days( sim, rea, a, b ):
+    """
+    This function returns the matrices of realization rea and days a,...,b-1
+    of simulation sim, stacked in an array (b-a)x19584x9 (see read_Day).
+    """
+    name = "S"+str(sim)+"_rea_"+str(rea)+".npy"
+    if name not in DistFiles and os.path.exists( name ):
+        DistFiles[name] = np.load( name, mmap_mode="r" )
+    if name in DistFiles:
+        return DistFiles[name][a:b].astype( float )
+    return np.array( [ read_Day( sim, rea, day ) for day in range( a, b ) ] )
+
+
+def add_Days( Agg, rea, day, Out ):
+    #passes to the aggregator Agg the matrices Out of realization rea and days day,...,day+len(Out)-1
+    #(at once if Agg has the method add_Days, otherwise one day at a time)
+    if hasattr( Agg, 'add_Days' ):
+        Agg.add_Days( rea, day, Out )
+    else:
+        for k in range( len( Out ) ):
+            Agg.add_Day( rea, day+k, Out[k] )
+
+
+def replay_Days( Agg, sim, realizations, days ):
+    #passes to the aggregator Agg the matrix of each realization and day of simulation sim,
+    #read from the output files (see read_Day)
+    for day in range( days ):
+        for rea in range( realizations ):
+            Agg.add_Day( rea, day, read_Day( sim, rea, day ) )
+
+
+def read_MeanDays( sim, days, Means=None ):
+    #mean matrices of days 0,...,days-1 (days x 19584 x 9), from Means or the files of Mean_Day (see read_MeanDay)
+    if Means is not None:
+        return Means[ :days ]
+    return np.array( [ read_MeanDay( sim, day ) for day in range( days ) ] )
+
+
+def read_MeanDay( sim, day, Means=None ):
+    #mean matrix of day (day), from the array Means (days x 19584 x 9, see MeanDayAgg) or the files of Mean_Day
+    if Means is not None:
+        return Means[day]
+    if day <= 9:
+        return np.loadtxt("S"+str(sim)+"_P_00"+str(day)+".csv",delimiter=",")
+    elif day >=10 and day <=99:
+        return np.loadtxt("S"+str(sim)+"_P_0"+str(day)+".csv",delimiter=",") 
+    else:
+        return np.loadtxt("S"+str(sim)+"_P_"+str(day)+".csv",delimiter=",") 
+
+
+class MeanDayAgg:
+    """
+    Aggregator of Mean_Day. It receives the matrix (19584x9) of each realization
+    and day (add_Day, in any order) and keeps their sum. finish writes the files
+    SX_P_day (if saveP) and, if data2 is given, the files of Comunas_HealthSeries,
+    LabourSeriesComuna and OD_RM_Day computed from the means in memory.
+    The mean of all days is kept in memory (days x 19584 x 9 floats).
+    """
+    
+    def __init__( self, sim, realizations, days, data2=None, saveP=True ):
+        
+        self.sim = sim
+        self.realizations = realizations
+        self.days = days
+        self.data2 = data2
+        self.saveP = saveP
+        self.Matrix = np.zeros( ( days, 19584, 9 ) )
+        self.Count = np.zeros( days ) #realizations received by day
+        
+    def add_Day( self, rea, day, m_rea ):
+        self.Matrix[day] += m_rea
+        self.Count[day] += 1
+    
+    def add_Days( self, rea, day, Out ):
+        self.Matrix[ day:day+len( Out ) ] += Out
+        self.Count[ day:day+len( Out ) ] += 1
+    
+    def merge( self, Other ):
+        #adds the realizations of Other (same sim and days, other realizations)
+        self.Matrix += Other.Matrix
+        self.Count += Other.Count
+    
+    def get_Means( self ):
+        #means of the realizations received so far (of all of them after the last realization)
+        return self.Matrix/np.maximum( self.Count, 1 )[:,None,None]
+        
+    def finish( self ):
+        
+        Means = self.get_Means( )
+        if self.saveP:
+            for day in range( self.days ):
+                save_MeanDay( self.sim, day, Means[day] )
+        if self.data2 != None:
+            Comunas_HealthSeries( self.sim, self.data2, self.days, Means )
+            LabourSeriesComuna( self.sim, self.data2, self.days, Means )
+            OD_RM_Day( self.sim, self.data2, self.days, Means )
+
+
+def save_MeanDay( sim, day, Mean_day ):
+    if day <=9:
+        np.savetxt("S"+str(sim)+"_P_00"+str(day)+".csv",Mean_day,delimiter=",",fmt="%s")
+    elif day>=10 and day<=99:
+        np.savetxt("S"+str(sim)+"_P_0"+str(day)+".csv",Mean_day,delimiter=",",fmt="%s")
+    else:
+        np.savetxt("S"+str(sim)+"_P_"+str(day)+".csv",Mean_day,delimiter=",",fmt="%s")
+
+
 def Mean_Day( sim, realizations, days ):
     #mean of all realizations for each kind of clone in data2
     #sim = number of simulation
@@ -36,178 +223,423 @@ def Mean_Day( sim, realizations, days ):
     for day in range( days ):
         Matrix_day = np.zeros( ( 19584,9 ) )
         for rea in range( realizations ):
-            m_rea = np.loadtxt( "S"+str(sim)+"_rea_"+str(rea)+"_day_"+str(day)+".csv", delimiter=",")
+            m_rea = read_Day( sim, rea, day )
             Matrix_day = Matrix_day + m_rea
         Mean_day = Matrix_day/float( realizations )
-        if day <=9:
-            np.savetxt("S"+str(sim)+"_P_00"+str(day)+".csv",Mean_day,delimiter=",",fmt="%s")
-        elif day>=10 and day<=99:
-            np.savetxt("S"+str(sim)+"_P_0"+str(day)+".csv",Mean_day,delimiter=",",fmt="%s")
-        else:
-            np.savetxt("S"+str(sim)+"_P_"+str(day)+".csv",Mean_day,delimiter=",",fmt="%s")
+        save_MeanDay( sim, day, Mean_day )
+
+
+def Aggregators( sim, realizations, days, data2, every=10 ):
+    """
+    This function returns the list of aggregators that produce (finish) the
+    files of Mean_Day, Comunas_HealthSeries, LabourSeriesComuna, OD_RM_Day,
+    SeriesRM, Atkinson and Production, to be passed to LaborEpiRM (aggregators)
+    for realizations 0,...,realizations-1, and the online summaries of the
+    series of SeriesRM (SummaryRMAgg), written every (every) realizations
+    while they are run (every=None: only by finish).
+    """
+    return [ MeanDayAgg( sim, realizations, days, data2 ), SeriesRMAgg( sim, realizations, days, data2 ),
+            AtkinsonAgg( sim, realizations, days, data2 ), ProductionAgg( sim, realizations, days, data2 ),
+            SummaryRMAgg( sim, realizations, days, data2, every ) ]
+
+
+class SeriesRMAgg:
+    """
+    Aggregator of SeriesRM. It receives the matrix (19584x9) of each realization
+    and day (add_Day, in any order) and writes the files SX_MH_uv and SX_ML_uvw
+    of SeriesRM (finish).
+    Can be passed to LaborEpiRM (aggregators), so the daily files are not needed.
+    """
+    Series = [ 'RM_S', 'RM_I', 'RM_R', 'RM_Cum', 'RM_NR', 'RM_PTR', 'RM_PR', 'RM_TR', 'RM_PMR', 'RM_NRR', 'RM_PTWP', 'RM_NWP',
+               'WRM_NR', 'WRM_PTR', 'WRM_PR', 'WRM_TR', 'WRM_NRR', 'WRM_PTWP', 'WRM_NWP' ] #series (days x realizations)
+    
+    def __init__( self, sim, realizations, days, data2 ):
+        
+        self.sim = sim
+        Y = readData2( data2 ) #file with data for each group of clones identified with i.ident
+    
+        self.RM_S = np.zeros( ( days, realizations ) )
+        self.RM_I = np.zeros( ( days, realizations ) )
+        self.RM_R = np.zeros( ( days, realizations ) )
+        self.RM_Cum = np.zeros( ( days, realizations ) )
+        self.RM_S_summary = np.zeros( ( days, 3 ) )
+        self.RM_I_summary = np.zeros( ( days, 3 ) )
+        self.RM_R_summary = np.zeros( ( days, 3 ) )
+        self.RM_Cum_summary = np.zeros( ( days, 3 ) )
+    
+        self.RM_NR = np.zeros( ( days, realizations ) ) #residentes no trabajan
+        self.RM_PTR = np.zeros( ( days, realizations ) ) #residentes trabajan
+        self.RM_PR = np.zeros( ( days, realizations ) ) #residentes trabajan presencialmente
+        self.RM_TR = np.zeros( ( days, realizations ) ) #residentes teletrabajan
+        self.RM_PMR = np.zeros( ( days, realizations ) ) #residentes trabajan presencialmente y se movilizan
+        self.RM_NRR = np.zeros( ( days, realizations ) ) #residentes no trabajan y están en riesgo de no percibir ingreso
+        self.RM_PTWP = np.zeros( ( days, realizations ) ) #trabajan, con lugar de trabajo en la RM (excluye comm=3)
+        self.RM_NWP = np.zeros( ( days, realizations ) ) #no trabajan, con lugar de trabajo en la RM (excluye comm=3)
+    
+        self.WRM_NR = np.zeros( ( days, realizations ) ) #W residentes no trabajan
+        self.WRM_PTR = np.zeros( ( days, realizations ) ) #W residentes trabajan
+        self.WRM_PR = np.zeros( ( days, realizations ) ) #W residentes trabajan presencialmente
+        self.WRM_TR = np.zeros( ( days, realizations ) ) #W residentes teletrabajan
+        self.WRM_NRR = np.zeros( ( days, realizations ) ) #W residentes no trabajan y están en riesgo de no percibir ingreso
+        self.WRM_PTWP = np.zeros( ( days, realizations ) ) #W trabajan, con lugar de trabajo en la RM (excluye comm=3)
+        self.WRM_NWP = np.zeros( ( days, realizations ) ) #W no trabajan, con lugar de trabajo en la RM (excluye comm=3)
+    
+        self.Activos = Y['ACTIVOS'].astype( float )
+        self.W = Y['DailyIncome']
+        self.Risk = Y['risk'].astype( float )
+        self.WorkInRM = Y['TrabajaEnRM'].astype( float )
+        self.Commuter = Y['Commuter'].astype( float )
+        Nragt = Y['nragt'].astype( float )
+        self.TotalLRes = sum(Nragt*self.Activos*15)
+        self.TotalWRes = sum(Nragt*self.Activos*self.W*15)
+        self.TotalLWP = sum(Nragt*self.Activos*self.WorkInRM*15)
+        self.TotalWWP = sum(Nragt*self.Activos*self.WorkInRM*self.W*15)
+    
+    def add_Day( self, rea, day, m_rea ):
+        for name, value in self.series_Day( m_rea ).items( ):
+            getattr( self, name )[day][rea] += value
+    
+    def series_Day( self, m_rea ):
+        #values of the series (Series) of the matrix m_rea of a realization and day
+        m_rea_sum = np.sum( m_rea, axis = 0 )
+        S_dr = (m_rea_sum[0]+m_rea_sum[3]+m_rea_sum[6])*15
+        I_dr = (m_rea_sum[1]+m_rea_sum[4]+m_rea_sum[7])*15
+        R_dr = (m_rea_sum[2]+m_rea_sum[5]+m_rea_sum[8])*15
+    
+        N = np.sum(m_rea[:,0:3],axis=1)*self.Activos*15
+        P = np.sum(m_rea[:,3:6],axis=1)*self.Activos*15
+        T = np.sum(m_rea[:,6:9],axis=1)*self.Activos*15
+        PT = P + T
+        PM = P*self.Commuter
+        NR = N*self.Risk
+        PTWP = PT*self.WorkInRM
+        NWP = N*self.WorkInRM
+    
+    
+    
+        N_dr = sum(N)
+        P_dr = sum(P)
+        T_dr = sum(T)
+        PT_dr = sum(PT)
+    
+        PM_dr = sum(PM)
+        NR_dr = sum(NR)
+        PTWP_dr = sum(PTWP)
+        NWP_dr = sum(NWP)
+    
+        WN_dr = sum(N*self.W)
+        WP_dr = sum(P*self.W)
+        WT_dr = sum(T*self.W)
+        WPT_dr = WP_dr + WT_dr
+        WNR_dr = sum(NR*self.W)
+        WPTWP_dr = sum( PTWP*self.W )
+        WNWP_dr = sum( NWP*self.W )
+    
+        return { 'RM_S': S_dr, 'RM_I': I_dr, 'RM_R': R_dr, 'RM_Cum': I_dr+R_dr,
+                 'RM_NR': N_dr, 'RM_PTR': PT_dr, 'RM_PR': P_dr, 'RM_TR': T_dr, 'RM_PMR': PM_dr, 'RM_NRR': NR_dr,
+                 'RM_PTWP': PTWP_dr, 'RM_NWP': NWP_dr,
+                 'WRM_NR': WN_dr, 'WRM_PTR': WPT_dr, 'WRM_PR': WP_dr, 'WRM_TR': WT_dr, 'WRM_NRR': WNR_dr,
+                 'WRM_PTWP': WPTWP_dr, 'WRM_NWP': WNWP_dr }
+    
+    def merge( self, Other ):
+        #adds the realizations of Other (same sim and days, other realizations)
+        for name in self.Series:
+            getattr( self, name )[:] += getattr( Other, name )
+    
+    def finish( self ):
+        
+        self.RM_S_summary[:,0] = np.mean( self.RM_S, axis= 1 )
+        self.RM_S_summary[:,1] = np.percentile( self.RM_S, 5, axis= 1 )
+        self.RM_S_summary[:,2] = np.percentile( self.RM_S, 95, axis= 1 )
+        self.RM_I_summary[:,0] = np.mean( self.RM_I, axis= 1 )
+        self.RM_I_summary[:,1] = np.percentile( self.RM_I, 5, axis= 1 )
+        self.RM_I_summary[:,2] = np.percentile( self.RM_I, 95, axis= 1 )
+        self.RM_R_summary[:,0] = np.mean( self.RM_R, axis= 1 )
+        self.RM_R_summary[:,1] = np.percentile( self.RM_R, 5, axis= 1 )
+        self.RM_R_summary[:,2] = np.percentile( self.RM_R, 95, axis= 1 )
+        self.RM_Cum_summary[:,0] = np.mean( self.RM_Cum, axis= 1 )
+        self.RM_Cum_summary[:,1] = np.percentile( self.RM_Cum, 5, axis= 1 )
+        self.RM_Cum_summary[:,2] = np.percentile( self.RM_Cum, 95, axis= 1 )
+    
+    
+        np.savetxt("S"+str(self.sim)+"_MH_00.csv",self.RM_S,delimiter=",",fmt="%s")
+        np.savetxt("S"+str(self.sim)+"_MH_10.csv",self.RM_I,delimiter=",",fmt="%s")
+        np.savetxt("S"+str(self.sim)+"_MH_20.csv",self.RM_R,delimiter=",",fmt="%s")
+        np.savetxt("S"+str(self.sim)+"_MH_30.csv",self.RM_Cum,delimiter=",",fmt="%s")
+        np.savetxt("S"+str(self.sim)+"_MH_01.csv",self.RM_S_summary,delimiter=",",fmt="%s")
+        np.savetxt("S"+str(self.sim)+"_MH_11.csv",self.RM_I_summary,delimiter=",",fmt="%s")
+        np.savetxt("S"+str(self.sim)+"_MH_21.csv",self.RM_R_summary,delimiter=",",fmt="%s")
+        np.savetxt("S"+str(self.sim)+"_MH_31.csv",self.RM_Cum_summary,delimiter=",",fmt="%s")
+    
+        np.savetxt("S"+str(self.sim)+"_ML_"+str(0)+str(1)+str(0)+".csv", self.RM_NR, delimiter=",",fmt="%s")
+        np.savetxt("S"+str(self.sim)+"_ML_"+str(0)+str(0)+str(0)+".csv", self.RM_PTR, delimiter=",",fmt="%s")
+        np.savetxt("S"+str(self.sim)+"_ML_"+str(0)+str(2)+str(0)+".csv", self.RM_PR, delimiter=",",fmt="%s")
+        np.savetxt("S"+str(self.sim)+"_ML_"+str(0)+str(3)+str(0)+".csv", self.RM_TR, delimiter=",",fmt="%s")
+        np.savetxt("S"+str(self.sim)+"_ML_"+str(0)+str(4)+str(0)+".csv", self.RM_PMR, delimiter=",",fmt="%s")
+        np.savetxt("S"+str(self.sim)+"_ML_"+str(0)+str(5)+str(0)+".csv", self.RM_NRR, delimiter=",",fmt="%s")
+        np.savetxt("S"+str(self.sim)+"_ML_"+str(0)+str(6)+str(0)+".csv", self.RM_PTWP, delimiter=",",fmt="%s")
+        np.savetxt("S"+str(self.sim)+"_ML_"+str(0)+str(7)+str(0)+".csv", self.RM_NWP, delimiter=",",fmt="%s")
+    
+        np.savetxt("S"+str(self.sim)+"_ML_"+str(1)+str(1)+str(0)+".csv", self.WRM_NR, delimiter=",",fmt="%s")
+        np.savetxt("S"+str(self.sim)+"_ML_"+str(1)+str(0)+str(0)+".csv", self.WRM_PTR, delimiter=",",fmt="%s")
+        np.savetxt("S"+str(self.sim)+"_ML_"+str(1)+str(2)+str(0)+".csv", self.WRM_PR, delimiter=",",fmt="%s")
+        np.savetxt("S"+str(self.sim)+"_ML_"+str(1)+str(3)+str(0)+".csv", self.WRM_TR, delimiter=",",fmt="%s")
+        np.savetxt("S"+str(self.sim)+"_ML_"+str(1)+str(5)+str(0)+".csv", self.WRM_NRR, delimiter=",",fmt="%s")
+        np.savetxt("S"+str(self.sim)+"_ML_"+str(1)+str(6)+str(0)+".csv", self.WRM_PTWP, delimiter=",",fmt="%s")
+        np.savetxt("S"+str(self.sim)+"_ML_"+str(1)+str(7)+str(0)+".csv", self.WRM_NWP, delimiter=",",fmt="%s")
+    
+        np.savetxt("S"+str(self.sim)+"_ML_"+str(0)+str(1)+str(1)+".csv", (self.RM_NR/float(self.TotalLRes))*100, delimiter=",",fmt="%s")
+        np.savetxt("S"+str(self.sim)+"_ML_"+str(0)+str(0)+str(1)+".csv", (self.RM_PTR/float(self.TotalLRes))*100, delimiter=",",fmt="%s")
+        np.savetxt("S"+str(self.sim)+"_ML_"+str(0)+str(2)+str(1)+".csv", (self.RM_PR/float(self.TotalLRes))*100, delimiter=",",fmt="%s")
+        np.savetxt("S"+str(self.sim)+"_ML_"+str(0)+str(3)+str(1)+".csv", (self.RM_TR/float(self.TotalLRes))*100, delimiter=",",fmt="%s")
+        np.savetxt("S"+str(self.sim)+"_ML_"+str(0)+str(4)+str(1)+".csv", (self.RM_PMR/float(self.TotalLRes))*100, delimiter=",",fmt="%s")
+        np.savetxt("S"+str(self.sim)+"_ML_"+str(0)+str(5)+str(1)+".csv", (self.RM_NRR/float(self.TotalLRes))*100, delimiter=",",fmt="%s")
+        np.savetxt("S"+str(self.sim)+"_ML_"+str(0)+str(6)+str(1)+".csv", (self.RM_PTWP/float(self.TotalLWP))*100, delimiter=",",fmt="%s")
+        np.savetxt("S"+str(self.sim)+"_ML_"+str(0)+str(7)+str(1)+".csv", (self.RM_NWP/float(self.TotalLWP))*100, delimiter=",",fmt="%s")
+    
+        np.savetxt("S"+str(self.sim)+"_ML_"+str(1)+str(1)+str(1)+".csv", (self.WRM_NR/float(self.TotalWRes))*100, delimiter=",",fmt="%s")
+        np.savetxt("S"+str(self.sim)+"_ML_"+str(1)+str(0)+str(1)+".csv", (self.WRM_PTR/float(self.TotalWRes))*100, delimiter=",",fmt="%s")
+        np.savetxt("S"+str(self.sim)+"_ML_"+str(1)+str(2)+str(1)+".csv", (self.WRM_PR/float(self.TotalWRes))*100, delimiter=",",fmt="%s")
+        np.savetxt("S"+str(self.sim)+"_ML_"+str(1)+str(3)+str(1)+".csv", (self.WRM_TR/float(self.TotalWRes))*100, delimiter=",",fmt="%s")
+        np.savetxt("S"+str(self.sim)+"_ML_"+str(1)+str(5)+str(1)+".csv", (self.WRM_NRR/float(self.TotalWRes))*100, delimiter=",",fmt="%s")
+        np.savetxt("S"+str(self.sim)+"_ML_"+str(1)+str(6)+str(1)+".csv", (self.WRM_PTWP/float(self.TotalWWP))*100, delimiter=",",fmt="%s")
+        np.savetxt("S"+str(self.sim)+"_ML_"+str(1)+str(7)+str(1)+".csv", (self.WRM_NWP/float(self.TotalWWP))*100, delimiter=",",fmt="%s")
+
 
 def SeriesRM( sim, realizations, days, data2 ):
     #returns time series, mean of time series and percentiles of time series
     #of number of agents in each health status
     #files SX_MH_uv for X=sim, u=0,1,2,3 (S,I,R,I+R), v=0 all the realizations, v=1 mean and std
     
-    Y = np.loadtxt( data2, delimiter=",", skiprows=1 ) #file with data for each group of clones identified with i.ident
-    
-    RM_S = np.zeros( ( days, realizations ) )
-    RM_I = np.zeros( ( days, realizations ) )
-    RM_R = np.zeros( ( days, realizations ) )
-    RM_Cum = np.zeros( ( days, realizations ) )
-    RM_S_summary = np.zeros( ( days, 3 ) )
-    RM_I_summary = np.zeros( ( days, 3 ) )
-    RM_R_summary = np.zeros( ( days, 3 ) )
-    RM_Cum_summary = np.zeros( ( days, 3 ) )
-    
-    RM_NR = np.zeros( ( days, realizations ) ) #residentes no trabajan
-    RM_PTR = np.zeros( ( days, realizations ) ) #residentes trabajan
-    RM_PR = np.zeros( ( days, realizations ) ) #residentes trabajan presencialmente
-    RM_TR = np.zeros( ( days, realizations ) ) #residentes teletrabajan
-    RM_PMR = np.zeros( ( days, realizations ) ) #residentes trabajan presencialmente y se movilizan
-    RM_NRR = np.zeros( ( days, realizations ) ) #residentes no trabajan y están en riesgo de no percibir ingreso
-    RM_PTWP = np.zeros( ( days, realizations ) ) #trabajan, con lugar de trabajo en la RM (excluye comm=3)
-    RM_NWP = np.zeros( ( days, realizations ) ) #no trabajan, con lugar de trabajo en la RM (excluye comm=3)
-    
-    WRM_NR = np.zeros( ( days, realizations ) ) #W residentes no trabajan
-    WRM_PTR = np.zeros( ( days, realizations ) ) #W residentes trabajan
-    WRM_PR = np.zeros( ( days, realizations ) ) #W residentes trabajan presencialmente
-    WRM_TR = np.zeros( ( days, realizations ) ) #W residentes teletrabajan
-    WRM_NRR = np.zeros( ( days, realizations ) ) #W residentes no trabajan y están en riesgo de no percibir ingreso
-    WRM_PTWP = np.zeros( ( days, realizations ) ) #W trabajan, con lugar de trabajo en la RM (excluye comm=3)
-    WRM_NWP = np.zeros( ( days, realizations ) ) #W no trabajan, con lugar de trabajo en la RM (excluye comm=3)
-    
-    Activos = Y[:,19]
-    W = Y[:,17]
-    Risk = Y[:,16]
-    WorkInRM = Y[:,20]
-    Commuter = Y[:,21]
-    TotalLRes = sum(Y[:,0]*Activos*15)
-    TotalWRes = sum(Y[:,0]*Activos*W*15)
-    TotalLWP = sum(Y[:,0]*Activos*WorkInRM*15)
-    TotalWWP = sum(Y[:,0]*Activos*WorkInRM*W*15)
-                         
-    for day in range( days ):
-        for rea in range( realizations ):
-            m_rea = np.loadtxt( "S"+str(sim)+"_rea_"+str(rea)+"_day_"+str(day)+".csv", delimiter=",")
-            m_rea_sum = np.sum( m_rea, axis = 0 )
-            S_dr = (m_rea_sum[0]+m_rea_sum[3]+m_rea_sum[6])*15
-            I_dr = (m_rea_sum[1]+m_rea_sum[4]+m_rea_sum[7])*15
-            R_dr = (m_rea_sum[2]+m_rea_sum[5]+m_rea_sum[8])*15
-            RM_S[day][rea] += S_dr
-            RM_I[day][rea] += I_dr
-            RM_R[day][rea] += R_dr
-            RM_Cum[day][rea] += I_dr+R_dr
-            
-            N = np.sum(m_rea[:,0:3],axis=1)*Activos*15
-            P = np.sum(m_rea[:,3:6],axis=1)*Activos*15
-            T = np.sum(m_rea[:,6:9],axis=1)*Activos*15
-            PT = P + T
-            PM = P*Commuter
-            NR = N*Risk
-            PTWP = PT*WorkInRM
-            NWP = N*WorkInRM
-            
-            
-            
-            N_dr = sum(N)
-            P_dr = sum(P)
-            T_dr = sum(T)
-            PT_dr = sum(PT)
-            
-            PM_dr = sum(PM)
-            NR_dr = sum(NR)
-            PTWP_dr = sum(PTWP)
-            NWP_dr = sum(NWP)
-            
-            WN_dr = sum(N*W)
-            WP_dr = sum(P*W)
-            WT_dr = sum(T*W)
-            WPT_dr = WP_dr + WT_dr
-            WNR_dr = sum(NR*W)
-            WPTWP_dr = sum( PTWP*W )
-            WNWP_dr = sum( NWP*W )
-            
-            RM_NR[day][rea] += N_dr
-            RM_PR[day][rea] += P_dr
-            RM_TR[day][rea] += T_dr
-            RM_PTR[day][rea] += PT_dr
-            RM_PMR[day][rea] += PM_dr
-            RM_NRR[day][rea] += NR_dr
-            RM_PTWP[day][rea] += PTWP_dr
-            RM_NWP[day][rea] += NWP_dr
-            
-            WRM_NR[day][rea] += WN_dr
-            WRM_PTR[day][rea] += WPT_dr
-            WRM_PR[day][rea] += WP_dr
-            WRM_TR[day][rea] += WT_dr
-            WRM_NRR[day][rea] += WNR_dr
-            WRM_PTWP[day][rea] += WPTWP_dr
-            WRM_NWP[day][rea] += WNWP_dr
-            
-      
-    RM_S_summary[:,0] = np.mean( RM_S, axis= 1 )
-    RM_S_summary[:,1] = np.percentile( RM_S, 5, axis= 1 )
-    RM_S_summary[:,2] = np.percentile( RM_S, 95, axis= 1 )
-    RM_I_summary[:,0] = np.mean( RM_I, axis= 1 )
-    RM_I_summary[:,1] = np.percentile( RM_I, 5, axis= 1 )
-    RM_I_summary[:,2] = np.percentile( RM_I, 95, axis= 1 )
-    RM_R_summary[:,0] = np.mean( RM_R, axis= 1 )
-    RM_R_summary[:,1] = np.percentile( RM_R, 5, axis= 1 )
-    RM_R_summary[:,2] = np.percentile( RM_R, 95, axis= 1 )
-    RM_Cum_summary[:,0] = np.mean( RM_Cum, axis= 1 )
-    RM_Cum_summary[:,1] = np.percentile( RM_Cum, 5, axis= 1 )
-    RM_Cum_summary[:,2] = np.percentile( RM_Cum, 95, axis= 1 )
-    
-    
-    np.savetxt("S"+str(sim)+"_MH_00.csv",RM_S,delimiter=",",fmt="%s")
-    np.savetxt("S"+str(sim)+"_MH_10.csv",RM_I,delimiter=",",fmt="%s")
-    np.savetxt("S"+str(sim)+"_MH_20.csv",RM_R,delimiter=",",fmt="%s")
-    np.savetxt("S"+str(sim)+"_MH_30.csv",RM_Cum,delimiter=",",fmt="%s")
-    np.savetxt("S"+str(sim)+"_MH_01.csv",RM_S_summary,delimiter=",",fmt="%s")
-    np.savetxt("S"+str(sim)+"_MH_11.csv",RM_I_summary,delimiter=",",fmt="%s")
-    np.savetxt("S"+str(sim)+"_MH_21.csv",RM_R_summary,delimiter=",",fmt="%s")
-    np.savetxt("S"+str(sim)+"_MH_31.csv",RM_Cum_summary,delimiter=",",fmt="%s")
-    
-    np.savetxt("S"+str(sim)+"_ML_"+str(0)+str(1)+str(0)+".csv", RM_NR, delimiter=",",fmt="%s")
-    np.savetxt("S"+str(sim)+"_ML_"+str(0)+str(0)+str(0)+".csv", RM_PTR, delimiter=",",fmt="%s")
-    np.savetxt("S"+str(sim)+"_ML_"+str(0)+str(2)+str(0)+".csv", RM_PR, delimiter=",",fmt="%s")
-    np.savetxt("S"+str(sim)+"_ML_"+str(0)+str(3)+str(0)+".csv", RM_TR, delimiter=",",fmt="%s")
-    np.savetxt("S"+str(sim)+"_ML_"+str(0)+str(4)+str(0)+".csv", RM_PMR, delimiter=",",fmt="%s")
-    np.savetxt("S"+str(sim)+"_ML_"+str(0)+str(5)+str(0)+".csv", RM_NRR, delimiter=",",fmt="%s")
-    np.savetxt("S"+str(sim)+"_ML_"+str(0)+str(6)+str(0)+".csv", RM_PTWP, delimiter=",",fmt="%s")
-    np.savetxt("S"+str(sim)+"_ML_"+str(0)+str(7)+str(0)+".csv", RM_NWP, delimiter=",",fmt="%s")
-    
-    np.savetxt("S"+str(sim)+"_ML_"+str(1)+str(1)+str(0)+".csv", WRM_NR, delimiter=",",fmt="%s")
-    np.savetxt("S"+str(sim)+"_ML_"+str(1)+str(0)+str(0)+".csv", WRM_PTR, delimiter=",",fmt="%s")
-    np.savetxt("S"+str(sim)+"_ML_"+str(1)+str(2)+str(0)+".csv", WRM_PR, delimiter=",",fmt="%s")
-    np.savetxt("S"+str(sim)+"_ML_"+str(1)+str(3)+str(0)+".csv", WRM_TR, delimiter=",",fmt="%s")
-    np.savetxt("S"+str(sim)+"_ML_"+str(1)+str(5)+str(0)+".csv", WRM_NRR, delimiter=",",fmt="%s")
-    np.savetxt("S"+str(sim)+"_ML_"+str(1)+str(6)+str(0)+".csv", WRM_PTWP, delimiter=",",fmt="%s")
-    np.savetxt("S"+str(sim)+"_ML_"+str(1)+str(7)+str(0)+".csv", WRM_NWP, delimiter=",",fmt="%s")
-    
-    np.savetxt("S"+str(sim)+"_ML_"+str(0)+str(1)+str(1)+".csv", (RM_NR/float(TotalLRes))*100, delimiter=",",fmt="%s")
-    np.savetxt("S"+str(sim)+"_ML_"+str(0)+str(0)+str(1)+".csv", (RM_PTR/float(TotalLRes))*100, delimiter=",",fmt="%s")
-    np.savetxt("S"+str(sim)+"_ML_"+str(0)+str(2)+str(1)+".csv", (RM_PR/float(TotalLRes))*100, delimiter=",",fmt="%s")
-    np.savetxt("S"+str(sim)+"_ML_"+str(0)+str(3)+str(1)+".csv", (RM_TR/float(TotalLRes))*100, delimiter=",",fmt="%s")
-    np.savetxt("S"+str(sim)+"_ML_"+str(0)+str(4)+str(1)+".csv", (RM_PMR/float(TotalLRes))*100, delimiter=",",fmt="%s")
-    np.savetxt("S"+str(sim)+"_ML_"+str(0)+str(5)+str(1)+".csv", (RM_NRR/float(TotalLRes))*100, delimiter=",",fmt="%s")
-    np.savetxt("S"+str(sim)+"_ML_"+str(0)+str(6)+str(1)+".csv", (RM_PTWP/float(TotalLWP))*100, delimiter=",",fmt="%s")
-    np.savetxt("S"+str(sim)+"_ML_"+str(0)+str(7)+str(1)+".csv", (RM_NWP/float(TotalLWP))*100, delimiter=",",fmt="%s")
-    
-    np.savetxt("S"+str(sim)+"_ML_"+str(1)+str(1)+str(1)+".csv", (WRM_NR/float(TotalWRes))*100, delimiter=",",fmt="%s")
-    np.savetxt("S"+str(sim)+"_ML_"+str(1)+str(0)+str(1)+".csv", (WRM_PTR/float(TotalWRes))*100, delimiter=",",fmt="%s")
-    np.savetxt("S"+str(sim)+"_ML_"+str(1)+str(2)+str(1)+".csv", (WRM_PR/float(TotalWRes))*100, delimiter=",",fmt="%s")
-    np.savetxt("S"+str(sim)+"_ML_"+str(1)+str(3)+str(1)+".csv", (WRM_TR/float(TotalWRes))*100, delimiter=",",fmt="%s")
-    np.savetxt("S"+str(sim)+"_ML_"+str(1)+str(5)+str(1)+".csv", (WRM_NRR/float(TotalWRes))*100, delimiter=",",fmt="%s")
-    np.savetxt("S"+str(sim)+"_ML_"+str(1)+str(6)+str(1)+".csv", (WRM_PTWP/float(TotalWWP))*100, delimiter=",",fmt="%s")
-    np.savetxt("S"+str(sim)+"_ML_"+str(1)+str(7)+str(1)+".csv", (WRM_NWP/float(TotalWWP))*100, delimiter=",",fmt="%s")
-
-    del(Y,RM_S,RM_I,RM_R,RM_Cum,RM_S_summary,RM_I_summary,RM_R_summary,RM_Cum_summary,
-        RM_NR,RM_PTR,RM_PR,RM_TR,RM_PMR,RM_NRR,RM_PTWP,RM_NWP,
-        WRM_NR,WRM_PTR,WRM_PR,WRM_TR,WRM_NRR,WRM_PTWP,WRM_NWP) 
+    Agg = SeriesRMAgg( sim, realizations, days, data2 )
+    replay_Days( Agg, sim, realizations, days )
+    Agg.finish( )
+
+
+class RunningStats:
+    """
+    Mean and variance of arrays (all of the same shape, e.g. the series of
+    each realization) added one at a time (add), with Welford's algorithm,
+    so that only three numbers by element are kept. The elements that are
+    NaN in an array (e.g. days not received of a realization) are not
+    counted: n is the number of values of each element. Two RunningStats
+    of different realizations are merged with merge (Chan et al. formula).
+    """
+    
+    def __init__( self ):
+        self.n = None #number of values by element
+        self.Mean = None
+        self.M2 = None #sum of squared deviations from the mean
+    
+    def add( self, X ):
+        X = np.asarray( X, dtype=float )
+        if self.n is None:
+            self.n = np.zeros( X.shape )
+            self.Mean = np.zeros( X.shape )
+            self.M2 = np.zeros( X.shape )
+        m = ~np.isnan( X )
+        self.n += m
+        Delta = np.where( m, X - self.Mean, 0.0 )
+        self.Mean += Delta/np.maximum( self.n, 1 )
+        self.M2 += Delta*np.where( m, X - self.Mean, 0.0 )
+    
+    def merge( self, Other ):
+        if Other.n is None:
+            return
+        if self.n is None:
+            self.n, self.Mean, self.M2 = Other.n.copy( ), Other.Mean.copy( ), Other.M2.copy( )
+            return
+        n = self.n + Other.n
+        Delta = Other.Mean - self.Mean
+        self.Mean = self.Mean + Delta*( Other.n/np.maximum( n, 1 ) )
+        self.M2 = self.M2 + Other.M2 + Delta**2*( self.n*Other.n/np.maximum( n, 1 ) )
+        self.n = n
+    
+    def get_Mean( self ):
+        #mean (NaN if n = 0)
+        return np.where( self.n > 0, self.Mean, np.nan )
+    
+    def get_Std( self ):
+        #sample standard deviation (0 if n < 2)
+        return np.sqrt( np.where( self.n > 1, self.M2/np.maximum( self.n-1, 1 ), 0.0 ) )
+
+
+class Reservoir:
+    """
+    Uniform sample (without replacement) of at most size of the arrays added
+    one at a time (add), by reservoir sampling, used for the percentiles of
+    the realizations. While no more than size arrays have been added, all of
+    them are kept and the percentiles are exact. Two reservoirs of different
+    realizations are merged with merge (the number taken from each one is
+    hypergeometric, so the merged sample is uniform). The elements that are
+    NaN in an array are left out of the percentiles of that element.
+    """
+    
+    def __init__( self, size=200, seed=0 ):
+        self.size = size
+        self.n = 0 #arrays added
+        self.Sample = []
+        self.rng = np.random.default_rng( seed )
+    
+    def add( self, X ):
+        self.n += 1
+        if len( self.Sample ) < self.size:
+            self.Sample.append( np.array( X, dtype=float ) )
+        else:
+            j = self.rng.integers( self.n )
+            if j < self.size:
+                self.Sample[j] = np.array( X, dtype=float )
+    
+    def merge( self, Other ):
+        if len( self.Sample ) + len( Other.Sample ) <= self.size:
+            self.Sample = self.Sample + Other.Sample
+        else:
+            k = self.rng.hypergeometric( self.n, Other.n, self.size )
+            A = self.rng.choice( len( self.Sample ), k, replace=False )
+            B = self.rng.choice( len( Other.Sample ), self.size-k, replace=False )
+            self.Sample = [ self.Sample[i] for i in A ] + [ Other.Sample[i] for i in B ]
+        self.n += Other.n
+    
+    def percentile( self, q ):
+        #(NaN for the elements without values)
+        with warnings.catch_warnings( ):
+            warnings.simplefilter( 'ignore', RuntimeWarning )
+            return np.nanpercentile( np.array( self.Sample ), q, axis=0 )
+
+
+class SeriesSummary:
+    """
+    Summary of the realizations of the series names (each realization: an
+    array days x len(names)), kept online: RunningStats (mean, standard
+    deviation) and Reservoir (percentiles 5 and 95). write produces one file
+    per series S_MS_name.csv (days x 5: realizations with that day, mean,
+    std, p5, p95). The days not received of a realization are NaN.
+    The state is saved to a file (save) and the summaries saved in several
+    computers are merged with merge_Summaries.
+    """
+    
+    def __init__( self, names, size=200, seed=0 ):
+        self.names = list( names )
+        self.Stats = RunningStats( )
+        self.Sample = Reservoir( size, seed )
+    
+    def add( self, X ):
+        self.Stats.add( X )
+        self.Sample.add( X )
+    
+    def merge( self, Other ):
+        self.Stats.merge( Other.Stats )
+        self.Sample.merge( Other.Sample )
+    
+    def write( self, sim ):
+        Mean = self.Stats.get_Mean( )
+        Std = self.Stats.get_Std( )
+        P5 = self.Sample.percentile( 5 )
+        P95 = self.Sample.percentile( 95 )
+        for k, name in enumerate( self.names ):
+            Table = np.column_stack( ( self.Stats.n[:,k], Mean[:,k], Std[:,k], P5[:,k], P95[:,k] ) )
+            np.savetxt( "S"+str(sim)+"_MS_"+name+".csv", Table, delimiter=",", fmt="%s" )
+    
+    def save( self, path ):
+        #writes the state to the file path (.npz), written with a temporary name and then renamed
+        tmp = path+".tmp"+str( os.getpid() )+".npz"
+        np.savez( tmp, names=np.array( self.names ), n=self.Stats.n, Mean=self.Stats.Mean, M2=self.Stats.M2,
+                  size=self.Sample.size, seen=self.Sample.n, Sample=np.array( self.Sample.Sample ) )
+        os.replace( tmp, path )
+    
+    def load( self, path ):
+        #restores the state written by save
+        with np.load( path ) as State:
+            self.names = State['names'].tolist( )
+            self.Stats.n = State['n']
+            self.Stats.Mean = State['Mean']
+            self.Stats.M2 = State['M2']
+            self.Sample.size = int( State['size'] )
+            self.Sample.n = int( State['seen'] )
+            self.Sample.Sample = list( State['Sample'] )
+
+
+def merge_Summaries( sim, paths ):
+    """
+    This function merges the summaries of the series of RM saved in the
+    files paths (SX_MS_state.npz of SummaryRMAgg, of different realizations,
+    e.g. run in different computers) and writes the files S_MS_name.csv
+    of simulation sim. Returns the merged SeriesSummary.
+    """
+    Summary = SeriesSummary( [] )
+    for path in paths:
+        Part = SeriesSummary( [] )
+        Part.load( path )
+        Summary.names = Part.names
+        Summary.merge( Part )
+    Summary.write( sim )
+    return Summary
+
+
+class SummaryRMAgg( SeriesRMAgg ):
+    """
+    Online aggregator of the series of SeriesRM (Series). It receives the
+    matrix (19584x9) of each realization and day (add_Day); when all the days
+    of a realization have been received, or at its end (add_Realization, see
+    LaborEpiRM), its series are added to a SeriesSummary and dropped, so the
+    memory does not grow with the number of realizations. A realization that
+    does not receive all the days (e.g. continued from a checkpoint, or
+    stopped by a monitor, see LaborEpiRM) is added with the days received,
+    at its end or by finish, and the other days are not counted. The files S_MS_name.csv and the state SX_MS_state.npz
+    (see merge_Summaries) are written every (every) realizations, so they
+    are available while the simulation is running, and by finish
+    (every=None: only by finish, e.g. in the workers of Process).
+    """
+    
+    def __init__( self, sim, realizations, days, data2, every=10, size=200, seed=0 ):
+        SeriesRMAgg.__init__( self, sim, 1, days, data2 )
+        self.days = days
+        self.every = every
+        self.Summary = SeriesSummary( self.Series, size, seed )
+        self.Open = {} #realization: series of its days received so far (days x len(Series), NaN: not received)
+        self.Left = {} #realization: number of days not received yet
+    
+    def add_Day( self, rea, day, m_rea ):
+        if rea not in self.Open:
+            self.Open[rea] = np.full( ( self.days, len( self.Series ) ), np.nan )
+            self.Left[rea] = self.days
+        values = self.series_Day( m_rea )
+        self.Open[rea][day] = [ values[name] for name in self.Series ]
+        self.Left[rea] -= 1
+        if self.Left[rea] == 0:
+            self.close( rea )
+    
+    def add_Realization( self, rea, Detected_RM, Mobility ):
+        #end of realization rea (see LaborEpiRM): it is added with the days received
+        if rea in self.Open:
+            self.close( rea )
+    
+    def close( self, rea, write=True ):
+        #adds realization rea to the summary (and writes it every (every) realizations)
+        self.Summary.add( self.Open.pop( rea ) )
+        del( self.Left[rea] )
+        if write and self.every != None and self.Summary.Sample.n % self.every == 0:
+            self.write( )
+    
+    def merge( self, Other ):
+        #adds the realizations of Other (other realizations); those not closed in Other are kept open
+        self.Summary.merge( Other.Summary )
+        self.Open.update( Other.Open )
+        self.Left.update( Other.Left )
+    
+    def write( self ):
+        if self.Summary.Sample.n == 0:
+            print( "SummaryRMAgg: no realizations received, the files S"+str(self.sim)+"_MS are not written" )
+            return
+        self.Summary.write( self.sim )
+        self.Summary.save( "S"+str(self.sim)+"_MS_state.npz" )
+    
+    def finish( self ):
+        #the realizations not closed yet (e.g. stopped by a monitor) are added with the days received
+        for rea in sorted( self.Open ):
+            print( "SummaryRMAgg: realization", rea, "incomplete,", self.days-self.Left[rea], "of", self.days, "days added" )
+            self.close( rea, write=False )
+        self.write( )
 
 
 def Detected_Series( sim, realizations, days, RMdata ):
@@ -313,44 +745,23 @@ def incrementComuna( sim, realdatcom ):
         
         
         
-def Comunas_HealthSeries( sim, data2, days ):
+def Comunas_HealthSeries( sim, data2, days, Means=None ):
     #Time series for each comuna of the "stock" of individuals within each health status at each t, and RM
-    #Call after Mean_Day
-    Y = np.loadtxt( data2, delimiter=",", skiprows=1 ) #file with data for each group of clones identified with i.ident
-    rowsY, colsY = Y.shape
-    S_evo = np.zeros( ( days, 51 ) )
-    I_evo = np.zeros( ( days, 51 ) )
-    R_evo = np.zeros( ( days, 51 ) )
-    C_evo = np.zeros( (days, 51 ) )
-    MS_evo = np.zeros( ( days, 1 ) )
-    MI_evo = np.zeros( ( days, 1 ) )
-    MR_evo = np.zeros( ( days, 1 ) )
-    MC_evo = np.zeros( ( days, 1 ) )
+    #Call after Mean_Day (or pass Means, see MeanDayAgg)
+    #All the days are aggregated at once by comuna of residence (see sum_Groups)
+    Y = readData2( data2 ) #file with data for each group of clones identified with i.ident
+    CUTh = Y['CUTh'].astype( np.int64 )
+    RM = np.zeros_like( CUTh )
     
-    for day in range( days ):
-        P = None
-        if day <= 9:
-            P = np.loadtxt("S"+str(sim)+"_P_00"+str(day)+".csv",delimiter=",")
-        elif day >=10 and day <=99:
-            P = np.loadtxt("S"+str(sim)+"_P_0"+str(day)+".csv",delimiter=",") 
-        else:
-            P = np.loadtxt("S"+str(sim)+"_P_"+str(day)+".csv",delimiter=",") 
-        for x in range( rowsY ):
-            CutInd = int(Y[x][1])
-            
-            Sx = (P[x][0]+P[x][3]+P[x][6])*15
-            Ix = (P[x][1]+P[x][4]+P[x][7])*15
-            Rx = (P[x][2]+P[x][5]+P[x][8])*15
-           
-            S_evo[day][CutInd] += Sx
-            I_evo[day][CutInd] += Ix
-            R_evo[day][CutInd] += Rx
-            C_evo[day][CutInd] += Ix + Rx 
-            
-            MS_evo[day][0] += Sx
-            MI_evo[day][0] += Ix
-            MR_evo[day][0] += Rx
-            MC_evo[day][0] += Ix + Rx
+    P = read_MeanDays( sim, days, Means )
+    Sx = (P[:,:,0]+P[:,:,3]+P[:,:,6])*15
+    Ix = (P[:,:,1]+P[:,:,4]+P[:,:,7])*15
+    Rx = (P[:,:,2]+P[:,:,5]+P[:,:,8])*15
+    Cx = Ix + Rx
+    del( P )
+    
+    S_evo, I_evo, R_evo, C_evo = [ sum_Groups( X, CUTh, 51 ) for X in [ Sx, Ix, Rx, Cx ] ]
+    MS_evo, MI_evo, MR_evo, MC_evo = [ sum_Groups( X, RM, 1 ) for X in [ Sx, Ix, Rx, Cx ] ]
         
     np.savetxt("S"+str(sim)+"_CH_"+str(0)+".csv", S_evo, delimiter=",",fmt="%s")
     np.savetxt("S"+str(sim)+"_CH_"+str(1)+".csv", I_evo, delimiter=",",fmt="%s")
@@ -362,98 +773,49 @@ def Comunas_HealthSeries( sim, data2, days ):
     np.savetxt("S"+str(sim)+"_MH_"+str(2)+".csv", MR_evo, delimiter=",",fmt="%s")
     np.savetxt("S"+str(sim)+"_MH_"+str(3)+".csv", MC_evo, delimiter=",",fmt="%s")
             
-    del( Y,S_evo,I_evo,R_evo,MS_evo,MI_evo,MR_evo,C_evo, MC_evo)
+    del( S_evo,I_evo,R_evo,MS_evo,MI_evo,MR_evo,C_evo, MC_evo)
 
 
 
 def Percent_Calculus( matr, vect):
     #matr: matrix of data, vect: array with correspondent column total (it is not a sum, but the total of that case)
-    rowsM, colsM = matr.shape
-    New_matr = np.zeros( (rowsM, colsM) )
-    for x in range( colsM ):
-        for y in range( rowsM ):
-            New_matr[y][x] = ( matr[y][x]/float(vect[x]) )*100
-    return New_matr
+    return ( matr/np.asarray( vect, dtype=float ) )*100
         
     
 
-def LabourSeriesComuna( sim, data2, days ):
+def LabourSeriesComuna( sim, data2, days, Means=None ):
     #Time series by Comuna of all the relevant labour variables, with the exception of Atkinson Index
-    #Call after Mean_Day
-    Y = np.loadtxt( data2, delimiter=",", skiprows=1 ) #file with data for each group of clones identified with i.ident
-    rowsY, colsY = Y.shape
+    #Call after Mean_Day (or pass Means, see MeanDayAgg)
+    #All the days are aggregated at once by comuna (see sum_Groups)
+    Y = readData2( data2 ) #file with data for each group of clones identified with i.ident
+    Activ = Y['activ'] == 1
+    Wage = Y['DailyIncome']
+    Home = np.where( Activ, Y['CUTh'], -1 ) #comuna of residence of the employed
+    Risk = np.where( Activ & ( Y['risk'] == 1 ), Y['CUTh'], -1 ) #worker in risk in the case that she didn't work
+    Mobile = np.where( Activ & np.isin( Y['comm'], [1,2,3] ) & ( Y['jobcat'] != 6 ), Y['CUTh'], -1 ) #excludes jobcat6
+    Work = np.where( Activ & np.isin( Y['comm'], [0,1,2] ), Y['CUTw'], -1 ) #works in the RM (as a proxy of production)
+    
+    P = read_MeanDays( sim, days, Means )
+    Nx = (P[:,:,0]+P[:,:,1]+P[:,:,2])*15
+    PTx = (P[:,:,3]+P[:,:,4]+P[:,:,5]+P[:,:,6]+P[:,:,7]+P[:,:,8])*15
+    Px = (P[:,:,3]+P[:,:,4]+P[:,:,5])*15
+    Tx = (P[:,:,6]+P[:,:,7]+P[:,:,8])*15
+    del( P )
     
     #The following correspond to comuna of residence_then should be used for welfare considerations
-    #People Comunas Residence
-    N_ComR = np.zeros(( days,  51 ) )         #Employed, not working
-    PT_ComR = np.zeros( ( days,  51 ) )       #Employed, working
-    P_ComR = np.zeros( ( days,  51 ) )        #Employed, presentially working
-    T_ComR = np.zeros( ( days,  51 ) )        #Employed, teleworking
-    PM_ComR = np.zeros( ( days,  51 ) )       #Employed, presentially working and moving
-    NR_ComR = np.zeros( ( days,  51 ) )       #Employed, not working, and in "risk": jobcat=1,2,7; or 3,4,5,6 informal sector/home sector
+    #People Comunas Residence: employed not working, working, presentially working, teleworking
+    N_ComR, PT_ComR, P_ComR, T_ComR = [ sum_Groups( X, Home, 51 ) for X in [ Nx, PTx, Px, Tx ] ]
+    PM_ComR = sum_Groups( Px, Mobile, 51 )       #Employed, presentially working and moving
+    NR_ComR = sum_Groups( Nx, Risk, 51 )       #Employed, not working, and in "risk": jobcat=1,2,7; or 3,4,5,6 informal sector/home sector
     #Wages Comunas Residence
-    WN_ComR = np.zeros(( days,  51 ) )         #Employed, not working
-    WPT_ComR = np.zeros( ( days,  51 ) )       #Employed, working
-    WP_ComR = np.zeros( ( days,  51 ) )        #Employed, presentially working
-    WT_ComR = np.zeros( ( days,  51 ) )        #Employed, teleworking
-    WNR_ComR = np.zeros( ( days,  51 ) )       #Employed, not working, and in "risk": jobcat=1,2,7; or 3,4,5,6 informal sector/home sector
+    WN_ComR, WPT_ComR, WP_ComR, WT_ComR = [ sum_Groups( X*Wage, Home, 51 ) for X in [ Nx, PTx, Px, Tx ] ]
+    WNR_ComR = sum_Groups( Nx*Wage, Risk, 51 )
     
     #The following correspond to comuna of WORKPLACE_then should be used AS A PROXY OF PRODUCTION
     #EXCLUDING PEOPLE WORKING OUTSIDE THE RM (COMM==3)
-    #People Comunas WORKPLACE
-    N_ComWP = np.zeros(( days,  51 ) )         #Employed, not working
-    PT_ComWP = np.zeros( ( days,  51 ) )       #Employed, working
-    
-    #Wages Comunas WORKPLACE
-    WN_ComWP = np.zeros(( days,  51 ) )         #Employed, not working
-    WPT_ComWP = np.zeros( ( days,  51 ) )       #Employed, working
-    
-    for day in range( days ):
-        P = None
-        if day <= 9:
-            P = np.loadtxt("S"+str(sim)+"_P_00"+str(day)+".csv",delimiter=",")
-        elif day >=10 and day <=99:
-            P = np.loadtxt("S"+str(sim)+"_P_0"+str(day)+".csv",delimiter=",") 
-        else:
-            P = np.loadtxt("S"+str(sim)+"_P_"+str(day)+".csv",delimiter=",") 
-        for x in range( rowsY ):
-            if int(Y[x][3]) == 1: #activ
-                CutHome = int(Y[x][1])
-                CutWork = int(Y[x][12])
-                Wx = Y[x][17]
-                Nx = ( np.sum( P[x,[0,1,2]]))*15
-                PTx = ( np.sum( P[x,[3,4,5,6,7,8]]))*15
-                Px = ( np.sum( P[x,[3,4,5]]))*15
-                Tx = ( np.sum( P[x,[6,7,8]]))*15
-                #People Comunas Residence
-                N_ComR[day][CutHome] += Nx
-                PT_ComR[day][CutHome] += PTx
-                P_ComR[day][CutHome] += Px
-                T_ComR[day][CutHome] += Tx
-                                
-                #Wages Comunas Residence
-                WN_ComR[day][CutHome] += Nx * Wx
-                WPT_ComR[day][CutHome] += PTx * Wx
-                WP_ComR[day][CutHome] += Px * Wx
-                WT_ComR[day][CutHome] += Tx * Wx
-                
-                #People and income, non working in risk (comunas residence)
-                if (int(Y[x][16])) == 1: #worker in risk in the case that she didn't work
-                    NR_ComR[day][CutHome] += Nx
-                    WNR_ComR[day][CutHome] += Nx * Wx
-                   
-                #Mobility comunas
-                if int(Y[x][2]) in [1,2,3] and int(Y[x][8]) != 6: #excludes jobcat6
-                    PM_ComR[day][CutHome] += Px
-                
-                #As a proxy of production
-                if int(Y[x][2]) in [0,1,2]: #works in the RM
-                    #People
-                    N_ComWP[day][CutWork] += Nx
-                    PT_ComWP[day][CutWork] += PTx
-                    #Wages
-                    WN_ComWP[day][CutWork] += Nx * Wx
-                    WPT_ComWP[day][CutWork] += PTx * Wx
+    #People and wages Comunas WORKPLACE: employed not working, working
+    N_ComWP, PT_ComWP = [ sum_Groups( X, Work, 51 ) for X in [ Nx, PTx ] ]
+    WN_ComWP, WPT_ComWP = [ sum_Groups( X*Wage, Work, 51 ) for X in [ Nx, PTx ] ]
                 
     LComunaR = N_ComR[0]+PT_ComR[0] #Total workers by comuna of residence
     WComunaR = WN_ComR[0]+WPT_ComR[0] #Total daily wages by comuna of residence  
@@ -499,35 +861,25 @@ def LabourSeriesComuna( sim, data2, days ):
         N_ComWP,WN_ComWP,PT_ComWP,WPT_ComWP)
 
         
-def OD_RM_Day( sim, data2, days ):
+def OD_RM_Day( sim, data2, days, Means=None ):
+    
+    #Call after Mean_Day (or pass Means, see MeanDayAgg)
+    #All the days are aggregated at once by pair origin (CUTh), destination (CUTw) (see sum_Groups)
+    Y = readData2( data2 ) #file with data for each group of clones identified with i.ident
+    OD = np.where( ( Y['activ'] == 1 ) & ( Y['comm'] == 2 ), 51*Y['CUTh'].astype( np.int64 )+Y['CUTw'], -1 ) #activ and commuter inside RM
     
-    #Call after Mean_Day
-    Y = np.loadtxt( data2, delimiter=",", skiprows=1 ) #file with data for each group of clones identified with i.ident
-    rowsY, colsY = Y.shape
+    P = read_MeanDays( sim, days, Means )
+    OD_Days = sum_Groups( (P[:,:,3]+P[:,:,4]+P[:,:,5])*15, OD, 51*51 ).reshape( ( days, 51, 51 ) ) #OD matrix per day from RM to RM
+    del( P )
     
     for day in range( days ):
-        OD_Day = np.zeros( ( 51,51 ) )  #OD matrix per day from RM to RM
-        P = None
         if day <= 9:
-            P = np.loadtxt("S"+str(sim)+"_P_00"+str(day)+".csv",delimiter=",")
+            np.savetxt("S"+str(sim)+"_OD_00"+str(day)+".csv", OD_Days[day], delimiter=",",fmt="%s")
         elif day >=10 and day <=99:
-            P = np.loadtxt("S"+str(sim)+"_P_0"+str(day)+".csv",delimiter=",") 
+            np.savetxt("S"+str(sim)+"_OD_0"+str(day)+".csv", OD_Days[day], delimiter=",",fmt="%s")
         else:
-            P = np.loadtxt("S"+str(sim)+"_P_"+str(day)+".csv",delimiter=",") 
-        
-        for x in range( rowsY ):
-            if int(Y[x][3]) == 1 and int(Y[x][2]) in [ 2 ] : #activ and commuter inside RM
-                CUThInd = int(Y[x][1])
-                CUTwInd = int(Y[x][12])
-                Px = ( np.sum( P[x,[3,4,5]]))*15
-                OD_Day[CUThInd][CUTwInd] += Px
-        if day <= 9:
-            np.savetxt("S"+str(sim)+"_OD_00"+str(day)+".csv", OD_Day, delimiter=",",fmt="%s")
-        elif day >=10 and day <=99:
-            np.savetxt("S"+str(sim)+"_OD_0"+str(day)+".csv", OD_Day, delimiter=",",fmt="%s")
-        else:
-            np.savetxt("S"+str(sim)+"_OD_"+str(day)+".csv", OD_Day, delimiter=",",fmt="%s")
-    del(OD_Day)
+            np.savetxt("S"+str(sim)+"_OD_"+str(day)+".csv", OD_Days[day], delimiter=",",fmt="%s")
+    del(OD_Days)
 
 def Strenght_comunas(sim, realizations, days):
     InStrength = np.zeros((days,51))
@@ -559,322 +911,249 @@ def Mobility_Google(sim, realizations, days):
     np.savetxt( "S"+str(sim)+"_MobilityRM.csv",ReasMob,delimiter=",",fmt="%s" )
     del(ReasMob,RMbasic)
     
-def Atkinson( sim, realizations, days, data2 ):
-    #Returns XXX files. Three for RM (Atkinson per day, rea epsilon=0.25,0.5,0.75)
-    #and three for the daily average of Atkinson epsilon 0.25,0.5,0.75 by comuna
+class AtkinsonAgg:
+    """
+    Aggregator of Atkinson. It receives the matrix (19584x9) of each realization
+    and day (add_Day, in any order), or the matrices of several days of a
+    realization (add_Days), and writes the files of Atkinson (finish), for each
+    inequality aversion parameter in epsilons (files SX_u_eee, eee=100*epsilon).
+    """
+    Names = [ 'At', 'Wede', 'WedeP', 'Ut' ] #Atkinson index, WEDE, % WEDE_t/WEDE_0, % Ut_t/Ut_0
+    
+    def __init__( self, sim, realizations, days, data2, epsilons=( 0.25, 0.5, 0.75 ) ):
+        
+        self.sim = sim
+        self.realizations = realizations
+        self.epsilons = list( epsilons )
+        E = len( self.epsilons )
+        self.RM = { name: np.zeros( ( E, days, realizations ) ) for name in self.Names } #by epsilon, day and realization
+        self.Com = { name: np.zeros( ( E, days, 51 ) ) for name in self.Names } #by epsilon, day and comuna (sum of realizations)
+        
+        Y = readData2( data2 ) #file with data for each group of clones identified with i.ident
+        self.Rows = np.flatnonzero( Y['activ'] == 1 )
+        self.CUTh = Y['CUTh'][ self.Rows ].astype( np.int64 )
+        self.Wage = Y['DailyIncome'][ self.Rows ]
+        self.NbrTL = Y['nragt'][ self.Rows ]*15 #(all the clones)
+        self.Risk = Y['risk'][ self.Rows ]
+        self.WPow = np.array( [ self.Wage**(1-eps) for eps in self.epsilons ] ) #W**(1-epsilon), E x rows
+        #sums of NbrTL and NbrTL*W**(1-epsilon) by comuna (0,...,50) and RM (51), the same for all the days
+        self.TL = self.sum_Com( self.NbrTL )
+        self.WTL = np.array( [ self.sum_Com( self.NbrTL*WPow ) for WPow in self.WPow ] )
+    
+    def sum_Com( self, X ):
+        #sums of X (days x rows, or rows) by comuna (0,...,50) and RM (51), see sum_Groups
+        return np.hstack( ( sum_Groups( X, self.CUTh, 51 ), sum_Groups( X, np.zeros_like( self.CUTh ), 1 ) ) )
+    
+    def add_Day( self, rea, day, out_dr ):
+        self.add_Days( rea, day, out_dr[None] )
+    
+    def add_Days( self, rea, day, Out ):
+        #Out: matrices of the days day,...,day+len(Out)-1 of realization rea
+        D = len( Out )
+        Out = Out[ :, self.Rows ]
+        NotW = (Out[:,:,0]+Out[:,:,1]+Out[:,:,2])*15*self.Risk #Number of clones who probably do not perceive income
+        NbrW = self.NbrTL-NotW #number of clones who perceive the daily income
+        TL = self.TL
+        Mean = self.sum_Com( NbrW*self.Wage )/TL
+        for e, eps in enumerate( self.epsilons ):
+            W = self.sum_Com( NbrW*self.WPow[e] )
+            WEDE = (W/TL)**(1.0/(1-eps))
+            WEDETot = (self.WTL[e]/TL)**(1.0/(1-eps))
+            Val = { 'At': 1-(WEDE/Mean), 'Wede': WEDE, 'WedeP': (WEDE/WEDETot)*100, 'Ut': (W/self.WTL[e])*100 }
+            for name in self.Names:
+                self.Com[name][e, day:day+D] += Val[name][:, :51]
+                self.RM[name][e, day:day+D, rea] = Val[name][:, 51]
     
-    RM_Atk025 = np.zeros( ( days,realizations ) )
-    RM_Atk050 = np.zeros( ( days,realizations ) )
-    RM_Atk075 = np.zeros( ( days,realizations ) )
-    RM_WEDE025 = np.zeros( ( days,realizations ) )
-    RM_WEDE050 = np.zeros( ( days,realizations ) )
-    RM_WEDE075 = np.zeros( ( days,realizations ) )
-    RM_WEDE025Perc = np.zeros( ( days,realizations ) ) #% Wede_t/Wede_0
-    RM_WEDE050Perc = np.zeros( ( days,realizations ) )
-    RM_WEDE075Perc = np.zeros( ( days,realizations ) )
-    RM_Ut025 = np.zeros( ( days,realizations ) ) #% Ut_t/Ut_0
-    RM_Ut050 = np.zeros( ( days,realizations ) )
-    RM_Ut075 = np.zeros( ( days,realizations ) )
+    def merge( self, Other ):
+        #adds the realizations of Other (same sim, days and epsilons, other realizations)
+        for name in self.Names:
+            self.RM[name] += Other.RM[name]
+            self.Com[name] += Other.Com[name]
+    
+    def finish( self ):
         
-    Com_Atk025 = np.zeros( ( days,51 ) )
-    Com_Atk050 = np.zeros( ( days,51 ) )
-    Com_Atk075 = np.zeros( ( days,51 ) )
-    Com_WEDE025 = np.zeros( ( days,51 ) )
-    Com_WEDE050 = np.zeros( ( days,51 ) )
-    Com_WEDE075 = np.zeros( ( days,51 ) )
-    Com_WEDE025Perc = np.zeros( ( days,51 ) )
-    Com_WEDE050Perc = np.zeros( ( days,51 ) )
-    Com_WEDE075Perc = np.zeros( ( days,51 ) )
-    Com_Ut025 = np.zeros( ( days,51 ) ) #% Ut_t/Ut_0
-    Com_Ut050 = np.zeros( ( days,51 ) )
-    Com_Ut075 = np.zeros( ( days,51 ) )
-    
-    
-    Y = np.loadtxt( data2, delimiter=",", skiprows=1 ) #file with data for each group of clones identified with i.ident
+        for e, eps in enumerate( self.epsilons ):
+            code = "_"+str( int( round( 100*eps ) ) ).zfill( 3 )+".csv"
+            for name in self.Names:
+                np.savetxt( "S"+str(self.sim)+"_C"+name+code, self.Com[name][e]/float(self.realizations), delimiter=",",fmt="%s" )
+                np.savetxt( "S"+str(self.sim)+"_M"+name+code, self.RM[name][e], delimiter=",",fmt="%s" )
 
-    for rea in range( realizations ):
-        for day in range( days ):
-            m_dr = np.zeros( ( 52, 8) )
-            out_dr = np.loadtxt( "S"+str(sim)+"_rea_"+str(rea)+"_day_"+str(day)+".csv", delimiter=",")
-            for x in range( 19584 ):
-                if int(Y[x][3]) == 1: #activ
-                    Cuthx = int(Y[x][1])
-                    Wx = Y[x][17]
-                    WAt025x = Wx**(1-0.25)
-                    WAt050x = Wx**(1-0.5)
-                    WAt075x = Wx**(1-0.75)
-                    NbrTL = (int(Y[x][0])*15)
-                    NotWx = (out_dr[x][0]+out_dr[x][1]+out_dr[x][2])*15*int(Y[x][16]) #Number of clones who probably do not perceive income
-                    NbrWx = NbrTL-NotWx #number of clones who perceive the daily income
-                    m_dr[Cuthx][0] += NbrTL
-                    m_dr[51][0] += NbrTL
-                    m_dr[Cuthx][1] += NbrWx*Wx
-                    m_dr[51][1] += NbrWx*Wx
-                    m_dr[Cuthx][2] += NbrWx*WAt025x
-                    m_dr[51][2] += NbrWx*WAt025x
-                    m_dr[Cuthx][3] += NbrWx*WAt050x
-                    m_dr[51][3] += NbrWx*WAt050x
-                    m_dr[Cuthx][4] += NbrWx*WAt075x
-                    m_dr[51][4] += NbrWx*WAt075x
-                    m_dr[Cuthx][5] += NbrTL*WAt025x
-                    m_dr[51][5] += NbrTL*WAt025x
-                    m_dr[Cuthx][6] += NbrTL*WAt050x
-                    m_dr[51][6] += NbrTL*WAt050x
-                    m_dr[Cuthx][7] += NbrTL*WAt075x
-                    m_dr[51][7] += NbrTL*WAt075x
-            
-            for y in range( 51 ): #compute comunas WEDE & atkinson index
-                WEDE025y = ((m_dr[y][2]/m_dr[y][0])**(1.0/(1-0.25)))
-                WEDE050y = ((m_dr[y][3]/m_dr[y][0])**(1.0/(1-0.50)))
-                WEDE075y = ((m_dr[y][4]/m_dr[y][0])**(1.0/(1-0.75)))
-                WEDETot025y = ((m_dr[y][5]/m_dr[y][0])**(1.0/(1-0.25)))
-                WEDETot050y = ((m_dr[y][6]/m_dr[y][0])**(1.0/(1-0.50)))
-                WEDETot075y = ((m_dr[y][7]/m_dr[y][0])**(1.0/(1-0.75)))
-                WEDE025Percy = (WEDE025y/WEDETot025y)*100
-                WEDE050Percy = (WEDE050y/WEDETot050y)*100
-                WEDE075Percy = (WEDE075y/WEDETot075y)*100
-                At025y = 1-(WEDE025y/(m_dr[y][1]/m_dr[y][0]))
-                At050y = 1-(WEDE050y/(m_dr[y][1]/m_dr[y][0]))
-                At075y = 1-(WEDE075y/(m_dr[y][1]/m_dr[y][0]))
-                Ut025y = (m_dr[y][2]/m_dr[y][5])*100
-                Ut050y = (m_dr[y][3]/m_dr[y][6])*100
-                Ut075y = (m_dr[y][4]/m_dr[y][7])*100
-                Com_Atk025[day][y] +=  At025y
-                Com_Atk050[day][y] +=  At050y
-                Com_Atk075[day][y] +=  At075y
-                Com_WEDE025[day][y] += WEDE025y
-                Com_WEDE050[day][y] += WEDE050y
-                Com_WEDE075[day][y] += WEDE075y
-                Com_WEDE025Perc[day][y] += WEDE025Percy
-                Com_WEDE050Perc[day][y] += WEDE050Percy
-                Com_WEDE075Perc[day][y] += WEDE075Percy    
-                Com_Ut025[day][y] += Ut025y
-                Com_Ut050[day][y] += Ut050y
-                Com_Ut075[day][y] += Ut075y
-            
-            RM_WEDE025dr = ((m_dr[51][2]/m_dr[51][0])**(1.0/(1-0.25)))
-            RM_WEDE050dr = ((m_dr[51][3]/m_dr[51][0])**(1.0/(1-0.50)))
-            RM_WEDE075dr = ((m_dr[51][4]/m_dr[51][0])**(1.0/(1-0.75)))
-            RM_WEDE025T = ((m_dr[51][5]/m_dr[51][0])**(1.0/(1-0.25)))
-            RM_WEDE050T = ((m_dr[51][6]/m_dr[51][0])**(1.0/(1-0.50)))
-            RM_WEDE075T = ((m_dr[51][7]/m_dr[51][0])**(1.0/(1-0.75)))
-            RM_Atk025[day][rea] = 1-( RM_WEDE025dr/(m_dr[51][1]/m_dr[51][0]))        
-            RM_Atk050[day][rea] = 1-( RM_WEDE050dr/(m_dr[51][1]/m_dr[51][0]))
-            RM_Atk075[day][rea] = 1-( RM_WEDE075dr/(m_dr[51][1]/m_dr[51][0]))
-            RM_Ut025dr = (m_dr[51][2]/m_dr[51][5])*100
-            RM_Ut050dr = (m_dr[51][3]/m_dr[51][6])*100
-            RM_Ut075dr = (m_dr[51][4]/m_dr[51][7])*100
-            RM_WEDE025[day][rea] = RM_WEDE025dr
-            RM_WEDE050[day][rea] = RM_WEDE050dr
-            RM_WEDE075[day][rea] = RM_WEDE075dr
-            RM_WEDE025Perc[day][rea] = ( RM_WEDE025dr/RM_WEDE025T )*100
-            RM_WEDE050Perc[day][rea] = ( RM_WEDE050dr/RM_WEDE050T )*100
-            RM_WEDE075Perc[day][rea] = ( RM_WEDE075dr/RM_WEDE075T )*100
-            RM_Ut025[day][rea] = RM_Ut025dr 
-            RM_Ut050[day][rea] = RM_Ut050dr
-            RM_Ut075[day][rea] = RM_Ut075dr
-            
-    Com_Atk025 = Com_Atk025/float(realizations)
-    Com_Atk050 = Com_Atk050/float(realizations)
-    Com_Atk075 = Com_Atk075/float(realizations)
-    Com_WEDE025 = Com_WEDE025/float(realizations)
-    Com_WEDE050 = Com_WEDE050/float(realizations)
-    Com_WEDE075 = Com_WEDE075/float(realizations)
-    Com_WEDE025Perc = Com_WEDE025Perc/float(realizations)
-    Com_WEDE050Perc = Com_WEDE050Perc/float(realizations)
-    Com_WEDE075Perc = Com_WEDE075Perc/float(realizations)
-    Com_Ut025 = Com_Ut025/float(realizations)
-    Com_Ut050 = Com_Ut050/float(realizations)
-    Com_Ut075 = Com_Ut075/float(realizations) 
-    
-    np.savetxt( "S"+str(sim)+"_CAt_025.csv",Com_Atk025,delimiter=",",fmt="%s" )
-    np.savetxt( "S"+str(sim)+"_CAt_050.csv",Com_Atk050,delimiter=",",fmt="%s" )
-    np.savetxt( "S"+str(sim)+"_CAt_075.csv",Com_Atk075,delimiter=",",fmt="%s" )
-    np.savetxt( "S"+str(sim)+"_CWede_025.csv",Com_WEDE025,delimiter=",",fmt="%s" )
-    np.savetxt( "S"+str(sim)+"_CWede_050.csv",Com_WEDE050,delimiter=",",fmt="%s" )
-    np.savetxt( "S"+str(sim)+"_CWede_075.csv",Com_WEDE075,delimiter=",",fmt="%s" )
-    np.savetxt( "S"+str(sim)+"_CWedeP_025.csv",Com_WEDE025Perc,delimiter=",",fmt="%s" )
-    np.savetxt( "S"+str(sim)+"_CWedeP_050.csv",Com_WEDE050Perc,delimiter=",",fmt="%s" )
-    np.savetxt( "S"+str(sim)+"_CWedeP_075.csv",Com_WEDE075Perc,delimiter=",",fmt="%s" )
-    np.savetxt( "S"+str(sim)+"_CUt_025.csv",Com_Ut025,delimiter=",",fmt="%s" )
-    np.savetxt( "S"+str(sim)+"_CUt_050.csv",Com_Ut050,delimiter=",",fmt="%s" )
-    np.savetxt( "S"+str(sim)+"_CUt_075.csv",Com_Ut075,delimiter=",",fmt="%s" )
-    np.savetxt( "S"+str(sim)+"_MAt_025.csv",RM_Atk025,delimiter=",",fmt="%s" )
-    np.savetxt( "S"+str(sim)+"_MAt_050.csv",RM_Atk050,delimiter=",",fmt="%s" )
-    np.savetxt( "S"+str(sim)+"_MAt_075.csv",RM_Atk075,delimiter=",",fmt="%s" )
-    np.savetxt( "S"+str(sim)+"_MWede_025.csv",RM_WEDE025,delimiter=",",fmt="%s" )
-    np.savetxt( "S"+str(sim)+"_MWede_050.csv",RM_WEDE050,delimiter=",",fmt="%s" )
-    np.savetxt( "S"+str(sim)+"_MWede_075.csv",RM_WEDE075,delimiter=",",fmt="%s" )
-    np.savetxt( "S"+str(sim)+"_MWedeP_025.csv",RM_WEDE025Perc,delimiter=",",fmt="%s" )
-    np.savetxt( "S"+str(sim)+"_MWedeP_050.csv",RM_WEDE050Perc,delimiter=",",fmt="%s" )
-    np.savetxt( "S"+str(sim)+"_MWedeP_075.csv",RM_WEDE075Perc,delimiter=",",fmt="%s" )
-    np.savetxt( "S"+str(sim)+"_MUt_025.csv",RM_Ut025,delimiter=",",fmt="%s" )
-    np.savetxt( "S"+str(sim)+"_MUt_050.csv",RM_Ut050,delimiter=",",fmt="%s" )
-    np.savetxt( "S"+str(sim)+"_MUt_075.csv",RM_Ut075,delimiter=",",fmt="%s" )
-    
-    del(Y,RM_Atk025,RM_Atk050,RM_Atk075,RM_WEDE025,RM_WEDE050,RM_WEDE075,RM_WEDE025Perc,
-        RM_WEDE050Perc,RM_WEDE075Perc,Com_Atk025,Com_Atk050,Com_Atk075,Com_WEDE025,
-        Com_WEDE050,Com_WEDE075,Com_WEDE025Perc,Com_WEDE050Perc,Com_WEDE075Perc)
 
-def Production( sim, realizations, days, data2 ):
-    #Workforce, wages as a proxy of production. Includes only workers working in RM (excludes comm=3)
+def Atkinson( sim, realizations, days, data2, epsilons=( 0.25, 0.5, 0.75 ) ):
+    #Returns XXX files. Three for RM (Atkinson per day, rea epsilon=0.25,0.5,0.75)
+    #and three for the daily average of Atkinson epsilon 0.25,0.5,0.75 by comuna
+    #(one of each for each epsilon in epsilons). The days of each realization are processed in blocks of 28 days
     
-    Y = np.loadtxt( data2, delimiter=",", skiprows=1 ) #file with data for each group of clones identified with i.ident
+    Agg = AtkinsonAgg( sim, realizations, days, data2, epsilons )
+    for rea in range( realizations ):
+        for day in range( 0, days, 28 ):
+            Agg.add_Days( rea, day, read_Days( sim, rea, day, min( day+28, days ) ) )
+    Agg.finish( )
+
+
+class ProductionAgg:
+    """
+    Aggregator of Production. It receives the matrix (19584x9) of each realization
+    and day (add_Day, in any order) and writes the files of Production (finish).
+    """
     
-    #People Comunas WORKPLACE
-    N_ComWP = np.zeros(( days,  51 ) )         #Employed, not working
-    PT_ComWP = np.zeros( ( days,  51 ) )       #Employed, working
+    def __init__( self, sim, realizations, days, data2 ):
+        
+        self.sim = sim
+        self.realizations = realizations
+        Y = readData2( data2 ) #file with data for each group of clones identified with i.ident
+        
+        #Rows of the workers laboring in RM, and the ones that do not work by kind of day (0 weekday,
+        #1 saturday or holidays 40,120,137, 2 sunday or holidays 61,81), by rama; jobcat=6 ("indoor service
+        #workers") do not work on sundays
+        self.Rows = np.flatnonzero( ( Y['ACTIVOS'] == 1 ) & ( Y['TrabajaEnRM'] == 1 ) )
+        self.Wage = Y['DailyIncome'][ self.Rows ]
+        self.CUTw = Y['CUTw'][ self.Rows ].astype( np.int64 )
+        self.Indoor = Y['jobcat'][ self.Rows ] == 6
+        rama = Y['rama'][ self.Rows ]
+        self.Off = [ np.zeros( len( self.Rows ), dtype=bool ),
+                     ~self.Indoor & np.isin( rama, [11,15,16,21] ),
+                     ~self.Indoor & np.isin( rama, [3,6,10,11,12,13,14,15,16,19,20,21] ) ]
     
-    #Wages Comunas WORKPLACE
-    WN_ComWP = np.zeros(( days,  51 ) )         #Employed, not working
-    WPT_ComWP = np.zeros( ( days,  51 ) )       #Employed, working
+        #People Comunas WORKPLACE
+        self.N_ComWP = np.zeros(( days,  51 ) )         #Employed, not working
+        self.PT_ComWP = np.zeros( ( days,  51 ) )       #Employed, working
     
-    #People RM WORKPLACE
-    RM_NWP = np.zeros( ( days, realizations ) ) #Employed, not working (excludes comm=3)
-    RM_PTWP = np.zeros( ( days, realizations ) ) #trabajan, con lugar de trabajo en la RM (excluye comm=3)
+        #Wages Comunas WORKPLACE
+        self.WN_ComWP = np.zeros(( days,  51 ) )         #Employed, not working
+        self.WPT_ComWP = np.zeros( ( days,  51 ) )       #Employed, working
     
-    #Wages RM WORKPLACE
-    WRM_NWP = np.zeros( ( days, realizations ) ) #Employed, not working (excludes comm=3)
-    WRM_PTWP = np.zeros( ( days, realizations ) ) #trabajan, con lugar de trabajo en la RM (excluye comm=3)
+        #People RM WORKPLACE
+        self.RM_NWP = np.zeros( ( days, realizations ) ) #Employed, not working (excludes comm=3)
+        self.RM_PTWP = np.zeros( ( days, realizations ) ) #trabajan, con lugar de trabajo en la RM (excluye comm=3)
     
-    dayweek = 7
+        #Wages RM WORKPLACE
+        self.WRM_NWP = np.zeros( ( days, realizations ) ) #Employed, not working (excludes comm=3)
+        self.WRM_PTWP = np.zeros( ( days, realizations ) ) #trabajan, con lugar de trabajo en la RM (excluye comm=3)
     
-    for day in range( days ):
-        for rea in range( realizations ):
-            m_rea = np.loadtxt( "S"+str(sim)+"_rea_"+str(rea)+"_day_"+str(day)+".csv", delimiter=",")
-            for w in range( 19584 ):
-                activox = int(Y[w][19])
-                workRMx = int(Y[w][20])
-                Wagex = Y[w][17]
-                jobcatx = int(Y[w][8])
-                ramax = int(Y[w][9])
-                Cutwx = int(Y[w][12])
-                if activox == 1 and workRMx == 1: #if agent is a worker laboring in RM
-                    if jobcatx != 6: #if agent is not an "indoor service worker"
-                        if dayweek <= 5 and day not in [40,61,81,120,137]:
-                            Nx = (m_rea[w][0]+ m_rea[w][1]+m_rea[w][2])*15
-                            Tx = (m_rea[w][3]+ m_rea[w][4]+m_rea[w][5]+m_rea[w][6]+ m_rea[w][7]+m_rea[w][8])*15
-                            WNx = Wagex * Nx
-                            WTx = Wagex * Tx
-                            RM_NWP[day][rea] += Nx
-                            RM_PTWP[day][rea] += Tx
-                            WRM_NWP[day][rea] += WNx
-                            WRM_PTWP[day][rea] += WTx
-                            N_ComWP[day][Cutwx] += Nx
-                            PT_ComWP[day][Cutwx] += Tx
-                            WN_ComWP[day][Cutwx] += WNx
-                            WPT_ComWP[day][Cutwx] += WTx
-                        elif dayweek == 6 or ( day in [40,120,137]):
-                            if ramax in [11,15,16,21]: #do not work
-                                Nx = (m_rea[w][0]+ m_rea[w][1]+m_rea[w][2]+m_rea[w][3]+ m_rea[w][4]+m_rea[w][5]+m_rea[w][6]+ m_rea[w][7]+m_rea[w][8])*15
-                                WNx = Wagex * Nx
-                                RM_NWP[day][rea] += Nx
-                                WRM_NWP[day][rea] += WNx
-                                N_ComWP[day][Cutwx] += Nx
-                                WN_ComWP[day][Cutwx] += WNx
-                            else:
-                                Nx = (m_rea[w][0]+ m_rea[w][1]+m_rea[w][2])*15
-                                Tx = (m_rea[w][3]+ m_rea[w][4]+m_rea[w][5]+m_rea[w][6]+ m_rea[w][7]+m_rea[w][8])*15
-                                WNx = Wagex * Nx
-                                WTx = Wagex * Tx
-                                RM_NWP[day][rea] += Nx
-                                RM_PTWP[day][rea] += Tx
-                                WRM_NWP[day][rea] += WNx
-                                WRM_PTWP[day][rea] += WTx
-                                N_ComWP[day][Cutwx] += Nx
-                                PT_ComWP[day][Cutwx] += Tx
-                                WN_ComWP[day][Cutwx] += WNx
-                                WPT_ComWP[day][Cutwx] += WTx
-                        elif dayweek == 7 or ( day in [61,81] ):
-                            if ramax in [3,6,10,11,12,13,14,15,16,19,20,21]: #do not work
-                                Nx = (m_rea[w][0]+ m_rea[w][1]+m_rea[w][2]+m_rea[w][3]+ m_rea[w][4]+m_rea[w][5]+m_rea[w][6]+ m_rea[w][7]+m_rea[w][8])*15
-                                WNx = Wagex * Nx
-                                RM_NWP[day][rea] += Nx
-                                WRM_NWP[day][rea] += WNx
-                                N_ComWP[day][Cutwx] += Nx
-                                WN_ComWP[day][Cutwx] += WNx
-                            else:
-                                Nx = (m_rea[w][0]+ m_rea[w][1]+m_rea[w][2])*15
-                                Tx = (m_rea[w][3]+ m_rea[w][4]+m_rea[w][5]+m_rea[w][6]+ m_rea[w][7]+m_rea[w][8])*15
-                                WNx = Wagex * Nx
-                                WTx = Wagex * Tx
-                                RM_NWP[day][rea] += Nx
-                                RM_PTWP[day][rea] += Tx
-                                WRM_NWP[day][rea] += WNx
-                                WRM_PTWP[day][rea] += WTx
-                                N_ComWP[day][Cutwx] += Nx
-                                PT_ComWP[day][Cutwx] += Tx
-                                WN_ComWP[day][Cutwx] += WNx
-                                WPT_ComWP[day][Cutwx] += WTx
-                        else:
-                            pass
-                    else: #jobcat=6
-                        if dayweek == 7: #do not work
-                            Nx = (m_rea[w][0]+ m_rea[w][1]+m_rea[w][2]+m_rea[w][3]+ m_rea[w][4]+m_rea[w][5]+m_rea[w][6]+ m_rea[w][7]+m_rea[w][8])*15
-                            WNx = Wagex * Nx
-                            RM_NWP[day][rea] += Nx
-                            WRM_NWP[day][rea] += WNx
-                            N_ComWP[day][Cutwx] += Nx
-                            WN_ComWP[day][Cutwx] += WNx
-                        else:
-                            Nx = (m_rea[w][0]+ m_rea[w][1]+m_rea[w][2])*15
-                            Tx = (m_rea[w][3]+ m_rea[w][4]+m_rea[w][5]+m_rea[w][6]+ m_rea[w][7]+m_rea[w][8])*15
-                            WNx = Wagex * Nx
-                            WTx = Wagex * Tx
-                            RM_NWP[day][rea] += Nx
-                            RM_PTWP[day][rea] += Tx
-                            WRM_NWP[day][rea] += WNx
-                            WRM_PTWP[day][rea] += WTx
-                            N_ComWP[day][Cutwx] += Nx
-                            PT_ComWP[day][Cutwx] += Tx
-                            WN_ComWP[day][Cutwx] += WNx
-                            WPT_ComWP[day][Cutwx] += WTx
-                                
+    def add_Day( self, rea, day, m_rea ):
+        dayweek = ( day+6 )%7 + 1 #day 0 is sunday (dayweek 7)
+        if dayweek <= 5 and day not in [40,61,81,120,137]:
+            off = self.Off[0]
+        elif dayweek == 6 or ( day in [40,120,137]):
+            off = self.Off[1]
+        else: #dayweek == 7 or day in [61,81]
+            off = self.Off[2]
         if dayweek == 7:
-            dayweek = 1
-        else:
-            dayweek += 1
-    #Day averages (over 100 realizations) for comunas
-    N_ComWP = N_ComWP/float(realizations)
-    PT_ComWP = PT_ComWP/float(realizations)
-    WN_ComWP = WN_ComWP/float(realizations)
-    WPT_ComWP = WPT_ComWP/float(realizations)
-    #Totals by comuna and RM
-    TotLCom =  N_ComWP + PT_ComWP
-    TotWCom = WN_ComWP + WPT_ComWP
-    TotLRM = RM_NWP + RM_PTWP
-    TotWRM = WRM_NWP + WRM_PTWP 
-    
-    np.savetxt( "S"+str(sim)+"_CL_NoProdNumberPeople.csv", N_ComWP,delimiter=",",fmt="%s" )
-    np.savetxt( "S"+str(sim)+"_CL_ProdNumberPeople.csv", PT_ComWP,delimiter=",",fmt="%s" )
-    np.savetxt( "S"+str(sim)+"_ML_NoProdNumberPeople.csv", RM_NWP,delimiter=",",fmt="%s" )
-    np.savetxt( "S"+str(sim)+"_ML_ProdNumberPeople.csv", RM_PTWP,delimiter=",",fmt="%s" )
-    
-    np.savetxt( "S"+str(sim)+"_CL_NoProdPesosWages.csv", WN_ComWP,delimiter=",",fmt="%s" )
-    np.savetxt( "S"+str(sim)+"_CL_ProdPesosWages.csv", WPT_ComWP,delimiter=",",fmt="%s" )
-    np.savetxt( "S"+str(sim)+"_ML_NoProdPesosWages.csv", WRM_NWP,delimiter=",",fmt="%s" )
-    np.savetxt( "S"+str(sim)+"_ML_ProdPesosWages.csv", WRM_PTWP,delimiter=",",fmt="%s" )
-    
-    
-    np.savetxt( "S"+str(sim)+"_CL_NoProdFracPeople.csv", (N_ComWP/TotLCom)*100,delimiter=",",fmt="%s" )
-    np.savetxt( "S"+str(sim)+"_CL_ProdFracPeople.csv", (PT_ComWP/TotLCom)*100,delimiter=",",fmt="%s" )
-    np.savetxt( "S"+str(sim)+"_ML_NoProdFracPeople.csv", (RM_NWP/TotLRM)*100,delimiter=",",fmt="%s" )
-    np.savetxt( "S"+str(sim)+"_ML_ProdFracPeople.csv", (RM_PTWP/TotLRM)*100,delimiter=",",fmt="%s" )
-    
-    np.savetxt( "S"+str(sim)+"_CL_NoProdFracWages.csv", (WN_ComWP/TotWCom)*100,delimiter=",",fmt="%s" )
-    np.savetxt( "S"+str(sim)+"_CL_ProdFracWages.csv", (WPT_ComWP/TotWCom)*100,delimiter=",",fmt="%s" )
-    np.savetxt( "S"+str(sim)+"_ML_NoProdFracWages.csv", (WRM_NWP/TotWRM)*100,delimiter=",",fmt="%s" )
-    np.savetxt( "S"+str(sim)+"_ML_ProdFracWages.csv", (WRM_PTWP/TotWRM)*100,delimiter=",",fmt="%s" )
-    
-    np.savetxt( "S"+str(sim)+"_CL_CheckComunaPeople.csv", TotLCom,delimiter=",",fmt="%s" )
-    np.savetxt( "S"+str(sim)+"_CL_CheckComunaWages.csv", TotWCom,delimiter=",",fmt="%s" )
-    np.savetxt( "S"+str(sim)+"_ML_CheckRMPeople.csv", TotLRM,delimiter=",",fmt="%s" )
-    np.savetxt( "S"+str(sim)+"_ML_CheckRMWages.csv", TotWRM,delimiter=",",fmt="%s" )
-    
-    del(Y, N_ComWP, PT_ComWP, WN_ComWP, WPT_ComWP, RM_NWP, RM_PTWP, WRM_NWP, WRM_PTWP)
+            off = off | self.Indoor #jobcat=6 do not work
+        m = m_rea[ self.Rows ]
+        N = (m[:,0]+ m[:,1]+m[:,2])*15
+        T = (m[:,3]+ m[:,4]+m[:,5]+m[:,6]+ m[:,7]+m[:,8])*15
+        Nx = np.where( off, (m[:,0]+ m[:,1]+m[:,2]+m[:,3]+ m[:,4]+m[:,5]+m[:,6]+ m[:,7]+m[:,8])*15, N )
+        Tx = np.where( off, 0.0, T )
+        WNx = self.Wage * Nx
+        WTx = self.Wage * Tx
+        RM = np.zeros( len( self.Rows ), dtype=np.int64 )
+        add_Rows( self.RM_NWP[day, rea:rea+1], RM, Nx )
+        add_Rows( self.RM_PTWP[day, rea:rea+1], RM, Tx )
+        add_Rows( self.WRM_NWP[day, rea:rea+1], RM, WNx )
+        add_Rows( self.WRM_PTWP[day, rea:rea+1], RM, WTx )
+        add_Rows( self.N_ComWP[day], self.CUTw, Nx )
+        add_Rows( self.PT_ComWP[day], self.CUTw, Tx )
+        add_Rows( self.WN_ComWP[day], self.CUTw, WNx )
+        add_Rows( self.WPT_ComWP[day], self.CUTw, WTx )
+    
+    def merge( self, Other ):
+        #adds the realizations of Other (same sim and days, other realizations)
+        for name in [ 'N_ComWP', 'PT_ComWP', 'WN_ComWP', 'WPT_ComWP', 'RM_NWP', 'RM_PTWP', 'WRM_NWP', 'WRM_PTWP' ]:
+            getattr( self, name )[:] += getattr( Other, name )
+    
+    def finish( self ):
+        
+        #Day averages (over 100 realizations) for comunas
+        self.N_ComWP = self.N_ComWP/float(self.realizations)
+        self.PT_ComWP = self.PT_ComWP/float(self.realizations)
+        self.WN_ComWP = self.WN_ComWP/float(self.realizations)
+        self.WPT_ComWP = self.WPT_ComWP/float(self.realizations)
+        #Totals by comuna and RM
+        TotLCom =  self.N_ComWP + self.PT_ComWP
+        TotWCom = self.WN_ComWP + self.WPT_ComWP
+        TotLRM = self.RM_NWP + self.RM_PTWP
+        TotWRM = self.WRM_NWP + self.WRM_PTWP 
+    
+        np.savetxt( "S"+str(self.sim)+"_CL_NoProdNumberPeople.csv", self.N_ComWP,delimiter=",",fmt="%s" )
+        np.savetxt( "S"+str(self.sim)+"_CL_ProdNumberPeople.csv", self.PT_ComWP,delimiter=",",fmt="%s" )
+        np.savetxt( "S"+str(self.sim)+"_ML_NoProdNumberPeople.csv", self.RM_NWP,delimiter=",",fmt="%s" )
+        np.savetxt( "S"+str(self.sim)+"_ML_ProdNumberPeople.csv", self.RM_PTWP,delimiter=",",fmt="%s" )
+    
+        np.savetxt( "S"+str(self.sim)+"_CL_NoProdPesosWages.csv", self.WN_ComWP,delimiter=",",fmt="%s" )
+        np.savetxt( "S"+str(self.sim)+"_CL_ProdPesosWages.csv", self.WPT_ComWP,delimiter=",",fmt="%s" )
+        np.savetxt( "S"+str(self.sim)+"_ML_NoProdPesosWages.csv", self.WRM_NWP,delimiter=",",fmt="%s" )
+        np.savetxt( "S"+str(self.sim)+"_ML_ProdPesosWages.csv", self.WRM_PTWP,delimiter=",",fmt="%s" )
+    
+    
+        np.savetxt( "S"+str(self.sim)+"_CL_NoProdFracPeople.csv", (self.N_ComWP/TotLCom)*100,delimiter=",",fmt="%s" )
+        np.savetxt( "S"+str(self.sim)+"_CL_ProdFracPeople.csv", (self.PT_ComWP/TotLCom)*100,delimiter=",",fmt="%s" )
+        np.savetxt( "S"+str(self.sim)+"_ML_NoProdFracPeople.csv", (self.RM_NWP/TotLRM)*100,delimiter=",",fmt="%s" )
+        np.savetxt( "S"+str(self.sim)+"_ML_ProdFracPeople.csv", (self.RM_PTWP/TotLRM)*100,delimiter=",",fmt="%s" )
+    
+        np.savetxt( "S"+str(self.sim)+"_CL_NoProdFracWages.csv", (self.WN_ComWP/TotWCom)*100,delimiter=",",fmt="%s" )
+        np.savetxt( "S"+str(self.sim)+"_CL_ProdFracWages.csv", (self.WPT_ComWP/TotWCom)*100,delimiter=",",fmt="%s" )
+        np.savetxt( "S"+str(self.sim)+"_ML_NoProdFracWages.csv", (self.WRM_NWP/TotWRM)*100,delimiter=",",fmt="%s" )
+        np.savetxt( "S"+str(self.sim)+"_ML_ProdFracWages.csv", (self.WRM_PTWP/TotWRM)*100,delimiter=",",fmt="%s" )
+    
+        np.savetxt( "S"+str(self.sim)+"_CL_CheckComunaPeople.csv", TotLCom,delimiter=",",fmt="%s" )
+        np.savetxt( "S"+str(self.sim)+"_CL_CheckComunaWages.csv", TotWCom,delimiter=",",fmt="%s" )
+        np.savetxt( "S"+str(self.sim)+"_ML_CheckRMPeople.csv", TotLRM,delimiter=",",fmt="%s" )
+        np.savetxt( "S"+str(self.sim)+"_ML_CheckRMWages.csv", TotWRM,delimiter=",",fmt="%s" )
+
+
+def Production( sim, realizations, days, data2 ):
+    #Workforce, wages as a proxy of production. Includes only workers working in RM (excludes comm=3)
+    
+    Agg = ProductionAgg( sim, realizations, days, data2 )
+    replay_Days( Agg, sim, realizations, days )
+    Agg.finish( )
+
+
+def process_Realizations( sim, reas, realizations, days, data2, every=10 ):
+    #aggregators (see Aggregators) of the realizations reas, each one read once, in blocks of 28 days (worker of Process)
+    Aggs = Aggregators( sim, realizations, days, data2, every )
+    for rea in reas:
+        for day in range( 0, days, 28 ):
+            Out = read_Days( sim, rea, day, min( day+28, days ) )
+            for Agg in Aggs:
+                add_Days( Agg, rea, day, Out )
+            del( Out )
+    return Aggs
+
+
+def Process( sim, realizations, days, data2, RMdata=None, workers=1 ):
+    """
+    This function writes all the files of Mean_Day, Comunas_HealthSeries,
+    LabourSeriesComuna, OD_RM_Day, SeriesRM, Atkinson and Production (and of
+    Detected_Series, if RMdata is given) in a single pass over the outcome
+    files of the realizations 0,...,realizations-1 of simulation sim: each
+    matrix of a realization and day is read once, and passed to all the
+    aggregators (see Aggregators).
+    workers > 1: the realizations are split among a pool of processes, each
+    one with its own aggregators, which are merged (Agg.merge) before
+    writing the files (the workers do not write the summaries of
+    SummaryRMAgg while they run: only the merged ones are written).
+    """
+    if workers <= 1:
+        Aggs = process_Realizations( sim, range( realizations ), realizations, days, data2 )
+    else:
+        with concurrent.futures.ProcessPoolExecutor( max_workers=workers ) as pool:
+            jobs = [ pool.submit( process_Realizations, sim, range( k, realizations, workers ), realizations, days, data2, None ) for k in range( workers ) ]
+            Aggs = jobs[0].result( )
+            for job in jobs[1:]:
+                for Agg, Other in zip( Aggs, job.result( ) ):
+                    Agg.merge( Other )
+    for Agg in Aggs:
+        Agg.finish( )
+    if RMdata != None:
+        Detected_Series( sim, realizations, days, RMdata )
     
 #print ("inicio", time.ctime())
 #t1=time.time()
+#Process( sim="001", realizations=100, days=154, data2="Data2_MP.csv", RMdata="RealDRM.csv", workers=4 ) #all the files below, but incrementComuna, Mobility_Google, Strenght_comunas and Detected_Series2
+#print ("finProcess", time.time()-t1)
 #Mean_Day( sim="001", realizations=100, days=154 )
 #print ("finMean", time.time()-t1)
 
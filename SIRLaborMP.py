@@ -18,17 +18,27 @@ All the processes and subprocesses are in this file.
 Version for simulating scenarios S0, S1, S2.
 
 Before running, go to the end and check the parameters list.
-Input files 'Data1_MP.csv', 'Data2_MP.csv' must be located in the same folder.
+Input files 'Data1_MP.csv', 'Data2_MP.csv', 'Policies_MP.csv', 'PolicyRules_MP.csv' must be located
+in the same folder.
 
 -------------------------------------------------------------------------------------
-Includes: classes (Agent, SpatialUnit, SystemRM); special functions (readMyfileRM,
-pDest, NSE); simulation function (LaborEpiRM).
+Includes: classes (Agent, SpatialUnit, SystemRM, ArraySystemRM, CohortSystemRM, ResidentIndex, PolicyTimeline); special
+functions (readMyfileRM, readRulesRM, pDest, NSE, parse_Who); simulation functions (LaborEpiRM, LaborEpiArrayRM,
+LaborEpiCohortRM, LaborEpiPoolRM, LaborEpiBranchRM; checkpoints: save_Checkpoint, load_Checkpoint; RunRM).
 """
 
 import numpy as np
 import random
 import csv
 import time
+import os
+import pickle
+import gzip
+import hashlib
+import tracemalloc
+import concurrent.futures
+
+import OutcomeProcessSIRLabor
 
 
 """
@@ -63,7 +73,7 @@ def readMyfileRM(data):
             else:
                 y=[]
                 for j in range(ncol):
-                    if names[j]== 'name' or names[j]== 'CUTh' or names[j]=='CUTw' or names[j]=='idrph':
+                    if names[j] in ['name','CUTh','CUTw','idrph','event','who','value']:
                         y.append(str(line[j]))
                     else:
                         y.append(float(line[j]))
@@ -76,6 +86,45 @@ def readMyfileRM(data):
     return names,x
 
 
+def readRulesRM( data1 ):
+    """
+    This function reads the confinement rules of each spatial unit in data1
+    (Data1_MP.csv), as the vectorized backends use them, and returns
+    confinrules : matrix (nSU,21), SpatialUnit.confinrules of each SU (by rows)
+    confin7 : array (nSU), SpatialUnit.confin7 of each SU
+    """
+    X,Y=readMyfileRM( data1 )
+    
+    nSU = len( Y )
+    confinrules = np.zeros( ( nSU, 21 ) )
+    confin7 = np.zeros( nSU )
+    for w in Y:
+        confinrules[ int(w[0]) ] = [ 1,1,w[1],w[2],1,0,w[3],w[4],w[5],w[6],1,0,w[7],w[8],1,0,w[9],w[10],w[11],0,0 ]
+        confin7[ int(w[0]) ] = w[12]
+    return confinrules, confin7
+
+
+def conf_Start( conf, kindConf ):
+    """
+    This function returns the conf (array) of agents with conf (array) after a
+    confinement of kind kindConf (=1 comuna; =2 rama; =3 age), with the same
+    rules as Agent.on_Confinement.
+    """
+    if kindConf == 1:
+        return np.where( conf == 0, 1, np.where( conf == 2, 21, conf ) )
+    elif kindConf == 3:
+        return np.where( np.isin( conf, [0,1,2] ), 3, conf )
+    return np.where( conf == 0, kindConf, conf )
+
+
+def conf_End( conf ):
+    """
+    This function returns the conf (array) of agents with conf (array) at the
+    end of a confinement by comuna (1 --> 0, 21 --> 2).
+    """
+    return np.where( conf == 1, 0, np.where( conf == 21, 2, conf ) )
+
+
 def pDest( x, y ):
     """    
     This function regress y=pDe*x
@@ -105,12 +154,164 @@ def NSE( simdata, realdata ):
     return NSEc 
 
 
+def seed_Realization( seed, rea ):
+    """
+    This function returns the seed of realization rea, derived from the base
+    seed of the simulation (seed) and rea. Used to seed random (and NumPy) at
+    the beginning of each realization, so that the realization gives the same
+    outcome whether it is run alone, after other realizations, or in another
+    process or computer.
+    """
+    return int( np.random.SeedSequence( [ seed, rea ] ).generate_state( 1 )[0] )
+
+
+def check_Options( backend, seed, crn, checkpoints=(), restart=None ):
+    """
+    This function checks the options of a simulation that need a seed or a
+    given backend (0 SystemRM, 1 ArraySystemRM, 2 CohortSystemRM): crn requires
+    a seed and backend 1 or 2, checkpoints and restart require backend 1 or 2.
+    It prints an error and returns False if they can not be used, and then the
+    simulation is not run.
+    """
+    if crn and ( seed == None or backend == 0 ):
+        print( "Error: crn requires a seed and backend 1 or 2 (ArraySystemRM, CohortSystemRM), the simulation is not run" )
+        return False
+    if ( len( checkpoints ) > 0 or restart != None ) and backend == 0:
+        print( "Error: checkpoints and restart require backend 1 or 2 (ArraySystemRM, CohortSystemRM), the simulation is not run" )
+        return False
+    return True
+
+
+CacheFormat = 2 #version of the format of the build cache (see cache_Path)
+
+
+def cache_Path( cache, system, data1, data2 ):
+    """
+    This function returns the path of the build cache of system (name of the
+    class, 'SystemRM' or 'ArraySystemRM') created from the files data1 and
+    data2, in the folder cache. The name includes a hash (sha256) of the
+    contents of both files (and CacheFormat), so that a cache is never used
+    with other input data or an older format.
+    """
+    h = hashlib.sha256( str( CacheFormat ).encode() )
+    for data in [ data1, data2 ]:
+        with open( data, 'rb' ) as file:
+            h.update( file.read() )
+    return os.path.join( cache, system+"_"+h.hexdigest()[:16] )
+
+
+def checkpoint_Path( sim, rea, t ):
+    """
+    This function returns the name of the checkpoint file of realization rea
+    of the simulation sim at the end of day t (see LaborEpiRM, checkpoints).
+    """
+    return "S"+str(sim)+"_rea_"+str(rea)+"_t_"+str(t)+".ckpt"
+
+
+def save_Checkpoint( path, State ):
+    """
+    This function writes State (dict with the state of a realization at the
+    end of a day) to the checkpoint file path, a pickle compressed with gzip.
+    The file is written with a temporary name and then renamed, so that a
+    process killed while writing does not leave a truncated checkpoint.
+    """
+    tmp = path+".tmp"+str( os.getpid() )
+    with gzip.open( tmp, 'wb', compresslevel=1 ) as file:
+        pickle.dump( State, file, protocol=pickle.HIGHEST_PROTOCOL )
+    os.replace( tmp, path )
+
+
+def load_Checkpoint( path ):
+    """
+    This function returns the state of a realization written to the
+    checkpoint file path by save_Checkpoint.
+    """
+    with gzip.open( path, 'rb' ) as file:
+        return pickle.load( file )
+
+
+def load_Restart( restart, origin, rea ):
+    """
+    This function returns the state of realization rea in the checkpoint of
+    day restart of the simulation origin, or None if restart is None or the
+    checkpoint does not exist (the realization runs from day 0).
+    """
+    if restart == None:
+        return None
+    path = checkpoint_Path( origin, rea, restart )
+    if not os.path.exists( path ):
+        print( "No checkpoint", path, "realization", rea, "runs from day 0" )
+        return None
+    return load_Checkpoint( path )
+
+
+def open_DistRea( sim, rea, tmax, t0=0, origin=None ):
+    """
+    This function opens the binary file of realization rea of the simulation
+    sim (S_rea.npy, see LaborEpiRM, output=1) as a memory-mapped array, for
+    a realization that starts at day t0. When t0>0 (from a checkpoint of the
+    simulation origin), an existing file of sim is continued, and a new file
+    gets the days before t0 from the file of origin (if it exists).
+    """
+    path = "S"+str(sim)+"_rea_"+str(rea)+".npy"
+    if t0 > 0 and os.path.exists( path ):
+        DistRea = np.lib.format.open_memmap( path, mode="r+" )
+        if DistRea.shape == ( tmax, 19584, 9 ):
+            return DistRea
+        del( DistRea )
+    DistRea = np.lib.format.open_memmap( path, mode="w+", dtype=np.int32, shape=( tmax, 19584, 9 ) )
+    path = "S"+str(origin)+"_rea_"+str(rea)+".npy"
+    if t0 > 0 and origin != None and os.path.exists( path ):
+        Prefix = np.load( path, mmap_mode="r" )
+        n = min( t0, len( Prefix ), tmax )
+        DistRea[ :n ] = Prefix[ :n ]
+        del( Prefix )
+    return DistRea
+
+
+def parse_Who( who ):
+    """
+    This function reads a selection of residents, given as conditions on their
+    characteristics joined by &, each one as name=v1|v2 (name in the values) or
+    name!=v1|v2 (name not in the values), e.g. 'activ=1&comm=1|2&jobcat!=6'.
+    name: comm, activ, age, educ, jornada, jobcat, rama, telew, sector, CUTh, CUTw
+    (columns of data2). An empty string selects all the residents.
+    Returns a list of conditions (name, equal, values), see ResidentIndex.select.
+    """
+    conds = []
+    if who != '':
+        for cond in who.split( '&' ):
+            equal = '!=' not in cond
+            name, values = cond.replace( '!=', '=' ).split( '=' )
+            conds.append( ( name, equal, [ int(v) for v in values.split( '|' ) ] ) )
+    return conds
+
+
+"""
+Initial cases
+--------------------------------------------------------------------
+"""
+#Initial cases (March 1) (week 9 informe epid, pD 0.05)
+#Retrieved from https://github.com/MinCiencia/Datos-COVID19, november 03
+#Initial infected at t=0, a list including all the spatial units
+I_Init =  [1,1,1,0,0,1,1,0,0,1,0,1,0,1,0,1,0,0,0,1,0,1,0,1,0,1,0,0,0,1,0,0,3,0,0,1,0,0,0,0,0,0,0,0,0,0,0,0,0,0,1]
+
+
 """
 Classes: Agent, SpatialUnit, SystemRM
 -------------------------------------------------------------------------------
 Agent: residents and replicas (of commuters)
 SpatialUnit: comuna (municipality)
+SusceptiblePool: the S agents/replicas of a SpatialUnit, with removal in constant time
+InfectionQueue: the I agents, grouped by day of infection
+ResidentIndex: the residents by value of their characteristics (for selecting targets of measures)
+RandomStreams: the random numbers of a realization by purpose (common random numbers)
+PolicyTimeline: the measures of a scenario (confinements, lockdowns, curfew, etc.) by day
+PhaseTimer: the time (and memory) of the phases of the days of a realization
+RunRM: the realizations of a run of LaborEpiRM, with the steps (outputs, monitor, checkpoints) shared by its engines
 SystemRM: the system of municipalities (the metropolitean region)
+ArraySystemRM: the same system, with agents and replicas stored as NumPy columns
+CohortSystemRM: the same system, as counts of residents by type and state (cells)
 """       
 
 class Agent:
@@ -122,7 +323,7 @@ class Agent:
         self.activ = activ      #=0 children [0,14], =1 employed , =2 unemployed, =3 inactive
         self.on = on            #=1 (default) staying at current SU, 0 when the agent is not at the corresponding location
         self.conf = 0           #=0 (default) not confined, =1 confined (by territory), =2 (by rama), =21 (by rama, then by comuna), =3 by age
-        self.day = 0            #counter for the periods between two status.
+        self.day = 0            #=1 when I, =0 otherwise (the days since infection are kept by InfectionQueue)
         self.isol = 0           # =0 default, =1 isolated when I, =2 not moving when confined (THIS IS NOT PROPER ISOLATION) 
         self.pConf = None       #None (default), probability of moving/working in case that self is confined
         self.pConf7 = None      #same as pConf but applies only for malls closing (we need it when a comuna is not under lockdown but the closure of malls is on)
@@ -137,6 +338,8 @@ class Agent:
         self.telew = None       #=0 (default) , =1 can telework if confined
         self.sector = None      #sector (employer): =1 formal, =2 informal, =3 other household
         self.work = 0           #=0 (default) doesn't work (today or never, depends on activ value), =1 working, but not teleworking, =2 teleworking
+        self.unitSU = None      #SpatialUnit instance where the agent/replica is located (keeps the counters N, I up to date)
+        self.posS = None        #position of the agent/replica in the SusceptiblePool of its SU (None if not in the pool)
         
     
                      
@@ -144,12 +347,27 @@ class Agent:
         #creates a replica in SU=SUwork (id order CUT municipality where the agent works)
         self.replica = Agent( su=SUwork, home=0, status=0, comm=self.comm, activ=self.activ, on=0 )
         self.replica.replica = self
+    
+    def set_On ( self, on ):
+        #moves the agent/replica on (=1) or off (=0) its SU, updating the counters of the SU
+        if on != self.on:
+            self.on = on
+            if self.unitSU != None:
+                self.unitSU.N += 2*on-1
+                if self.status == 1:
+                    self.unitSU.I += 2*on-1
+                    
+    def set_Status ( self, status ):
+        #changes the epidemics status of the agent/replica, updating the counters of the SU
+        if self.on == 1 and self.unitSU != None:
+            self.unitSU.I += int( status == 1 ) - int( self.status == 1 )
+        self.status = status
           
     def update_Status ( self, newstatus, qR ):
         #updates the epidemics status. New status may be 1 (I) or 2 (R).
-        self.status = newstatus
+        self.set_Status( newstatus )
         if self.replica != None:
-            self.replica.status = newstatus
+            self.replica.set_Status( newstatus )
         if newstatus == 1: #I
             self.day = 1
             if self.replica != None:
@@ -160,16 +378,16 @@ class Agent:
                 self.replica.day = 0
             pr_i = random.random()
             if pr_i <= qR:
-                self.on = 1
+                self.set_On( 1 )
                 self.isol = 0
                 if self.replica != None:
-                    self.replica.on = 0
+                    self.replica.set_On( 0 )
                     self.replica.isol = 0
             else: #(D)
-                self.on = 0
+                self.set_On( 0 )
                 self.isol = 1
                 if self.replica != None:
-                    self.replica.on = 0
+                    self.replica.set_On( 0 )
                     self.replica.isol = 1
         
     def commute_toW ( self ):
@@ -186,8 +404,8 @@ class Agent:
         Wr = 0
         if self.comm == 1 or self.comm == 2:
             if self.conf == 0 and self.replica.conf == 0:
-                self.on = 0
-                self.replica.on = 1
+                self.set_On( 0 )
+                self.replica.set_On( 1 )
                 Wr = 1
             else: #self.conf ==0, but self.replica.conf!=0; or self.conf==1,2,21,3
                 if self.telew == 0 and pConf_t == 0:
@@ -195,8 +413,8 @@ class Agent:
                 elif self.telew == 0 and pConf_t != 0: #not teleworking, but still with some probability of activity
                     pr_ic = random.random()
                     if pr_ic <= pConf_t:
-                        self.on = 0
-                        self.replica.on = 1
+                        self.set_On( 0 )
+                        self.replica.set_On( 1 )
                         Wr = 1
                     else:
                         Wr = 0
@@ -204,7 +422,7 @@ class Agent:
                     Wr = 2
         else:
             if self.conf == 0:
-                self.on = 0
+                self.set_On( 0 )
                 Wr = 1
             else:
                 if self.telew == 0 and pConf_t == 0:
@@ -212,7 +430,7 @@ class Agent:
                 elif self.telew == 0 and pConf_t != 0:
                     pr_ic = random.random()
                     if pr_ic <= pConf_t:
-                        self.on = 0
+                        self.set_On( 0 )
                         Wr = 1
                     else:
                         Wr = 0
@@ -264,9 +482,9 @@ class Agent:
     
     def back_Home ( self ):
         #moves workers to their home - call if you know that the commuter has previously moved
-        self.on = 1
+        self.set_On( 1 )
         if self.replica != None:
-            self.replica.on = 0
+            self.replica.set_On( 0 )
                
     def on_Confinement ( self, kindConf ):
         #sets the agent in some sort of confinement (either by rama, by comuna, by age) 
@@ -315,12 +533,19 @@ class SpatialUnit:
         self.confinrules =[]    #ordered list of (21) probabilities of activity level by "rama" (ISIC sector) used when SU=SUwork
                                 #these are assigned to workers who work in self (pConf)
         self.confin7 = None     #special rule for rama=7 under agent.conf=2 and replica.conf=2
+        self.N = 0              #number of agents/replicas currently in self (on=1)
+        self.I = 0              #number of infective agents/replicas currently in self (on=1, status=1)
         
        
         
     def add_Agent ( self, agent ):
         #adds an Agent instance to the list
         self.agents.append( agent )
+        agent.unitSU = self
+        if agent.on == 1:
+            self.N += 1
+            if agent.status == 1:
+                self.I += 1
        
     def start_Confinement( self, partial = 1 ):
         #starts the confinement by comuna (municipality) in the spatial unit (territory dependent, i.e. conf=1).
@@ -359,31 +584,452 @@ class SpatialUnit:
        
     def get_N( self ):
         #returns the effective number of agents (agents/replicas who are currently in self, on=1)
-        N = 0
-        N = len( [i for i in self.agents if i.on == 1 ])
-        return N
+        #(running counter, updated by Agent.set_On and Agent.set_Status)
+        return self.N
         
     
     def get_I( self ):
-        #returns the number of effective infective agents
-        I = 0
-        I= len( [i for i in self.agents if i.on == 1 and i.status == 1 ] )
-        return I
+        #returns the number of effective infective agents (running counter)
+        return self.I
        
 
+class SusceptiblePool:
+    #list of the S agents or replicas of a SpatialUnit. remove takes constant time: the last
+    #member is moved to the position of the removed one (so the order of the members changes)
+    def __init__( self, agents ):
+        self.agents = list( agents )
+        for k in range( len( self.agents ) ):
+            self.agents[k].posS = k
+    
+    def remove( self, i ):
+        k = i.posS
+        last = self.agents.pop()
+        if last is not i:
+            self.agents[k] = last
+            last.posS = k
+        i.posS = None
+    
+    def __len__( self ):
+        return len( self.agents )
+    
+    def __iter__( self ):
+        return iter( self.agents )
+
+
+class InfectionQueue:
+    #infectious agents (Agent instances, or rows of ArraySystemRM if arrays=True) in a ring buffer of
+    #14 cohorts by day of infection: the cohort infected at t is tested for detection/isolation
+    #at t+6 and recovers at t+13, so each day only the two cohorts due that day are processed
+    def __init__( self, arrays=False ):
+        self.arrays = arrays
+        self.cohorts = [ [] for k in range( 14 ) ]
+    
+    def add( self, t, members ):
+        #members (list of agents or array of rows) infected at t (t=-1 for the initial cases)
+        self.cohorts[ t%14 ].append( members )
+    
+    def get_Cohort( self, k ):
+        if self.arrays:
+            if len( self.cohorts[k] ) == 0:
+                return np.zeros( 0, dtype=np.int64 )
+            return np.concatenate( self.cohorts[k] )
+        return [ i for members in self.cohorts[k] for i in members ]
+    
+    def get_Detection( self, t ):
+        #agents infected at t-6 (possible detection/isolation at t)
+        return self.get_Cohort( (t-6)%14 )
+    
+    def pop_Recovered( self, t ):
+        #agents infected at t-13 (recover at t), removed from the queue
+        k = (t-13)%14
+        Rec = self.get_Cohort( k )
+        self.cohorts[k] = []
+        return Rec
+
+
+class RandomStreams:
+    #Random numbers of a realization of the vectorized backends, by purpose (Purposes).
+    #crn=False: all the purposes draw from the generator rng of the realization, in the order of the draws.
+    #crn=True (common random numbers): the numbers of each purpose are seeded by (seed, rea, purpose) and, for the
+    #Daily purposes, the day. random gives one uniform number by agent/replica (by id), so the realization rea of
+    #two scenarios run with the same seed uses the same number for the same agent and purpose (and day), whatever
+    #the draws of the other agents and purposes, and the differences between scenarios have a lower variance.
+    #Contagion follows the Sellke construction: each resident has a threshold (exponential, mean 1) and gets
+    #infected when the force of infection accumulated over the rounds exceeds it (same probabilities as a draw
+    #per round: 1-pc = exp(-force of the round)). generator gives a NumPy generator by purpose and day (CohortSystemRM).
+    Purposes = [ 'initial', 'shift', 'work', 'contagion', 'lockdown', 'detection', 'recovery' ]
+    Daily = [ 'work', 'lockdown' ] #new numbers each day (the others are drawn once by agent in the realization)
+    
+    def __init__( self, rng, seed=None, rea=0, size=0, crn=False ):
+        #size: number of agents and replicas (ids of random)
+        self.rng = rng
+        self.seed = seed
+        self.rea = rea
+        self.size = size
+        self.crn = crn
+        self.t = -1
+        self.G = {}          #generators of the day by purpose
+        self.U = {}          #uniform numbers by purpose
+        self.force = None    #force of infection accumulated by each resident (crn)
+        self.threshold = None #threshold of infection of each resident (crn)
+    
+    def set_Day( self, t ):
+        #the next numbers are those of day t (=-1 before the first day)
+        self.t = t
+        self.G = {}
+        for purpose in self.Daily:
+            self.U.pop( purpose, None )
+    
+    def generator( self, purpose ):
+        #generator of purpose for the current day
+        if not self.crn:
+            return self.rng
+        if purpose not in self.G:
+            self.G[ purpose ] = np.random.default_rng( [ self.seed, self.rea, self.Purposes.index( purpose ), self.t+1 ] )
+        return self.G[ purpose ]
+    
+    def random( self, purpose, ids ):
+        #one uniform number for each agent/replica in ids
+        if not self.crn:
+            return self.rng.random( len( ids ) )
+        if purpose not in self.U:
+            day = self.t+1 if purpose in self.Daily else 0
+            self.U[ purpose ] = np.random.default_rng( [ self.seed, self.rea, self.Purposes.index( purpose ), day, 1 ] ).random( self.size )
+        return self.U[ purpose ][ ids ]
+    
+    def choice( self, purpose, ids, k ):
+        #sample of k of the ids, without replacement (crn: the k ids with the lowest numbers)
+        if not self.crn:
+            return self.rng.choice( ids, k, replace=False )
+        return ids[ np.argsort( self.random( purpose, ids ), kind='stable' )[ :k ] ]
+    
+    def infected( self, res, pc ):
+        #contagion of the residents res (repeated if exposed at home and at work) with probabilities pc,
+        #returns a boolean array (True if infected)
+        if not self.crn:
+            return self.rng.random( len( res ) ) <= pc
+        if self.threshold is None:
+            self.threshold = -np.log( 1-self.random( 'contagion', np.arange( self.size ) ) )
+        if self.force is None:
+            self.force = np.zeros( self.size )
+        np.add.at( self.force, res, -np.log1p( -pc ) )
+        return self.force[ res ] >= self.threshold[ res ]
+    
+    def get_State( self ):
+        #state that is not drawn again from the seeds (for a checkpoint): generator of the realization, day and
+        #accumulated force of infection (the numbers of random are recomputed when needed)
+        return dict( rng=self.rng.bit_generator.state, t=self.t, force=self.force )
+    
+    def set_State( self, State ):
+        #restores the state given by get_State
+        self.rng.bit_generator.state = State['rng']
+        self.set_Day( State['t'] )
+        self.force = State['force']
+
+
+class PhaseTimer:
+    #Wall time and number of calls of the phases of the days of a realization (Phases), see LaborEpiRM, timing.
+    #Each call of mark( phase ) adds to phase the time since the previous mark (or the start of the realization).
+    #Each phase is counted once a day in all the backends: a phase split in several parts of the day (commuting in
+    #SystemRM and ArraySystemRM) is marked with call=False after its first part.
+    #timing=0: does nothing; =1: table of the phases of each realization (S_Timing_rea_u.csv); =2: also the peak
+    #of the memory allocated in each day (S_Memory_rea_u.csv, traced with tracemalloc, which slows down the run)
+    Phases = [ 'policies', 'detection', 'work', 'commuting', 'contagion1', 'contagion2', 'contagion3', 'infection', 'output', 'checkpoint' ]
+    
+    def __init__( self, sim, timing=0 ):
+        self.sim = sim
+        self.timing = timing
+        self.Seconds = np.zeros( len( self.Phases ) )
+        self.Calls = np.zeros( len( self.Phases ), dtype=np.int64 )
+        self.Memory = [] #[t, peak MB] by day
+        self.clock = 0.0
+    
+    def start_Realization( self ):
+        #resets the counters (call before the first day)
+        if self.timing == 0:
+            return
+        self.Seconds[:] = 0
+        self.Calls[:] = 0
+        self.Memory = []
+        if self.timing == 2:
+            tracemalloc.start( )
+        self.clock = time.perf_counter( )
+    
+    def mark( self, phase, call=True ):
+        #end of a call of phase (call=False: end of another part of the same call)
+        if self.timing == 0:
+            return
+        now = time.perf_counter( )
+        k = self.Phases.index( phase )
+        self.Seconds[k] += now-self.clock
+        self.Calls[k] += int( call )
+        self.clock = now
+    
+    def end_Day( self, t ):
+        #keeps the peak of the memory allocated in day t (timing=2). The peak is reset for the next day with
+        #tracemalloc.reset_peak (Python >= 3.9); in older versions the tracing is restarted, and the peak of the
+        #next day only counts the memory allocated in that day
+        if self.timing == 2:
+            self.Memory.append( [ t, tracemalloc.get_traced_memory( )[1]/2**20 ] )
+            if hasattr( tracemalloc, 'reset_peak' ):
+                tracemalloc.reset_peak( )
+            else:
+                tracemalloc.stop( )
+                tracemalloc.start( )
+            self.clock = time.perf_counter( )
+    
+    def end_Realization( self, rea ):
+        #writes the tables of realization rea
+        if self.timing == 0:
+            return
+        with open( "S"+str(self.sim)+"_Timing_rea_"+str(rea)+".csv", 'w', newline='' ) as file:
+            writer = csv.writer( file )
+            writer.writerow( [ 'phase', 'seconds', 'calls', 'ms_per_call' ] )
+            for k, phase in enumerate( self.Phases ):
+                writer.writerow( [ phase, round( self.Seconds[k], 6 ), self.Calls[k], round( 1000*self.Seconds[k]/max( self.Calls[k], 1 ), 3 ) ] )
+            writer.writerow( [ 'total', round( self.Seconds.sum( ), 6 ), self.Calls.sum( ), '' ] )
+        if self.timing == 2:
+            tracemalloc.stop( )
+            with open( "S"+str(self.sim)+"_Memory_rea_"+str(rea)+".csv", 'w', newline='' ) as file:
+                writer = csv.writer( file )
+                writer.writerow( [ 't', 'peak_MB' ] )
+                writer.writerows( [ [ t, round( mb, 3 ) ] for t, mb in self.Memory ] )
+
+
+class RunRM:
+    #Realizations a,...,b-1 of a run of LaborEpiRM (see its parameters) and the steps that its engines (LaborEpiRM for
+    #SystemRM, LaborEpiArrayRM, LaborEpiCohortRM) share: start of each realization (from day 0 or from a checkpoint),
+    #outputs of each day (aggregators and files), monitor, checkpoints, end of the realization and D at t=151 (DeadRM).
+    #The series of the current realization (Mobility, Detected_RM, Detected_RM_Cum) are updated by the engine
+    def __init__( self, sim, a, b, tmax, seed=None, saveDead=True, output=0, aggregators=(), monitor=None, checkpoints=(), restart=None, origin=None, timing=0 ):
+        self.sim = sim
+        self.a = a
+        self.b = b
+        self.tmax = tmax
+        self.seed = seed
+        self.saveDead = saveDead
+        self.output = output
+        self.aggregators = aggregators
+        self.monitor = monitor
+        self.checkpoints = checkpoints
+        self.restart = restart
+        if origin == None:
+            origin = sim
+        self.origin = origin
+        self.DeadRM = np.full( ( (b-a),1 ), np.nan ) #vector to keep track of D (nan for the realizations not finished)
+        self.Timer = PhaseTimer( sim, timing )
+        self.rea = None             #current realization
+        self.Mobility = None        #time spent in workplaces inside RM, by day (see LaborEpiRM)
+        self.Detected_RM = None     #cumulative detected cases by comuna, by day
+        self.Detected_RM_Cum = None #cumulative detected cases by comuna, current day
+        self.DistRea = None         #binary file of the realization (output=1)
+    
+    def begin_Realization( self, rea ):
+        #new series of realization rea. Returns the state of its checkpoint of day restart (see load_Restart), with
+        #the series of the days before it already restored, or None if the realization starts at day 0
+        self.rea = rea
+        self.Mobility = np.zeros( ( self.tmax,1 ) )
+        self.Detected_RM = np.zeros( ( self.tmax, 51 ) )
+        self.Detected_RM_Cum = np.zeros( ( 1, 51 ) )
+        State = load_Restart( self.restart, self.origin, rea )
+        if State != None:
+            t = State['t']
+            self.Mobility[ :t ] = State['Mobility']
+            self.Detected_RM[ :t ] = State['Detected_RM']
+            self.Detected_RM_Cum[:] = State['Detected_RM_Cum']
+            self.DeadRM[rea-self.a][0] = State['Dead']
+        return State
+    
+    def start_Days( self, t ):
+        #the days of the realization start at t: opens its binary file (output=1) and starts its timer
+        if self.output == 1:
+            self.DistRea = open_DistRea( self.sim, self.rea, self.tmax, t, self.origin )
+        self.Timer.start_Realization( )
+    
+    def add_Day( self, t, DistDay ):
+        #distribution of agents by type (19584x9) of day t to the aggregators and to the files (see LaborEpiRM, output)
+        for Agg in self.aggregators:
+            Agg.add_Day( self.rea, t, DistDay )
+        if self.output == 1:
+            self.DistRea[t] = DistDay
+        elif self.output == 0:
+            np.savetxt("S"+str(self.sim)+"_rea_"+str(self.rea)+"_day_"+str(t)+".csv",DistDay,delimiter=",",fmt="%s")
+    
+    def end_Day( self, t, Fall ):
+        #detected cases of day t and D (at t=151, Fall). Returns True if the monitor stops the realization
+        self.Detected_RM [t] = self.Detected_RM_Cum [0]
+        if self.monitor != None and self.monitor( self.rea, t, self.Detected_RM ):
+            return True
+        if t == 151:
+            self.DeadRM[self.rea-self.a][0] = Fall
+        return False
+    
+    def checkpoint( self, t, d, tau1, Fall, SystRM, Streams, **State ):
+        #saves the state of the realization at the end of day t-1 (next day t, d), if t-1 is in checkpoints
+        #State: other state of the engine (e.g. InfQ of LaborEpiArrayRM)
+        if t-1 in self.checkpoints:
+            if self.output == 1:
+                self.DistRea.flush()
+            save_Checkpoint( checkpoint_Path( self.sim, self.rea, t-1 ), dict( State, t=t, d=d, tau1=tau1, Fall=Fall, Dead=self.DeadRM[self.rea-self.a][0],
+                Mobility=self.Mobility[ :t ], Detected_RM=self.Detected_RM[ :t ], Detected_RM_Cum=self.Detected_RM_Cum, System=SystRM.get_State( ),
+                Streams=Streams.get_State( ) ) )
+            self.Timer.mark( 'checkpoint' )
+    
+    def end_Realization( self, t, SystRM ):
+        #end of the realization at day t (< tmax if it was stopped by the monitor): its series to the aggregators
+        #(Agg.add_Realization) and to the files, and SystRM back to its initial state. Returns True if it was stopped
+        #by the monitor (it is not saved, and no more realizations are run)
+        stopped = t < self.tmax
+        if not stopped:
+            for Agg in self.aggregators:
+                if hasattr( Agg, 'add_Realization' ):
+                    Agg.add_Realization( self.rea, self.Detected_RM, self.Mobility )
+            if self.output != 3:
+                np.savetxt("S"+str(self.sim)+"_Mob_Tot_rea_"+str(self.rea)+".csv",self.Mobility,delimiter=",",fmt="%s")
+                np.savetxt("S"+str(self.sim)+"_Detected_rea_"+str(self.rea)+".csv",self.Detected_RM,delimiter=",",fmt="%s")
+            if self.output == 1:
+                self.DistRea.flush()
+            self.Timer.end_Realization( self.rea )
+        self.Mobility = None
+        self.DistRea = None
+        SystRM.reset_Realization( )
+        return stopped
+    
+    def finish( self ):
+        #writes the file of D of the realizations (saveDead), returns DeadRM
+        if self.saveDead:
+            np.savetxt("S"+str(self.sim)+"_Dead_a_"+str(self.a)+"_b_"+str(self.b)+".csv",self.DeadRM,delimiter=",",fmt="%s")
+        return self.DeadRM
+
+
+class ResidentIndex:
+    #Ids of the residents (order of data2, i.e. SystemRM.Residents or ArraySystemRM ids) for each value
+    #of the characteristics in Cols, built once in InitialSystem. The characteristics do not change
+    #during the simulation, so the index is valid for all the realizations (reset_Realization).
+    Cols = [ 'CUTh', 'comm', 'activ', 'age', 'educ', 'jornada', 'jobcat', 'rama', 'telew', 'sector', 'CUTw' ] #variables of
+                                                                  #data2 (=99 for the job characteristics of non-workers)
+    
+    def __init__( self, T, typ ):
+        #T: table of data2 (see OutcomeProcessSIRLabor.readData2), typ: row of data2 of each resident
+        self.n = len( typ )
+        self.ids = {} #name: {value: ids (sorted)}
+        for name in self.Cols:
+            col = T[ name ][ typ ]
+            order = np.argsort( col, kind='stable' )
+            values, starts = np.unique( col[ order ], return_index=True )
+            self.ids[ name ] = dict( zip( values.tolist(), np.split( order, starts[1:] ) ) )
+    
+    def get_Ids( self, name, values ):
+        #ids (sorted) of the residents with characteristic name in values
+        Sel = [ self.ids[ name ][ v ] for v in values if v in self.ids[ name ] ]
+        if len( Sel ) == 0:
+            return np.zeros( 0, dtype=np.int64 )
+        return np.sort( np.concatenate( Sel ) )
+    
+    def select( self, who ):
+        #ids (sorted) of the residents that satisfy all the conditions (name, equal, values) in who
+        #(see parse_Who); the conditions name in values are intersected first, so that the cost
+        #depends on the selected residents rather than on the population
+        Sel = None
+        for name, equal, values in who:
+            if equal:
+                ids = self.get_Ids( name, values )
+                Sel = ids if Sel is None else np.intersect1d( Sel, ids, assume_unique=True )
+        if Sel is None:
+            Sel = np.arange( self.n )
+        for name, equal, values in who:
+            if not equal:
+                Sel = np.setdiff1d( Sel, self.get_Ids( name, values ), assume_unique=True )
+        return Sel
+
+
+class PolicyTimeline:
+    #Measures of scenario (situation), read from the file policies (Policies_MP.csv), with columns
+    #scenario, t, event, who, value. The events of day t are applied in the order of the file:
+    #confine: confinement of kind value (2 rama, 3 age) of the residents who and their replicas
+    #isolate: the residents who and their replicas do not move (isol=2)
+    #lockdown: confinement by comuna of the comunas who (CUTh=...; empty: all), fraction value of the comuna
+    #lockdown_end: ends the confinement by comuna of the comunas who
+    #curfew: the last round of contagion lasts value hours (tau1=value/24) from t on
+    #pconf_rules: pConf of the residents who given by column value of the file rules (PolicyRules_MP.csv),
+    #by comuna of workplace
+    #who: conditions on the characteristics of the residents (see parse_Who)
+    #The residents of each event are selected once (compile), before the realizations.
+    def __init__( self, policies, rules, situation ):
+        self.events = {} #t: list of events [event, who, value, selected residents]
+        X,Y = readMyfileRM( policies )
+        for w in Y:
+            if int( w[0] ) == situation:
+                self.events.setdefault( int( w[1] ), [] ).append( [ w[2], parse_Who( w[3] ), w[4], None ] )
+        X,Y = readMyfileRM( rules )
+        self.rules = {}
+        for k in range( 1, len( X ) ):
+            self.rules[ X[k] ] = np.array( [ w[k] for w in Y ] )
+    
+    def compile( self, SystRM ):
+        #selects the residents of each event in the system SystRM
+        for t in self.events:
+            for ev in self.events[t]:
+                if ev[0] in [ 'confine', 'isolate', 'pconf_rules' ]:
+                    ev[3] = SystRM.select_Residents( ev[1] )
+                elif ev[0] in [ 'lockdown', 'lockdown_end' ]:
+                    ev[3] = list( range( 51 ) )
+                    for name, equal, values in ev[1]:
+                        if name == 'CUTh':
+                            ev[3] = values
+    
+    def apply_Day( self, SystRM, t, tau1, rng=None ):
+        #applies the events of day t, returns tau1 (changed by curfew)
+        for event, who, value, Sel in self.events.get( t, [] ):
+            if event == 'confine':
+                SystRM.confine_Residents( Sel, int( value ) )
+            elif event == 'isolate':
+                SystRM.isolate_Residents( Sel )
+            elif event == 'lockdown':
+                for x in Sel:
+                    SystRM.start_Confinement( x, rng, partial = float( value ) )
+            elif event == 'lockdown_end':
+                for x in Sel:
+                    SystRM.end_Confinement( x )
+            elif event == 'curfew':
+                tau1 = float( value )/24.0
+            elif event == 'pconf_rules':
+                SystRM.set_PConf( Sel, self.rules[ value ] )
+            else:
+                print( "Error: unknown event", event )
+        return tau1
+
+
 class SystemRM:
+    State0 = ( { 'status':0, 'conf':0, 'work':0, 'isol':0, 'day':0, 'on':0 }, #initial state of replicas (home=0)
+               { 'status':0, 'conf':0, 'work':0, 'isol':0, 'day':0, 'on':1 } ) #and residents (home=1)
+    
     def __init__( self, data1=None, data2=None ):
         self.data1 = data1
         self.data2 = data2
         self.ListSU = []
+        self.Residents = [] #all the agents (not replicas), in the order of data2
+        self.Idents = None #ident of each agent in Residents (array)
+        self.Index = None #ResidentIndex of Residents
+        self.Snapshot = None #initial pConf of Residents and N of each SU (tuples), see take_Snapshot
         #data1: CUTh=w[0], rama3=w[1], rama4=w[2], rama7=w[3], rama8=w[4], rama9=w[5], rama10=w[6], 
         #rama13=w[7], rama14=w[8], rama17=w[9], rama18=w[10], rama19=w[11], rama7Conf2=w[12]
         #data2: nragt=w[0], CUTh=w[1], comm=w[2], activ=w[3], ident=w[4], age=w[5], educ=w[6], jornada=w[7],
         #jobcat=w[8], rama=w[9], telew=w[10], sector=w[11], CUTw=w[12], idrph=w[13], income=w[14],forml=w[15]
     
     
-    def InitialSystem( self ):
+    def InitialSystem( self, cache=None ):
         # we create the subpopulations, with agents and replicas 
+        #cache: folder of the build cache (None: no cache). The built system is saved (pickle) in cache and
+        #loaded by the next runs (or worker processes) with the same data1 and data2 (see cache_Path)
+        
+        if cache != None:
+            path = cache_Path( cache, 'SystemRM', self.data1, self.data2 )+".pkl"
+            if os.path.exists( path ):
+                with open( path, 'rb' ) as file:
+                    self.__dict__.update( pickle.load( file ) )
+                return
+        
         X,Y=readMyfileRM( self.data1 )
         
         for w in Y:
@@ -395,34 +1041,48 @@ class SystemRM:
         #at this point, all the spatial units are created 
         #now we use the second file (see its format)
     
-        W,Z=readMyfileRM( self.data2 )
+        T = OutcomeProcessSIRLabor.readData2( self.data2 )
+        Cols = [ 'nragt', 'CUTh', 'comm', 'activ', 'ident', 'age', 'educ', 'jornada', 'jobcat', 'rama', 'telew', 'sector', 'CUTw' ]
             
-        for w in Z: #for each line
-            nAgt = int(w[0])  #number of agents to be created with the same set of characteristics
-            SUr = self.ListSU[ int(w[1]) ] #the spatial unit of residence
+        for nAgt, CUTh, comm, activ, ident, age, educ, jornada, jobcat, rama, telew, sector, CUTw in T[ Cols ].tolist(): #for each line
+            #nAgt: number of agents to be created with the same set of characteristics
+            SUr = self.ListSU[ CUTh ] #the spatial unit of residence
             SUw = None
         
             for i in range( nAgt ): #for each new set of identical agents that must be created (residents)
-                newAg = Agent( su=int(w[1]), home=1, status=0, comm=int(w[2]), activ=int(w[3]), on=1 )
-                newAg.ident = int(w[4])
-                newAg.age = int(w[5])
-                newAg.educ = int(w[6])
+                newAg = Agent( su=CUTh, home=1, status=0, comm=comm, activ=activ, on=1 )
+                newAg.ident = ident
+                newAg.age = age
+                newAg.educ = educ
                 
                 SUr.add_Agent( newAg )
+                self.Residents.append( newAg )
             
-                if int(w[3]) == 1: #activ==1
-                    newAg.jornada = int(w[7])
-                    newAg.jobcat = int(w[8])
-                    newAg.rama = int(w[9])
-                    newAg.telew = int(w[10])
-                    newAg.sector = int(w[11])
+                if activ == 1: #activ==1
+                    newAg.jornada = jornada
+                    newAg.jobcat = jobcat
+                    newAg.rama = rama
+                    newAg.telew = telew
+                    newAg.sector = sector
                     
-                    if int(w[2]) in [1,2]: #creates the replica (without characteristics)
-                        SUw = self.ListSU[ int(w[12])]
-                        newAg.creates_Replica( SUwork=int(w[12]) )
+                    if comm in [1,2]: #creates the replica (without characteristics)
+                        SUw = self.ListSU[ CUTw ]
+                        newAg.creates_Replica( SUwork=CUTw )
                         SUw.add_Agent( newAg.replica )
-                    if int(w[9]) == 7 and int(w[2]) <= 2 and int(w[11]) != 3 and (int(w[8]) not in [5,6]):
-                        newAg.pConf7 = self.ListSU[int(w[12])].confin7
+                    if rama == 7 and comm <= 2 and sector != 3 and (jobcat not in [5,6]):
+                        newAg.pConf7 = self.ListSU[ CUTw ].confin7
+        
+        self.Idents = np.array( [ i.ident for i in self.Residents ] )
+        self.Index = ResidentIndex( T, np.repeat( np.arange( len( T ) ), T['nragt'] ) )
+        
+        self.initial_PConf( )
+        self.take_Snapshot( )
+        
+        if cache != None:
+            os.makedirs( cache, exist_ok=True )
+            with open( path+".tmp"+str( os.getpid() ), 'wb' ) as file:
+                pickle.dump( self.__dict__, file, protocol=pickle.HIGHEST_PROTOCOL )
+            os.replace( path+".tmp"+str( os.getpid() ), path )
    
     def get_Agents( self ):
         #retrieves all the agents in all the SU in a single list
@@ -438,24 +1098,565 @@ class SystemRM:
         for x in self.ListSU:
             SL.append( x.get_S_agents() )
         return SL
+    
+    def get_DistDay( self ):
+        #returns the distribution (19584x9) of agents (not replicas) by type (ident, row) and
+        #status + 3*work (column), counted with a single bincount over the agents' current state
+        Cells = np.fromiter( ( i.status + int(3*i.work) for i in self.Residents ), dtype=np.int64, count=len( self.Residents ) )
+        DistDay = np.bincount( self.Idents*9 + Cells, minlength=19584*9 ).reshape( ( 19584,9 ) )
+        return DistDay.astype( float )
+    
+    def get_Infected( self, S_rea, tau, B, Nm, Ks, Kns, rng ):
+        #one round of contagion in all the SU (S_rea: SusceptiblePool of each SU), returns the agents/replicas
+        #that get infected. The S agents/replicas that are on in a SU with I>0 are collected with Nx and Ix
+        #(running counters of their SU) and their factor K, and get their probability 1-(1-B/Nx*tau*K)**Ix
+        #and their draw in a single call (rng: NumPy generator)
+        Kc = { 3: Ks, 1: Kns, 21: Kns } #confinement factor at home by conf (=1 o.w.)
+        Sx, N, I, K = [], [], [], []
+        for x in range( 51 ):
+            Ix = int( self.ListSU[x].get_I() )
+            if Ix > 0 and len( S_rea[x] ) > 0:
+                Nx = int( self.ListSU[x].get_N() )
+                if x >= 32:
+                    Nx = max( Nx, Nm )
+                On = [ i for i in S_rea[x] if i.on == 1 ]
+                Sx += On
+                N.append( np.full( len( On ), Nx ) )
+                I.append( np.full( len( On ), Ix ) )
+                K.append( np.fromiter( ( Kc.get( i.conf, 1.0 ) if i.home == 1 else 1.0 for i in On ), dtype=float, count=len( On ) ) )
+        if len( Sx ) == 0:
+            return []
+        N, I, K = np.concatenate( N ), np.concatenate( I ), np.concatenate( K )
+        pc = 1-( (1-((B/N)*tau*K))**I )
+        return [ Sx[k] for k in np.flatnonzero( rng.random( len( Sx ) ) <= pc ) ]
+    
+    def select_Residents( self, who ):
+        #returns the agents (not replicas) that satisfy all the conditions in who (see parse_Who)
+        return [ self.Residents[k] for k in self.Index.select( who ) ]
+    
+    def confine_Residents( self, Sel, kindConf ):
+        #confinement by rama (kindConf=2) or by age (kindConf=3) of the agents Sel and their replicas
+        for i in Sel:
+            i.on_Confinement( kindConf )
+            if i.replica != None:
+                i.replica.on_Confinement( kindConf )
+    
+    def isolate_Residents( self, Sel ):
+        #the agents Sel and their replicas do not move (isol=2), unless already isolated
+        for i in Sel:
+            if i.isol == 0:
+                i.isol = 2
+                if i.replica != None:
+                    i.replica.isol = 2
+    
+    def set_PConf( self, Sel, rules ):
+        #pConf of the agents Sel given by the rules of their comuna of workplace
+        for j in Sel:
+            j.pConf = rules[ j.order_CUTw() ]
+    
+    def start_Confinement( self, x, rng=None, partial = 1 ):
+        #starts the confinement by comuna in the spatial unit x (random sample with random, rng is not used)
+        self.ListSU[x].start_Confinement( partial = partial )
+    
+    def end_Confinement( self, x ):
+        #ends the confinement by comuna in the spatial unit x
+        self.ListSU[x].end_Confinement( )
 
+    def initial_PConf( self ):
+        #assignment of initial pConf to each worker (some of them will change in time)
+        for i in self.Residents:
+            if i.activ == 1:
+                if i.comm == 0:
+                    i.pConf = self.ListSU[ i.su ].confinrules[ int(i.rama)-1 ]
+                elif i.comm == 3:
+                    if i.sector == 1:
+                        i.pConf = 1
+                    else:
+                        i.pConf = 0
+                else:
+                    if i.jobcat == 5:
+                        i.pConf = 0
+                    elif i.jobcat == 6:
+                        i.pConf = 1
+                    else:
+                        if i.sector == 3:
+                            i.pConf = 0
+                        else:
+                            i.pConf = self.ListSU[ i.replica.su ].confinrules[ int(i.rama)-1 ]
+    
+    def take_Snapshot( self ):
+        #keeps the initial state that is not the same for all the agents (pConf, N of each SU), 
+        #call after InitialSystem (and initial_PConf) 
+        self.Snapshot = ( tuple( i.pConf for i in self.Residents ), tuple( x.N for x in self.ListSU ) )
+    
+    def reset_Realization( self ):
+        #restores the initial conditions (State0 and Snapshot), in a single pass over the residents
+        Res0 = self.State0[1]
+        Rep0 = self.State0[0]
+        pConf0, N0 = self.Snapshot
+        for i, p in zip( self.Residents, pConf0 ):
+            i.__dict__.update( Res0 )
+            i.pConf = p
+            if i.replica != None:
+                i.replica.__dict__.update( Rep0 )
+        for x, N in zip( self.ListSU, N0 ):
+            x.N = N
+            x.I = 0
+  
+
+class ArraySystemRM:
+    #Alternative (struct-of-arrays) population backend. Same system as SystemRM, but without Agent
+    #instances: every attribute is a typed NumPy column indexed by the agent id.
+    #Rows 0,...,nR-1 are the residents (home=1), rows nR,...,nR+nW-1 are the replicas of commuters (home=0).
+    #replica[i]: id of the replica of resident i (=-1 if i has no replica); owner[j-nR]: resident of replica j.
+    #Columns su, home, status, on, conf, isol, day are defined for agents and replicas, the
+    #characteristics (comm, activ, ident, ..., work, pConf, pConf7) only for residents.
+    #rng (methods): RandomStreams of the realization.
+    Static = [ 'comm', 'activ', 'ident', 'age', 'educ', 'jornada', 'jobcat', 'rama', 'telew', 'sector', 'CUTw', 'owner',
+               'replica', 'su', 'home', 'pConf7', 'confinrules', 'confin7', 'T', 'typ' ] #columns that do not change
+    
+    def __init__( self, data1=None, data2=None ):
+        self.data1 = data1
+        self.data2 = data2
+        self.nSU = 0            #number of spatial units
+        self.nTypes = 0         #number of types of agents (rows of data2)
+        self.nR = 0             #number of residents
+        self.nW = 0             #number of replicas
+        self.confinrules = None #matrix (nSU,21), SpatialUnit.confinrules of each SU (by rows)
+        self.confin7 = None     #array (nSU), SpatialUnit.confin7 of each SU
+        self.rowsSU = []        #ids of the agents and replicas located in each SU (either on or off)
+        self.T = None           #table of data2 (one row by type, see OutcomeProcessSIRLabor.readData2)
+        self.typ = None         #row of data2 (type) of each resident
+        self.Index = None       #ResidentIndex of the residents
+        self.Snapshot = None    #initial value of the columns that change in a realization (read-only copies)
+        
+        
+    def InitialSystem( self, cache=None ):
+        #we create the columns of agents and replicas (same data as SystemRM.InitialSystem)
+        #cache: folder of the build cache (None: no cache). The Static columns are saved in cache (one .npy
+        #file each) and memory-mapped (read-only) by the next runs or worker processes with the same data1
+        #and data2 (see cache_Path)
+        
+        path = None
+        if cache != None:
+            path = cache_Path( cache, 'ArraySystemRM', self.data1, self.data2 )
+        if path != None and os.path.exists( path ):
+            for name in self.Static:
+                setattr( self, name, np.load( os.path.join( path, name+".npy" ), mmap_mode='r' ) )
+        else:
+            self.build_Static( )
+            if path != None:
+                tmp = path+".tmp"+str( os.getpid() )
+                os.makedirs( tmp, exist_ok=True )
+                for name in self.Static:
+                    np.save( os.path.join( tmp, name+".npy" ), getattr( self, name ) )
+                try:
+                    os.replace( tmp, path )
+                except OSError: #already saved by another process
+                    for name in self.Static:
+                        os.remove( os.path.join( tmp, name+".npy" ) )
+                    os.rmdir( tmp )
+        
+        self.nSU = len( self.confin7 )
+        self.nTypes = len( self.T )
+        self.nR = len( self.typ )
+        self.nW = len( self.owner )
+        self.status = np.zeros( self.nR + self.nW, dtype=np.int8 )
+        self.on = np.array( self.home )
+        self.conf = np.zeros( self.nR + self.nW, dtype=np.int8 )
+        self.isol = np.zeros( self.nR + self.nW, dtype=np.int8 )
+        self.day = np.zeros( self.nR + self.nW, dtype=np.int16 )
+        self.work = np.zeros( self.nR, dtype=np.int8 )
+        self.pConf = np.zeros( self.nR )
+        
+        self.rowsSU = [ np.flatnonzero( self.su == x ) for x in range( self.nSU ) ]
+        self.Index = ResidentIndex( self.T, self.typ )
+        
+        self.initial_PConf( )
+        self.take_Snapshot( )
+    
+    def build_Static( self ):
+        #creates the Static columns from data1 and data2
+        self.confinrules, self.confin7 = readRulesRM( self.data1 )
+            
+        T = OutcomeProcessSIRLabor.readData2( self.data2 )
+        typ = np.repeat( np.arange( len( T ) ), T['nragt'] ) #row of data2 of each resident
+        self.T = T
+        self.typ = typ
+        nR = len( typ )
+        for name in [ 'comm', 'activ', 'ident', 'age', 'educ', 'jornada', 'jobcat', 'rama', 'telew', 'sector', 'CUTw' ]:
+            setattr( self, name, T[ name ][ typ ] ) #(CUTw: =order_CUTw for comm<=2, =99 for comm=3 and non-workers)
+        
+        #replicas of the RM commuters (activ==1, comm in [1,2])
+        self.owner = np.flatnonzero( ( self.activ == 1 ) & np.isin( self.comm, [1,2] ) ).astype( np.int32 )
+        nW = len( self.owner )
+        self.replica = np.full( nR, -1, dtype=np.int32 )
+        self.replica[ self.owner ] = nR + np.arange( nW, dtype=np.int32 )
+        
+        self.su = np.concatenate( ( T['CUTh'][typ], self.CUTw[ self.owner ] ) ).astype( np.int16 )
+        self.home = np.concatenate( ( np.ones( nR ), np.zeros( nW ) ) ).astype( np.int8 )
+        self.pConf7 = np.full( nR, np.nan )
+        m7 = ( self.activ == 1 ) & ( self.rama == 7 ) & ( self.comm <= 2 ) & ( self.sector != 3 ) & ~np.isin( self.jobcat, [5,6] )
+        self.pConf7[ m7 ] = self.confin7[ self.CUTw[ m7 ] ]
+    
+    def get_State( self ):
+        #copy of the columns that change in a realization
+        return { name: getattr( self, name ).copy() for name in [ 'status', 'on', 'conf', 'isol', 'day', 'work', 'pConf' ] }
+    
+    def set_State( self, State ):
+        #restores the columns given by get_State (bulk copy)
+        for name in State:
+            np.copyto( getattr( self, name ), State[ name ] )
+    
+    def take_Snapshot( self ):
+        #keeps the initial value of the columns that change in a realization (call after InitialSystem)
+        self.Snapshot = self.get_State( )
+        for name in self.Snapshot:
+            self.Snapshot[ name ].flags.writeable = False
+        
+    def reset_Realization( self ):
+        #restores the initial conditions (bulk copy of the Snapshot)
+        self.set_State( self.Snapshot )
+        
+    def initial_PConf( self ):
+        #assignment of initial pConf to each worker (same rules as in LaborEpiRM)
+        self.pConf[:] = 0
+        w0 = ( self.activ == 1 ) & ( self.comm == 0 )
+        self.pConf[ w0 ] = self.confinrules[ self.su[ :self.nR ][ w0 ], self.rama[ w0 ]-1 ]
+        self.pConf[ ( self.activ == 1 ) & ( self.comm == 3 ) & ( self.sector == 1 ) ] = 1
+        wc = ( self.activ == 1 ) & np.isin( self.comm, [1,2] )
+        self.pConf[ wc & ( self.jobcat == 6 ) ] = 1
+        wr = wc & ~np.isin( self.jobcat, [5,6] ) & ( self.sector != 3 )
+        self.pConf[ wr ] = self.confinrules[ self.su[ self.replica[ wr ] ], self.rama[ wr ]-1 ]
+        
+    def with_Replicas( self, ids ):
+        #returns the ids of residents plus the ids of their replicas
+        rep = self.replica[ ids ]
+        return np.concatenate( ( ids, rep[ rep >= 0 ] ) )
+    
+    def get_Residents( self, rows ):
+        #returns the resident of each agent/replica in rows
+        res = np.array( rows, dtype=np.int64 )
+        w = res >= self.nR
+        res[ w ] = self.owner[ res[ w ] - self.nR ]
+        return res
+    
+    def on_Confinement( self, ids, kindConf ):
+        #sets the agents/replicas ids in some sort of confinement (same rules as Agent.on_Confinement)
+        self.conf[ ids ] = conf_Start( self.conf[ ids ], kindConf )
+        
+    def start_Confinement( self, x, rng, partial = 1 ):
+        #starts the confinement by comuna in the spatial unit x (same as SpatialUnit.start_Confinement)
+        rows = self.rowsSU[ x ]
+        if partial != 1:
+            R = rows[ self.home[ rows ] == 1 ]
+            W = rows[ self.home[ rows ] == 0 ]
+            Residents = rng.choice( 'lockdown', R, int( partial*len( R ) ) )
+            Workplaces = rng.choice( 'lockdown', W, int( partial*len( W ) ) )
+            rows = np.concatenate( ( Residents, Workplaces ) )
+        self.on_Confinement( rows, 1 )
+        
+    def end_Confinement( self, x ):
+        #ends confinement by comuna in the spatial unit x
+        rows = self.rowsSU[ x ]
+        self.conf[ rows ] = conf_End( self.conf[ rows ] )
+    
+    def select_Residents( self, who ):
+        #returns the ids of the residents that satisfy all the conditions in who (see parse_Who)
+        return self.Index.select( who )
+    
+    def confine_Residents( self, ids, kindConf ):
+        #confinement by rama (kindConf=2) or by age (kindConf=3) of the residents ids and their replicas
+        self.on_Confinement( self.with_Replicas( ids ), kindConf )
+    
+    def isolate_Residents( self, ids ):
+        #the residents ids and their replicas do not move (isol=2), unless already isolated
+        self.isol[ self.with_Replicas( ids[ self.isol[ ids ] == 0 ] ) ] = 2
+    
+    def set_PConf( self, ids, rules ):
+        #pConf of the residents ids given by the rules of their comuna of workplace
+        self.pConf[ ids ] = rules[ self.CUTw[ ids ] ]
+        
+    def does_Work( self, ids, rng ):
+        #checks if the residents ids are working, Wr=0 not working, =1 face-to-face, =2 teleworking
+        #(same rules as Agent.does_Work and Agent.commute_toW, including the special rule for rama 7)
+        rep = self.replica[ ids ]
+        conf = self.conf[ ids ]
+        repconf = np.where( rep >= 0, self.conf[ rep ], 0 )
+        comm = self.comm[ ids ]
+        commuter = ( comm == 1 ) | ( comm == 2 )
+        free = np.where( commuter, ( conf == 0 ) & ( repconf == 0 ), conf == 0 )
+        r7 = ( self.rama[ ids ] == 7 ) & ( self.sector[ ids ] != 3 ) & ~np.isin( self.jobcat[ ids ], [5,6] ) & ( conf == 2 ) & ( ( comm == 0 ) | ( commuter & ( repconf == 2 ) ) )
+        pConf_t = np.where( r7, self.pConf7[ ids ], self.pConf[ ids ] )
+        lottery = ( pConf_t != 0 ) & ( rng.random( 'work', ids ) <= pConf_t )
+        Wr = np.where( self.telew[ ids ] == 0, lottery, 2 )
+        Wr = np.where( free, 1, Wr )
+        return Wr.astype( np.int8 )
+    
+    def commute_toW( self, ids, rng ):
+        #moves the residents ids (comm>=1, activ==1) to their workplaces if they work face-to-face
+        #returns Wr (see does_Work) and the ids of agents that moved
+        Wr = self.does_Work( ids, rng )
+        moved = ids[ Wr == 1 ]
+        self.on[ moved ] = 0
+        rep = self.replica[ moved ]
+        self.on[ rep[ rep >= 0 ] ] = 1
+        return Wr, moved
+    
+    def back_Home( self, ids ):
+        #moves workers to their home
+        self.on[ ids ] = 1
+        rep = self.replica[ ids ]
+        self.on[ rep[ rep >= 0 ] ] = 0
+        
+    def move_Shift( self, ids, d, t, rng ):
+        #daily movements of the T1 or T2 commuters ids (see LaborEpiRM), returns the ids that moved
+        self.work[ ids[ self.isol[ ids ] == 1 ] ] = 0
+        stay = ids[ self.isol[ ids ] == 2 ]
+        self.work[ stay ] = self.does_Work( stay, rng )
+        free = ids[ self.isol[ ids ] == 0 ]
+        if d <= 5 and (t not in [40,61,81,120,137]):
+            closed = np.zeros( len( free ), dtype=bool )
+        elif d == 6 or (t in [40,120,137]):
+            closed = np.isin( self.rama[ free ], [11,15,16,21] )
+        else: #d == 7 or (t in [61,81])
+            closed = np.isin( self.rama[ free ], [3,6,10,11,12,13,14,15,16,19,20,21] )
+        self.work[ free[ closed ] ] = self.does_Work( free[ closed ], rng )
+        Wr, moved = self.commute_toW( free[ ~closed ], rng )
+        self.work[ free[ ~closed ] ] = Wr
+        return moved
+    
+    def start_Infection( self, rows ):
+        #S --> I for the agents/replicas rows, returns the residents that are newly infected
+        res = np.unique( self.get_Residents( rows ) )
+        res = res[ self.status[ res ] == 0 ]
+        both = self.with_Replicas( res )
+        self.status[ both ] = 1
+        self.day[ both ] = 1
+        return res
+    
+    def end_Infection( self, ids, qR, rng ):
+        #I --> R/D for the residents ids, returns a boolean array (True if dead)
+        both = self.with_Replicas( ids )
+        self.status[ both ] = 2
+        self.day[ both ] = 0
+        dead = rng.random( 'recovery', ids ) > qR
+        self.on[ ids ] = np.where( dead, 0, 1 )
+        self.isol[ ids ] = dead
+        rep = self.replica[ ids ]
+        self.on[ rep[ rep >= 0 ] ] = 0
+        self.isol[ rep[ rep >= 0 ] ] = dead[ rep >= 0 ]
+        return dead
+    
+    def K_Factor( self, rows, Ks, Kns ):
+        #confinement factor for the interaction time (=Ks conf=3, =Kns conf in [1,21], =1 o.w.) at home
+        conf = self.conf[ rows ]
+        K = np.where( conf == 3, Ks, np.where( ( conf == 1 ) | ( conf == 21 ), Kns, 1.0 ) )
+        return np.where( self.home[ rows ] == 1, K, 1.0 )
+    
+    def get_Infected( self, tau, B, Nm, Ks, Kns, rng ):
+        #one round of contagion in all the SU, returns the agents/replicas that get infected
+        #N and I of every SU are computed with a bincount over su, and all the S agents/replicas that are
+        #on in a SU with I>0 get their probability 1-(1-B/Nx*tau*K)**Ix and their draw in a single call
+        on = self.on == 1
+        N = np.bincount( self.su[ on ], minlength=self.nSU )
+        I = np.bincount( self.su[ on & ( self.status == 1 ) ], minlength=self.nSU )
+        N[32:] = np.maximum( N[32:], Nm )
+        Sx = np.flatnonzero( on & ( self.status == 0 ) & ( I[ self.su ] > 0 ) )
+        x = self.su[ Sx ]
+        pc = 1-( (1-((B/N[x])*tau*self.K_Factor( Sx, Ks, Kns )))**I[x] )
+        return Sx[ rng.infected( self.get_Residents( Sx ), pc ) ]
+    
+    def get_DistDay( self ):
+        #distribution of residents of each type among the compartments {S,I,R}x{work=0,work=1,work=2}
+        cell = self.ident.astype( np.int64 )*9 + self.status[ :self.nR ] + 3*self.work
+        DistDay = np.bincount( cell, minlength=self.nTypes*9 ).reshape( ( self.nTypes, 9 ) )
+        return DistDay.astype( float )
+  
+
+class CohortSystemRM:
+    #Type-level (cohort) backend. The agents are not created one by one: the residents of each type (row of data2)
+    #are counted in cells, a cell being the number n of residents of type k with the same state: conf of the
+    #resident (hc) and of its replica (rc, =0 without replica), shift of the T2 commuters (sh=1 morning), isol,
+    #status (st) and day of infection (tinf, for st=1). A resident and its replica are always in the same cell.
+    #LaborEpiCohortRM advances the cells with binomial, multinomial and hypergeometric draws: the outcomes have
+    #the same distribution as those of SystemRM and ArraySystemRM, but not the same draws for a given seed.
+    #rng (methods): NumPy generator, or RandomStreams of the realization (start_Confinement).
+    Cells = [ 'k', 'hc', 'rc', 'sh', 'isol', 'st', 'tinf', 'n' ] #columns of the table of cells
+    Groups = [ 'activ=1&jobcat!=6&comm=0', 'activ=1&jobcat!=6&comm=3', 'activ=1&jobcat!=6&comm=1|2&jornada=1',
+               'activ=1&jobcat!=6&comm=1|2&jornada=2', 'jobcat=6&comm=1|2' ] #T0, T1, T1, T2, T4 (see LaborEpiRM)
+    
+    def __init__( self, data1=None, data2=None ):
+        self.data1 = data1
+        self.data2 = data2
+        self.nSU = 0            #number of spatial units
+        self.nTypes = 0         #number of types of agents (rows of data2)
+        self.confinrules = None #matrix (nSU,21), SpatialUnit.confinrules of each SU (by rows)
+        self.confin7 = None     #array (nSU), SpatialUnit.confin7 of each SU
+        self.T = None           #table of data2 (one row by type, see OutcomeProcessSIRLabor.readData2)
+        self.group = None       #group of commuters of each type: 1 T0, 2 T1, 3 T2, 4 T4, 0 none
+        self.Index = None       #ResidentIndex of the types
+        self.Snapshot = None    #initial cells and pConf
+        
+        
+    def InitialSystem( self, cache=None ):
+        #we create the types and the initial cells (one by type, all S)
+        #cache: not used (the system is built in a fraction of a second)
+        self.confinrules, self.confin7 = readRulesRM( self.data1 )
+        self.nSU = len( self.confin7 )
+        
+        T = OutcomeProcessSIRLabor.readData2( self.data2 )
+        self.T = T
+        self.nTypes = len( T )
+        for name in [ 'CUTh', 'comm', 'activ', 'ident', 'jornada', 'jobcat', 'rama', 'telew', 'sector', 'CUTw', 'nragt' ]:
+            setattr( self, name, T[ name ] )
+        self.hasRep = ( self.activ == 1 ) & np.isin( self.comm, [1,2] ) #types with replica (RM commuters)
+        self.pConf = np.zeros( self.nTypes )
+        self.pConf7 = np.full( self.nTypes, np.nan )
+        m7 = ( self.activ == 1 ) & ( self.rama == 7 ) & ( self.comm <= 2 ) & ( self.sector != 3 ) & ~np.isin( self.jobcat, [5,6] )
+        self.pConf7[ m7 ] = self.confin7[ self.CUTw[ m7 ] ]
+        
+        self.Index = ResidentIndex( T, np.arange( self.nTypes ) )
+        self.group = np.zeros( self.nTypes, dtype=np.int8 )
+        for g, who in zip( [1,2,2,3,4], self.Groups ):
+            self.group[ self.Index.select( parse_Who( who ) ) ] = g
+        
+        self.k = np.flatnonzero( self.nragt > 0 )
+        self.n = self.nragt[ self.k ].astype( np.int64 )
+        for name in [ 'hc', 'rc', 'sh', 'isol', 'st' ]:
+            setattr( self, name, np.zeros( len( self.k ), dtype=np.int8 ) )
+        self.tinf = np.full( len( self.k ), -1, dtype=np.int16 )
+        
+        self.initial_PConf( )
+        self.take_Snapshot( )
+    
+    def get_State( self ):
+        #copy of the cells and pConf
+        return { name: getattr( self, name ).copy() for name in self.Cells + [ 'pConf' ] }
+    
+    def set_State( self, State ):
+        #restores the cells and pConf given by get_State
+        for name in State:
+            setattr( self, name, State[ name ].copy() )
+    
+    def take_Snapshot( self ):
+        #keeps the initial cells and pConf (call after InitialSystem)
+        self.Snapshot = self.get_State( )
+        
     def reset_Realization( self ):
         #restores the initial conditions
+        self.set_State( self.Snapshot )
+    
+    def initial_PConf( self ):
+        #assignment of initial pConf to each type of worker (same rules as in LaborEpiRM)
+        self.pConf[:] = 0
+        w0 = ( self.activ == 1 ) & ( self.comm == 0 )
+        self.pConf[ w0 ] = self.confinrules[ self.CUTh[ w0 ], self.rama[ w0 ]-1 ]
+        self.pConf[ ( self.activ == 1 ) & ( self.comm == 3 ) & ( self.sector == 1 ) ] = 1
+        self.pConf[ self.hasRep & ( self.jobcat == 6 ) ] = 1
+        wr = self.hasRep & ~np.isin( self.jobcat, [5,6] ) & ( self.sector != 3 )
+        self.pConf[ wr ] = self.confinrules[ self.CUTw[ wr ], self.rama[ wr ]-1 ]
+    
+    def split_Cells( self, rows, m ):
+        #moves m[i] residents of the cell rows[i] to a new cell with the same state, returns the new cells
+        nz = m > 0
+        rows = rows[ nz ]
+        self.n[ rows ] -= m[ nz ]
+        new = len( self.n ) + np.arange( len( rows ) )
+        for name in self.Cells[:-1]:
+            col = getattr( self, name )
+            setattr( self, name, np.concatenate( ( col, col[ rows ] ) ) )
+        self.n = np.concatenate( ( self.n, m[ nz ] ) )
+        return new
+    
+    def sample_Cells( self, rows, size, rng ):
+        #moves a sample (without replacement) of size residents of the cells rows to new cells, returns them
+        if len( rows ) == 0:
+            return rows
+        m = rng.multivariate_hypergeometric( self.n[ rows ], size )
+        return self.split_Cells( rows, m )
+    
+    def merge_Cells( self ):
+        #merges the cells with the same state and removes the empty ones
+        keep = np.flatnonzero( self.n > 0 )
+        key = self.k[ keep ].astype( np.int64 )
+        for name, size in [ ( 'hc', 22 ), ( 'rc', 22 ), ( 'sh', 2 ), ( 'isol', 3 ), ( 'st', 3 ) ]:
+            key = key*size + getattr( self, name )[ keep ]
+        key = key*65536 + ( self.tinf[ keep ] + 1 )
+        u, first, inv = np.unique( key, return_index=True, return_inverse=True )
+        n = np.bincount( inv, weights=self.n[ keep ], minlength=len( u ) ).astype( np.int64 )
+        for name in self.Cells[:-1]:
+            setattr( self, name, getattr( self, name )[ keep[ first ] ] )
+        self.n = n
+    
+    def residents_In( self, x ):
+        #cells of the residents of the spatial unit x
+        return np.flatnonzero( self.CUTh[ self.k ] == x )
+    
+    def replicas_In( self, x ):
+        #cells of the residents with a replica in the spatial unit x
+        return np.flatnonzero( self.hasRep[ self.k ] & ( self.CUTw[ self.k ] == x ) )
+    
+    def start_Confinement( self, x, rng, partial = 1 ):
+        #starts the confinement by comuna in the spatial unit x (same as SpatialUnit.start_Confinement)
+        R = self.residents_In( x )
+        if partial != 1:
+            R = self.sample_Cells( R, int( partial*self.n[ R ].sum() ), rng.generator( 'lockdown' ) )
+        W = self.replicas_In( x )
+        if partial != 1:
+            W = self.sample_Cells( W, int( partial*self.n[ W ].sum() ), rng.generator( 'lockdown' ) )
+        self.hc[ R ] = conf_Start( self.hc[ R ], 1 )
+        self.rc[ W ] = conf_Start( self.rc[ W ], 1 )
         
-        for x in range( len( self.ListSU ) ):
-            for i in self.ListSU[x].agents:
-                i.status = 0
-                i.conf = 0
-                i.work = 0
-                i.isol = 0
-                i.day = 0
-                if i.home == 1:
-                    i.on = 1 
-                else:
-                    i.on = 0
+    def end_Confinement( self, x ):
+        #ends confinement by comuna in the spatial unit x
+        R = self.residents_In( x )
+        self.hc[ R ] = conf_End( self.hc[ R ] )
+        W = self.replicas_In( x )
+        self.rc[ W ] = conf_End( self.rc[ W ] )
+    
+    def select_Residents( self, who ):
+        #returns the types of the residents that satisfy all the conditions in who (see parse_Who)
+        return self.Index.select( who )
+    
+    def confine_Residents( self, Sel, kindConf ):
+        #confinement by rama (kindConf=2) or by age (kindConf=3) of the residents of types Sel and their replicas
+        rows = np.isin( self.k, Sel )
+        self.hc[ rows ] = conf_Start( self.hc[ rows ], kindConf )
+        rows &= self.hasRep[ self.k ]
+        self.rc[ rows ] = conf_Start( self.rc[ rows ], kindConf )
+    
+    def isolate_Residents( self, Sel ):
+        #the residents of types Sel and their replicas do not move (isol=2), unless already isolated
+        self.isol[ np.isin( self.k, Sel ) & ( self.isol == 0 ) ] = 2
+    
+    def set_PConf( self, Sel, rules ):
+        #pConf of the types Sel given by the rules of their comuna of workplace
+        self.pConf[ Sel ] = rules[ self.CUTw[ Sel ] ]
+        
+    def does_Work( self, rows, rng ):
+        #number of residents of the cells rows that do not work (Wr=0), work face-to-face (Wr=1) or telework (Wr=2),
+        #with the same probabilities as ArraySystemRM.does_Work. Returns an array (len(rows),3)
+        k = self.k[ rows ]
+        n = self.n[ rows ]
+        conf = self.hc[ rows ]
+        repconf = self.rc[ rows ]
+        comm = self.comm[ k ]
+        commuter = ( comm == 1 ) | ( comm == 2 )
+        free = np.where( commuter, ( conf == 0 ) & ( repconf == 0 ), conf == 0 )
+        r7 = ( self.rama[ k ] == 7 ) & ( self.sector[ k ] != 3 ) & ~np.isin( self.jobcat[ k ], [5,6] ) & ( conf == 2 ) & ( ( comm == 0 ) | ( commuter & ( repconf == 2 ) ) )
+        pConf_t = np.where( r7, self.pConf7[ k ], self.pConf[ k ] )
+        tele = ~free & ( self.telew[ k ] != 0 )
+        lottery = ~free & ( self.telew[ k ] == 0 )
+        Wr = np.zeros( ( len( rows ), 3 ), dtype=np.int64 )
+        Wr[ free, 1 ] = n[ free ]
+        Wr[ tele, 2 ] = n[ tele ]
+        Wr[ lottery, 1 ] = rng.binomial( n[ lottery ], np.clip( pConf_t[ lottery ], 0, 1 ) )
+        Wr[ lottery, 0 ] = n[ lottery ] - Wr[ lottery, 1 ]
+        return Wr
   
 
-def LaborEpiRM( sim, a , b, tmax, B, Nm, Ks, Kns, pD, pA, q, tau0, tau1, SystRM, situation ):
+def LaborEpiRM( sim, a , b, tmax, B, Nm, Ks, Kns, pD, pA, q, tau0, tau1, SystRM, situation, seed=None, saveDead=True, output=0, aggregators=(), policies='Policies_MP.csv', rules='PolicyRules_MP.csv', monitor=None, crn=False, checkpoints=(), restart=None, origin=None, timing=0 ):
     """ Need to create the system and to initialize it as input """   
     #sim: code number of simulation (described in file Codigo)
     #a and b: range for realizations (a<b). For instance: a=0, b=2, will run 2 realizations, starting form rea=0
@@ -472,13 +1673,78 @@ def LaborEpiRM( sim, a , b, tmax, B, Nm, Ks, Kns, pD, pA, q, tau0, tau1, SystRM,
     #tau1: fraction of interaction time in the last round of contagion (eventually changes with curfew)
     #SystRM: initial system of comunas and agents
     #situation: =0 "real" case; =1 without any confinement; =2 with full confinement; >3 without any measure
+    #(scenario of the measures in the file policies, see PolicyTimeline)
+    #seed: None (default) or base seed; realization rea is run with seed_Realization( seed, rea ), so its outcome
+    #does not depend on the other realizations run before it (or in other processes). With SystemRM, it seeds both
+    #random (order of the agents, detection, work, commuting) and the NumPy generator of the contagion draws
+    #saveDead: =True (default) writes the file of D at t=151 for realizations a,...,b-1
+    #output: =0 (default) one text file per realization and day (S_rea_day.csv, 19584x9),
+    #=1 one binary file per realization (S_rea.npy, integer array tmax x 19584 x 9, it can be memory-mapped)
+    #=2 no daily files (the outcomes are computed by the aggregators)
+    #=3 no files at all (as 2, without the files of mobility and detected of each realization)
+    #aggregators: objects that receive each day the distribution of agents by type (Agg.add_Day( rea, t, DistDay )),
+    #see OutcomeProcessSIRLabor.Aggregators; Agg.finish() must be called after the last realization.
+    #If an aggregator has the method add_Realization, it also receives the series of cumulative detected cases
+    #by comuna and of mobility of each realization (Agg.add_Realization( rea, Detected_RM, Mobility ))
+    #policies, rules: files of measures by scenario and of pConf rules (see PolicyTimeline)
+    #monitor: None (default) or function called at the end of each day with the cumulative detected cases by comuna
+    #of the realization so far (monitor( rea, t, Detected_RM ), rows 0,...,t); if it returns True, the realization
+    #is stopped (its files of mobility and detected are not written, the aggregators keep the days already given)
+    #and no more realizations are run (e.g. early rejection of a calibration point, see CalibrationSIRLabor)
+    #crn: =False (default) one random stream per realization; =True common random numbers (requires seed and
+    #backend ArraySystemRM or CohortSystemRM): one stream per realization, purpose and day (see RandomStreams), so that
+    #the realizations of scenarios run with the same seed are paired, and their differences have a low variance
+    #checkpoints: days t at whose end the state of each realization is saved to the file S_rea_t.ckpt (checkpoint_Path),
+    #so that it can be continued from there (backends ArraySystemRM and CohortSystemRM)
+    #restart: None (default) or day t: each realization continues from the checkpoint of day t of the simulation origin
+    #(=sim if None), if it exists (otherwise it runs from day 0). With origin=sim a run that was stopped continues; with
+    #another origin the scenario situation is a branch of the scenario of origin from day t+1 on (both scenarios must have
+    #the same measures until day t, see LaborEpiBranchRM). The files of the days before restart are those of origin
+    #(output=1: they are copied to the new file S_rea.npy), and the aggregators receive only the days after restart
+    #timing: =0 (default) no timing; =1 the wall time and number of calls of each phase of the day (measures, detection,
+    #work, commuting, each round of contagion, new infections, outputs, checkpoints; each one is counted once a day in
+    #all the backends) are written by realization to
+    #S_Timing_rea_u.csv; =2 also the peak of the memory allocated each day, S_Memory_rea_u.csv (see PhaseTimer)
+    #Returns DeadRM (D at t=151 for each realization; nan for the realizations not finished), or None if the options
+    #can not be used with this backend (see check_Options)
+    
+    backend = 1 if isinstance( SystRM, ArraySystemRM ) else 2 if isinstance( SystRM, CohortSystemRM ) else 0
+    if not check_Options( backend, seed, crn, checkpoints, restart ):
+        return None
+    
+    Run = RunRM( sim, a, b, tmax, seed=seed, saveDead=saveDead, output=output, aggregators=aggregators, monitor=monitor,
+                 checkpoints=checkpoints, restart=restart, origin=origin, timing=timing )
+    model = dict( B=B, Nm=Nm, Ks=Ks, Kns=Kns, pD=pD, pA=pA, q=q, tau0=tau0, situation=situation, policies=policies, rules=rules, crn=crn )
+    
+    if isinstance( SystRM, ArraySystemRM ): #struct-of-arrays backend
+        return LaborEpiArrayRM( Run, SystRM, **model )
+    if isinstance( SystRM, CohortSystemRM ): #type-level (cohort) backend
+        return LaborEpiCohortRM( Run, SystRM, **model )
    
       
     
     
-    DeadRM = np.zeros( ( (b-a),1 )) #vector to keep track of D
+    rng = np.random.default_rng() #contagion draws (see SystemRM.get_Infected)
+    
+    Timer = Run.Timer
+    
+    Policies = PolicyTimeline( policies, rules, situation )
+    Policies.compile( SystRM )
+    
+    #Potential commuters (ids of Residents, taken from the index). The distribution of commuters
+    #who work in either shift changes each realization, and the lists follow the random order of the
+    #agents of the realization (a shuffle of SystRM.get_Agents(), kept as the permutation Perm)
+    T0ids = SystRM.Index.select( parse_Who( 'activ=1&jobcat!=6&comm=0' ) )
+    T1ids = np.union1d( SystRM.Index.select( parse_Who( 'activ=1&jobcat!=6&comm=3' ) ),
+                        SystRM.Index.select( parse_Who( 'activ=1&jobcat!=6&comm=1|2&jornada=1' ) ) )
+    T2ids = SystRM.Index.select( parse_Who( 'activ=1&jobcat!=6&comm=1|2&jornada=2' ) )
+    T4ids = SystRM.Index.select( parse_Who( 'jobcat=6&comm=1|2' ) )
     
     AllAgents = SystRM.get_Agents( )
+    Pos = { id( i ): k for k, i in enumerate( AllAgents ) }
+    ResPos = np.array( [ Pos[ id( i ) ] for i in SystRM.Residents ] ) #position of each resident in AllAgents
+    del( Pos )
+    Perm = list( range( len( AllAgents ) ) )
     
     
     for rea in range( a , b ):  #for each realization
@@ -486,55 +1752,35 @@ def LaborEpiRM( sim, a , b, tmax, B, Nm, Ks, Kns, pD, pA, q, tau0, tau1, SystRM,
         
         tau1 = 6.0/24.0 #initial time fraction of last round of contagion (it will change due to the curfew)
         
-        random.shuffle( AllAgents )
+        if seed != None: #the realization starts from the same order of agents, whatever the previous realizations
+            random.seed( seed_Realization( seed, rea ) )
+            rng = np.random.default_rng( seed_Realization( seed, rea ) )
+            Perm = list( range( len( AllAgents ) ) )
+        random.shuffle( Perm )
+        Rank = np.empty( len( Perm ), dtype=np.int64 ) #position of each agent in the shuffled order
+        Rank[ np.array( Perm ) ] = np.arange( len( Perm ) )
         
-        #Initial pConf (assignment of initial pConf to each worker, some of them will change in time)
-        for i in AllAgents:
-            if i.home == 1 and i.activ == 1:
-                if i.comm == 0:
-                    i.pConf = SystRM.ListSU[ i.su ].confinrules[ int(i.rama)-1 ]
-                elif i.comm == 3:
-                    if i.sector == 1:
-                        i.pConf = 1
-                    else:
-                        i.pConf = 0
-                else:
-                    if i.jobcat == 5:
-                        i.pConf = 0
-                    elif i.jobcat == 6:
-                        i.pConf = 1
-                    else:
-                        if i.sector == 3:
-                            i.pConf = 0
-                        else:
-                            i.pConf = SystRM.ListSU[ i.replica.su ].confinrules[ int(i.rama)-1 ]
+        #The initial pConf of each worker is set by SystRM (initial_PConf, restored by reset_Realization)
         
         
-                    
         #Lists for tracking agents for updating
         
-        I_rea = []
-        R_rea = []
-        S_rea = SystRM.get_S_AgtsSU() #list of lists, includes agents and replicas
+        InfQ = InfectionQueue( )
+        S_rea = [ SusceptiblePool( S ) for S in SystRM.get_S_AgtsSU() ] #S agents and replicas of each SU
         
         #Matrix Mobility keeps track of time spent in workplaces whenever these
         #workplaces are inside RM (i.e. excludes commuting outside the RM)
         #This matrix allows us to compare mobility with Google Analytics Reports
-        Mobility = np.zeros( ( tmax,1 ) )
-        
-        #Matrices that keep track of infected in their detection day. Only for showing calibration results        
-        Detected_RM = np.zeros( ( tmax, 51 ) )
-        Detected_RM_Cum = np.zeros( ( 1, 51 ) ) 
+        #Matrices Detected_RM, Detected_RM_Cum keep track of infected in their detection day. Only for showing calibration results
+        Run.begin_Realization( rea )
+        Mobility, Detected_RM_Cum = Run.Mobility, Run.Detected_RM_Cum
         
         #To keep track the total number of dead at t=151 (i.e. July 30)
         Fall = 0
         
         
         
-        #Initial cases (March 1) (week 9 informe epid, pD 0.05)
-        #Retrieved from https://github.com/MinCiencia/Datos-COVID19, november 03
-        #Initial infected at t=0, a list including all the spatial units
-        I_Init =  [1,1,1,0,0,1,1,0,0,1,0,1,0,1,0,1,0,0,0,1,0,1,0,1,0,1,0,0,0,1,0,0,3,0,0,1,0,0,0,0,0,0,0,0,0,0,0,0,0,0,1]
+        #Initial cases (March 1), I_Init
         
         for x in range( 51 ):
             if I_Init[x] > 0:
@@ -546,17 +1792,16 @@ def LaborEpiRM( sim, a , b, tmax, B, Nm, Ks, Kns, pD, pA, q, tau0, tau1, SystRM,
                     S_rea[x].remove( j )
                     if j.replica != None:
                         S_rea[ j.replica.su ].remove( j.replica )
-                    I_rea.append( j ) 
+                InfQ.add( -1, Inx )
                 del( S_Su )
                 
-        #List of potential commuters. The distribution of commuters who work in either shift (randomly chosen) changes each realization
+        #List of potential commuters, in the order of the realization. The distribution of commuters who work in either shift (randomly chosen) changes each realization
         
-        T0 = [ i for i in AllAgents if i.home == 1 and i.activ == 1 and i.comm == 0 and i.jobcat != 6 ]
-        T1 = [ i for i in AllAgents if i.home == 1 and i.activ == 1 and i.jobcat != 6 and ( i.comm == 3 or ( i.comm in [1,2] and i.jornada == 1 ) ) ]
-        T2 = [ i for i in AllAgents if i.home == 1 and i.activ == 1 and i.jobcat != 6 and i.jornada == 2 and i.comm in [1,2] ]
+        T0, T1, T2, T4 = [ [ SystRM.Residents[k] for k in ids[ np.argsort( Rank[ ResPos[ ids ] ] ) ] ] for ids in [ T0ids, T1ids, T2ids, T4ids ] ]
         T2_morning = random.sample( T2, int( 0.5*len( T2 ) ) )
-        T2_afternoon = [ i for i in T2 if i not in T2_morning ]
-        T4 = [ i for i in AllAgents if i.home == 1 and i.jobcat == 6 and i.comm in [1,2] ]
+        Morning = set( T2_morning )
+        T2_afternoon = [ i for i in T2 if i not in Morning ]
+        del( Morning )
         
         
         
@@ -565,399 +1810,74 @@ def LaborEpiRM( sim, a , b, tmax, B, Nm, Ks, Kns, pD, pA, q, tau0, tau1, SystRM,
         
         d = 7
        
+        Run.start_Days( t )
                 
         while t < tmax:
             
             
-            if situation == 0: #"real case"
+            #Measures and special events (confinement measures, teleworking, curfew, etc.) of the scenario
             
-                
-                #Measures and special events (confinement measures, teleworking, etc.)
+            tau1 = Policies.apply_Day( SystRM, t, tau1 )
+            Timer.mark( 'policies' )
             
-                # 1) Closing of rama = 16 (schools, universities, etc.)- March 15, effective from March 16. i.conf=2
-                if t == 15:
-                    Agents16 = [ i for i in AllAgents if i.home == 1 and i.rama == 16 ]
-                    for i in Agents16:
-                        i.on_Confinement( 2 )
-                        if i.replica != None:
-                            i.replica.on_Confinement( 2 )
-                                          
-                # 2) Teleworking in Administracion Publica (more or less implemented March 19). i.conf=2.
-                # 3)Malls closing - affects rama 7
-                if t == 18:
-                    Agents15 = [ i for i in AllAgents if i.home == 1 and i.rama == 15 ]
-                    for i in Agents15:
-                        i.on_Confinement( 2 )
-                        if i.replica != None:
-                            i.replica.on_Confinement( 2 )
-                    Agents7 = [ i for i in AllAgents if i.home == 1 and i.rama == 7 ]
-                    for i in Agents7:
-                        i.on_Confinement( 2 )
-                        if i.replica != None:
-                            i.replica.on_Confinement( 2 )
-                                 
-                # 4) Closing of cinemas, theaters, restaurants, pubs, and sport facilities, March 21.
-                # This measure affects part of rama=9 and rama=18. i.conf = 2
-                if t == 20:
-                    Agents9_18 = [ i for i in AllAgents if i.home == 1 and i.rama in [9,18] ]
-                    for i in Agents9_18:
-                        i.on_Confinement( 2 )
-                        if i.replica != None:
-                            i.replica.on_Confinement( 2 )
-                            
-                # 5) Curfew (toque de queda). March 22. Affects the last round of contagion.
-                if t >= 21:
-                    tau1 = 5.0/24.0
-                
-                # 6) Mandatory confinementent of old people (>= 80 years) - March 24 - 
-                # Self-confinement: (assumption) People with [50,80) years, educ in 4,5, and not working or teleworking
-                
-                if t == 23:
-                    Agents_age80 = [ i for i in AllAgents if i.home == 1 and i.age == 17 ]
-                    for i in Agents_age80:
-                        i.on_Confinement( 3 )
-                        if i.replica != None:
-                            i.replica.on_Confinement( 3 )
-                        if i.isol == 0:
-                            i.isol = 2
-                            if i.replica != None:
-                                i.replica.isol = 2
-                   
-                    Agents_age50_high = [ i for i in AllAgents if i.home == 1 and i.age in [11,12,13,14,15,16] and i.educ in [4,5] and ( i.activ != 1 or ( i.activ == 1 and i.telew == 1 and i.rama != 17 ) ) ]
-                    for i in Agents_age50_high:
-                        i.on_Confinement( 3 )
-                        if i.replica != None:
-                            i.replica.on_Confinement( 3 )    
-                            
-                            
-                # 7) Confinement (March 26 night --> March 27 morning): Lo Barnechea (partial 97.3%), Vitacura, Las Condes, Providencia, Santiago, Ñuñoa, Independencia.
-                #Confinement rules ramas 9 and 18 according to Instructivo 1.
-                            
-                if t == 26:
-                    SystRM.ListSU[14].start_Confinement( partial = 0.973 )
-                    ComConf = [ 0,7,13,19,22,31 ]
-                    for x in ComConf:
-                        SystRM.ListSU[x].start_Confinement( partial = 1 )
-                        
-                    Agts_rama918 = [ i for i in AllAgents if i.home == 1 and i.activ == 1 and (i.rama in [9,18]) and i.comm <=2 and (i.jobcat not in [5,6]) and i.sector !=3 ]
-                    rules_9 = [0.391976187,0.511875512,0.55,0.633676093,0.629807692,0.558896313,0.388353414,0.81517094,0.433873497,0.473962571,0.427672956,0.400974026,0.457234363,0.484398724,0.452434998,0.555555556,0.486778846,0.521727973,0.566666667,0.473073202,0.439093484,0.462666145,0.536728566,0.694219538,0.88252149,0.520616642,0.449798721,0.803463203,0.403250774,0.531933899,0.480620155,0.416213655,0.541821561,0.397420147,0.343283582,0.326189726,0.674634794,0.841296928,0.477348777,0.465317919,0.488372093,0.473282443,0.544971893,0.38356974,0.239130435,0.459016393,0.507857143,0.435233161,0.264214047,0.428819444,0.458072591]
-                    rules_18 = [0.001344011,0.017857143,0,0,0,0.001587302,0,0.000346741,0,0.01715439,0.033333333,0,0.001929012,0.00152391,0.001868207,0,0,0.001583531,0.000597372,0.000125282,0.013513514,0.004065041,0.001447078,0,0,0,0,0,0,0.002257336,0,0.002480022,0.001078749,0,0,0,0,0,0,0.000979432,0.025,0,0,0.019230769,0,0,0,0,0,0,0.003030303]
-                    for j in Agts_rama918:
-                        if j.rama == 9:
-                            j.pConf = rules_9[ j.order_CUTw() ]
-                        else:
-                            j.pConf = rules_18[ j.order_CUTw() ]
-                
-                # 8) New confinement rules (Instructivo 2) - April 2
-                
-                if t == 32:
-                    Agts_rama68131418 = [ i for i in AllAgents if i.home == 1 and i.activ == 1 and (i.rama in [6,8,13,14,18]) and i.comm <=2 and (i.jobcat not in [5,6]) and i.sector !=3 ]
-                    rules_6 = [0.035758243,0.000249906,0.009450473,0.00287234,0.000401445,0.004246815,0.035407433,0,0.000134898,0.012295299,0,0.000319285,0.000870133,0.053334693,0.027056633,0.000468604,0.000472813,0.000121743,0.006339982,0.006661749,0.036572248,0.000723327,0.004784538,0.004072609,0.002893947,0.010225231,0.001117545,0.053275662,0.091791553,0.099163059,0,0.002688807,0.019400786,0,0,0.01843318,0.002733598,0,0.018754423,0.001283285,0,0.165266106,0.005059631,0,0.006711409,0,0,0.00128041,0,0,0.000274499]
-                    rules_8 = [0.784726596,0.954000436,0.56043956,0.916374562,0.888663968,0.490662438,0.632779161,0.738021638,0.758106022,0.800846177,0.910922587,0.903013699,0.701140065,0.724905382,0.848421053,0.942982456,0.776386404,0.950196592,0.874547312,0.802397149,0.762886598,0.874945151,0.81243997,0.86889332,0.974326402,0.519360902,0.868006993,0.887513751,0.968149646,0.760928962,0.9125,0.109670638,0.84676354,0.952714536,0.723076923,0.891231286,0.882196466,0.89456869,0.812801285,0.873200443,0.942105263,0.895746888,0.846153846,0.904051173,0.846153846,0.823529412,0.827642276,0.872222222,0.878331402,0.926169591,0.728547154]
-                    rules_13 =[0.02762702,0.067650677,0.18487395,0.12329932,0.076205288,0.067354699,0.003307607,0.023462783,0.034839204,0.057528343,0.086956522,0.032258065,0.046686511,0.005067366,0.044543984,0.245,0.162094763,0.028865164,0.144761397,0.020182374,0.021526419,0.054545455,0.005312832,0.025935532,0.032979639,0.030917553,0.021047479,0.004213327,0.03816047,0.032494197,0.025531915,0.011162066,0.14720986,0.028225806,0.014792899,0.075689784,0.070619587,0.116883117,0.082922014,0.141821112,0.033980583,0.012931034,0.086474501,0.022082019,0.111111111,0.375,0.203669725,0.007692308,0.064516129,0.071428571,0.108956602]
-                    rules_14 = [0.409129886,0.193347193,0.440316206,0.564774656,0.336471551,0.420006517,0.359611559,0.670524412,0.210947931,0.434208638,0.054764513,0.293494705,0.27464367,0.129914829,0.14563591,0.177897574,0.322580645,0.445812266,0.225176568,0.215839575,0.426487093,0.725606963,0.19005309,0.242094017,0.161824295,0.121266428,0.113072766,0.103007878,0.358832225,0.473580643,0.411483254,0.134729294,0.380033685,0.323076923,0.010273973,0.610806306,0.081185567,0.448113208,0.349690804,0.550053438,0.32238193,0.365327381,0.218444968,0.338461538,0.034482759,0.06,0.4017991,0.125,0.030744337,0.119897959,0.540950455]
-                    rules_18b = [0.125217002,0.017857143,0,0,0,0.007936508,0,0.723300971,0,0.025227043,0.033333333,0,0.001929012,0.004098791,0.001868207,0.022222222,0,0.001583531,0.347072879,0.000375846,0.189189189,0.01300813,0.004754686,0.040816327,0,0,0,0.007246377,0.002293578,0.002257336,0,0.002480022,0.005393743,0,0,0.006635071,0.094488189,0.242424242,0.11751663,0.001958864,0.025,0,0,0.019230769,0,0,0,0,0,0.024390244,0.006060606]
-                    for j in Agts_rama68131418:
-                        if j.rama == 6:
-                            j.pConf = rules_6[ j.order_CUTw() ]
-                        elif j.rama == 8:
-                            j.pConf = rules_8[ j.order_CUTw() ]
-                        elif j.rama == 13:
-                            j.pConf = rules_13[ j.order_CUTw() ]
-                        elif j.rama == 14:
-                            j.pConf = rules_14[ j.order_CUTw() ]
-                        else:
-                            j.pConf = rules_18b[ j.order_CUTw() ]
-                            
-                # 9) Ending confinement: Independencia (April 2, night -> April 3 morning)
-                
-                if t == 33:
-                    SystRM.ListSU[7].end_Confinement()
-                    
-                
-                # 10) Partial confinement: Puente Alto (49.9%) (April 9 night --> April 10)
-                if t == 40:
-                    SystRM.ListSU[32].start_Confinement( partial = 0.499 )
-                
-                # 11) Ending confinement, total: Lo Barnechea, Vitacura, Providencia. Partial: Ñuñoa, Santiago
-                # Partial confinement: Santiago (76.8%), Ñuñoa (76.8%). (April 13)
-                if t == 43:
-                    ComEnd = [ 0,19,14,22,31 ]
-                    for x in ComEnd:
-                        SystRM.ListSU[x].end_Confinement( )
-                    SystRM.ListSU[0].start_Confinement( partial = 0.768 )
-                    SystRM.ListSU[19].start_Confinement( partial = 0.768 )
-                            
-                # 12) Ending confinement: Las Condes. Confinement: El Bosque. Partial confinement: 
-                # San Bernardo (42.1%) (April 17)
-                # New confinement rules (Instructivo 3)
-                if t == 47:
-                    SystRM.ListSU[13].end_Confinement()
-                    SystRM.ListSU[4].start_Confinement( partial = 1 )
-                    SystRM.ListSU[38].start_Confinement( partial = 0.421 )
-                    
-                    Agts_rama8 = [ i for i in AllAgents if i.home == 1 and i.activ == 1 and i.rama == 8 and i.comm <=2 and (i.jobcat not in [5,6]) and i.sector !=3 ]
-                    rules_8b = [0.839078886,0.962502725,0.611158073,0.932398598,0.904453441,0.521212121,0.649937767,0.773570325,0.782810087,0.828649139,0.928950159,0.910684932,0.708469055,0.798267121,0.878596491,0.96125731,0.828264758,0.957011796,0.906397994,0.850016197,0.769072165,0.883282141,0.877256318,0.955051512,0.98562546,0.528759398,0.921328671,0.892051705,0.984327604,0.862021858,0.920833333,0.129000234,0.858872743,0.954465849,0.738461538,0.916895814,0.886946608,0.897763578,0.95661489,0.896456257,0.943157895,0.897302905,0.895604396,0.946695096,0.846153846,0.904411765,0.828455285,0.877777778,0.908458864,0.975146199,0.83942226]
-                    for j in Agts_rama8:
-                        j.pConf = rules_8b[ j.order_CUTw() ]
-            
-                # 13) Confinement: Pedro Aguirre Cerda, Quinta Normal. Partial confinement: Independencia (29.7%)
-                # (April 23 night --> April 24 morning)
-                if t == 54:
-                    SystRM.ListSU[20].start_Confinement( partial = 1 )
-                    SystRM.ListSU[25].start_Confinement( partial = 1 )
-                    SystRM.ListSU[7].start_Confinement( partial = 0.297 )
-                        
-                #14) Partial Confinement: La Pintana (46.7%), San Ramon (56.5%). 
-                # Confinement: Estacion Central, Independencia (rest). (April 30 night --> May 1 morning).
-                
-                if t == 61:
-                    SystRM.ListSU[5].start_Confinement( partial = 1 )
-                    SystRM.ListSU[7].start_Confinement( partial = 1 )
-                    SystRM.ListSU[11].start_Confinement( partial = 0.467 )
-                    SystRM.ListSU[30].start_Confinement( partial = 0.565 )
-                    
-                    
-                # 15) Confinement: Cerrillos, Recoleta, Santiago (rest).
-                # Partial confinement: Quilicura (99.4%). (May 5 night -> May 6 morning) 
-                if t == 66:
-                    SystRM.ListSU[0].start_Confinement( partial = 1 )
-                    SystRM.ListSU[1].start_Confinement( partial = 1 )
-                    SystRM.ListSU[24].start_Confinement( partial = 0.994 )
-                    SystRM.ListSU[26].start_Confinement( partial = 1 )
-            
-                # 16) Ending confinement Ñuñoa (May 7 night --> May 8 morning)
-                if t == 68:
-                    SystRM.ListSU[19].end_Confinement( )                
-                
-                #17) Confinement: San Ramon (rest), La Pintana (rest), San Miguel, San Joaquín, Renca,
-                # Cerro Navia, Conchali, La Cisterna, La Florida, La Granja, Lo Espejo, Lo Prado, Macul, Peñalolen
-                # Partial confinement: Puente Alto (increase until 97.7%), San Bernardo (increase until 62.7%)
-                # (May 8 night --> May 9 morning) 
-                if t == 69:
-                    ComConf = [ 3,27,2,16,29,28,17,21,15,8,30,10,9,11 ]
-                    for x in ComConf:
-                        SystRM.ListSU[x].start_Confinement( partial = 1 )
-                    SystRM.ListSU[32].start_Confinement( partial = 0.977 )
-                    SystRM.ListSU[38].start_Confinement( partial = 0.627 )
-            
-                #18) Confinement of people with 75 or more years (i.e until 79, because >=80 are already confined).
-                # Confinement: Lampa, Colina, Quilicura (rest), Huechuraba, Pudahuel, Providencia, Vitacura, Lo Barnechea, 
-                # Las Condes, Maipú, Padre Hurtado, Ñuñoa, Puente Alto (rest), San Bernardo (rest), Buin, La Reina.
-                # (May 15 night --> May 16 morning).
-                if t == 76:
-                    Agents_75 = [ i for i in AllAgents if i.home == 1 and i.age == 16 ]
-                    for i in Agents_75:
-                        i.on_Confinement( 3 )
-                        if i.replica != None:
-                            i.replica.on_Confinement( 3 )
-                        if i.isol == 0:
-                            i.isol = 2
-                            if i.replica != None:
-                                i.replica.isol = 2
-                        
-                                
-                    ComConf = [ 36,35,24,6,23,22,31,14,13,18,49,19,32,38,39,12 ]
-                    for x in ComConf:
-                        SystRM.ListSU[x].start_Confinement( partial = 1 )
-                
-                
-                #19) New confinement rules (May 27). Ramas 10 and 19 (Instructivo 6)
-                if t == 87:
-                    rules_10 = [0.363608563,0.979029605,0.913978495,0.835185185,0.681818182,0.260135135,0.759002338,0.691943128,0.950504125,0.210626186,0.865853659,0.834782609,0.115076014,0.572575546,0.665594855,0.988764045,0.666666667,0.916751269,0.50309119,0.798590131,0.6,0.612648221,0.520888993,0.65325285,0.590772317,0.63880289,0.893125671,0.687272727,0.749094671,0.583993661,0.744186047,0.743822076,0.574529667,0.784313725,0.878787879,0.445283019,0.531147541,0.204545455,0.474332649,0.696864111,0.966216216,0.770114943,0.426829268,0.394736842,0.92,0.833333333,0.736434109,0.842105263,0.386363636,0.740112994,0.758490566]
-                    rules_19 = [0.00183531,0.000656599,0.016722408,0.001011122,0.00267666,0.003370614,0.002629602,0.059984896,0.029272899,0.02179676,0.027104137,0.004864489,0.00147232,0.008024586,0.000930665,0.012669683,0.005263158,0.000740741,0.004814765,0.001929571,0.00097229,0.002251472,0.092587216,0.004060456,0.070404172,0.00497822,0.002403021,0.007168459,0.010692178,0.015388097,0.030534351,0.003627428,0.013106525,0,0,0.00295858,0.005263158,0.008810573,0.018510158,0.006242906,0,0.009950249,0.009615385,0.017326733,0,0,0.006648936,0.012269939,0.001342282,0.00310559,0.02510917]
-                    Agts_rama1019 = [ i for i in AllAgents if i.home == 1 and i.activ == 1 and i.rama in [10,19] and i.comm <=2 and (i.jobcat not in [5,6]) and i.sector !=3 ]
-                    for j in Agts_rama1019:
-                        if j.rama == 10:
-                            j.pConf = rules_10[ j.order_CUTw() ]
-                        else:
-                            j.pConf = rules_19[ j.order_CUTw() ]
-                
-                #20) Confinement of Melipilla (58.4%), Curacavi (57.4%) , Tiltil (27.7%), San José de Maipo (34.3%) 
-                # and Peñaflor. (June 12 night --> June 13 morning). 
-                
-                if t == 104:
-                    SystRM.ListSU[42].start_Confinement( partial = 0.584 )
-                    SystRM.ListSU[43].start_Confinement( partial = 0.574 )
-                    SystRM.ListSU[37].start_Confinement( partial = 0.277 )
-                    SystRM.ListSU[34].start_Confinement( partial = 0.343 )
-                    SystRM.ListSU[50].start_Confinement( partial = 1 )
-                                 
-                #21) Confinement Calera de Tango, El Monte, Talagante, conf=1. ( June 27 )
-                if t == 118:
-                    ComConf = [ 40, 46, 47 ]
-                    for x in ComConf:
-                        SystRM.ListSU[x].start_Confinement( partial = 1 )
-                
-                #22) New confinement rules (July 9) (Instructivo 9)
-                if t == 130:
-                    rules_6b = [0.570463821,0.17693365,0.879243962,0.226702128,0.732838218,0.645515863,0.410841427,0.415950093,0.646297046,0.573533309,0.781087634,0.727650064,0.296606482,0.127764298,0.166940519,0.939081537,0.845390071,0.43450207,0.720908731,0.739454094,0.673359627,0.671850512,0.244017749,0.63870142,0.145650256,0.532126572,0.433912425,0.507437493,0.779291553,0.706378066,0.85824123,0.153852972,0.815692534,0.628571429,0.542168675,0.47281106,0.476267396,0.83125,0.632814343,0.561116458,0.614876033,0.560690943,0.745934225,0.776274714,0.355704698,0.602678571,0.738831615,0.774647887,0.722998729,0.668604651,0.555037057]
-                    rules_13b = [0.02762702,0.067650677,0.193277311,0.12329932,0.076205288,0.067354699,0.003365636,0.023462783,0.034839204,0.057528343,0.086956522,0.189964158,0.046686511,0.006084101,0.044543984,0.245,0.16957606,0.028865164,0.144761397,0.020182374,0.021526419,0.054545455,0.011007632,0.025935532,0.032979639,0.030917553,0.021047479,0.056436412,0.175146771,0.032494197,0.029787234,0.011162066,0.155083875,0.028225806,0.014792899,0.07606264,0.070619587,0.116883117,0.09970385,0.141821112,0.033980583,0.012931034,0.086474501,0.022082019,0.111111111,0.375,0.203669725,0.007692308,0.064516129,0.071428571,0.108956602]
-                    Agts_rama613 = [ i for i in AllAgents if i.home == 1 and i.activ == 1 and i.rama in [6,13] and i.comm <=2 and (i.jobcat not in [5,6]) and i.sector !=3 ]
-                    for j in Agts_rama613:
-                        if j.rama == 6:
-                            j.pConf = rules_6b[ j.order_CUTw() ]
-                        else:
-                            j.pConf = rules_13b[ j.order_CUTw() ]
-                
-                #23) Confinement ending in: Colina, La Reina, Las Condes, Lo Barnechea, Ñuñoa, Vitacura, Tiltil
-                # Confinement: Isla de Maipo (July 28)
-                if t == 149:
-                    SystRM.ListSU[48].start_Confinement( partial = 1 )
-                    ComEnd = [ 35,12,13,14,19,31,37 ]
-                    for x in ComEnd:
-                        SystRM.ListSU[x].end_Confinement( )
-                    
-                        
-                            
-                    
-            elif situation == 1: #without any comuna/rama confinement. Just voluntary confinement of people >= 65, not working. From March 24.
-                if t == 23:
-                    Agents_65 =[ i for i in AllAgents if i.home == 1 and i.activ != 1 and i.age in [14,15,16,17] ]
-                    for i in Agents_65:
-                        i.on_Confinement( 3 )                       
-            
-                                   
-            elif situation == 2:  #follows sit=0 until t=25. On t=26, instead of locking down a selective number of comunas, they are all locked down
-                # 1) Closing of rama = 16 (schools, universities, etc.)- March 15, effective from March 16. i.conf=2
-                if t == 15:
-                    Agents16 = [ i for i in AllAgents if i.home == 1 and i.rama == 16 ]
-                    for i in Agents16:
-                        i.on_Confinement( 2 )
-                        if i.replica != None:
-                            i.replica.on_Confinement( 2 )
-                                          
-                # 2) Teleworking in Administracion Publica (more or less implemented March 19). i.conf=2.
-                # 3)Malls closing - affects rama 7
-                if t == 18:
-                    Agents15 = [ i for i in AllAgents if i.home == 1 and i.rama == 15 ]
-                    for i in Agents15:
-                        i.on_Confinement( 2 )
-                        if i.replica != None:
-                            i.replica.on_Confinement( 2 )
-                    Agents7 = [ i for i in AllAgents if i.home == 1 and i.rama == 7 ]
-                    for i in Agents7:
-                        i.on_Confinement( 2 )
-                        if i.replica != None:
-                            i.replica.on_Confinement( 2 )
-                                 
-                # 4) Closing of cinemas, theaters, restaurants, pubs, and sport facilities, March 21.
-                # This measure affects part of rama=9 and rama=18. i.conf = 2
-                if t == 20:
-                    Agents9_18 = [ i for i in AllAgents if i.home == 1 and i.rama in [9,18] ]
-                    for i in Agents9_18:
-                        i.on_Confinement( 2 )
-                        if i.replica != None:
-                            i.replica.on_Confinement( 2 )
-                            
-                # 5) Curfew (toque de queda). March 22. Affects the last round of contagion.
-                if t >= 21:
-                    tau1 = 5.0/24.0
-                
-                # 6) Mandatory confinementent of old people (>= 80 years) - March 24 - 
-                # Self-confinement: (assumption) People with [50,80) years, educ in 4,5, and not working or teleworking
-                
-                if t == 23:
-                    Agents_age80 = [ i for i in AllAgents if i.home == 1 and i.age == 17 ]
-                    for i in Agents_age80:
-                        i.on_Confinement( 3 )
-                        if i.replica != None:
-                            i.replica.on_Confinement( 3 )
-                        if i.isol == 0:
-                            i.isol = 2
-                            if i.replica != None:
-                                i.replica.isol = 2
-                   
-                    Agents_age50_high = [ i for i in AllAgents if i.home == 1 and i.age in [11,12,13,14,15,16] and i.educ in [4,5] and ( i.activ != 1 or ( i.activ == 1 and i.telew == 1 and i.rama != 17 ) ) ]
-                    for i in Agents_age50_high:
-                        i.on_Confinement( 3 )
-                        if i.replica != None:
-                            i.replica.on_Confinement( 3 )    
-                            
-                            
-                # 7) Confinement (March 26 night --> March 27 morning): All the comunas
-                #Confinement rules ramas 9 and 18 according to Instructivo 1.
-                            
-                if t == 26:
-                    for x in range( 51 ):
-                        SystRM.ListSU[x].start_Confinement( partial = 1 )
-                        
-                    Agts_rama918 = [ i for i in AllAgents if i.home == 1 and i.activ == 1 and (i.rama in [9,18]) and i.comm <=2 and (i.jobcat not in [5,6]) and i.sector !=3 ]
-                    rules_9 = [0.391976187,0.511875512,0.55,0.633676093,0.629807692,0.558896313,0.388353414,0.81517094,0.433873497,0.473962571,0.427672956,0.400974026,0.457234363,0.484398724,0.452434998,0.555555556,0.486778846,0.521727973,0.566666667,0.473073202,0.439093484,0.462666145,0.536728566,0.694219538,0.88252149,0.520616642,0.449798721,0.803463203,0.403250774,0.531933899,0.480620155,0.416213655,0.541821561,0.397420147,0.343283582,0.326189726,0.674634794,0.841296928,0.477348777,0.465317919,0.488372093,0.473282443,0.544971893,0.38356974,0.239130435,0.459016393,0.507857143,0.435233161,0.264214047,0.428819444,0.458072591]
-                    rules_18 = [0.001344011,0.017857143,0,0,0,0.001587302,0,0.000346741,0,0.01715439,0.033333333,0,0.001929012,0.00152391,0.001868207,0,0,0.001583531,0.000597372,0.000125282,0.013513514,0.004065041,0.001447078,0,0,0,0,0,0,0.002257336,0,0.002480022,0.001078749,0,0,0,0,0,0,0.000979432,0.025,0,0,0.019230769,0,0,0,0,0,0,0.003030303]
-                    for j in Agts_rama918:
-                        if j.rama == 9:
-                            j.pConf = rules_9[ j.order_CUTw() ]
-                        else:
-                            j.pConf = rules_18[ j.order_CUTw() ]
-
-            else:
-                pass
-                
             
             #A day begins
             #Detecting, isolating I
             
-            I_rea_update = I_rea.copy()
-            if len( I_rea_update ) > 0: #if there are I (notice that in this list there are only agents, there are not replicas)
-                for i in I_rea_update:
-                    if i.day == 6: # Possible detection/isolation
-                        i.day = i.day + 1
-                        pr_i = random.random()
-                        if pr_i <= pA*pD: # I isolated and detected.
-                            i.on = 0 
-                            i.isol = 1
-                            if i.replica != None:
-                                i.replica.on = 0
-                                i.replica.isol = 1
-                            Detected_RM_Cum[0][i.order_CUTh()] += 15
-                            
-                        elif  (pA*pD) < pr_i <= ((pA*pD)+(pA*(1-pD))): #Isolated, not detected
-                            i.on = 0
-                            i.isol = 1
-                            if i.replica != None:
-                                i.replica.on = 0
-                                i.replica.isol = 1
-                        elif  ((pA*pD)+(pA*(1-pD))) < pr_i <= ((pA*pD)+(pA*(1-pD))+((1-pA)*pD)): #Not isolated, detected
-                            Detected_RM_Cum[0][i.order_CUTh()] += 15
-                            
-                        else: #Not isolated, not detected
-                            pass   
-                    elif i.day >= 13: #Recovered
-                        i.update_Status ( 2, q ) #I--> R/D
-                        R_rea.append( i )
-                        I_rea.remove( i )
-                        if i.isol == 1:
-                            Fall += 15
-                    else:
-                        i.day = i.day + 1
+            #(the recovered, infected at t-13, first: the random numbers are drawn in the order of infection of the I agents)
+            for i in InfQ.pop_Recovered( t ): #Recovered
+                i.update_Status ( 2, q ) #I--> R/D
+                if i.isol == 1:
+                    Fall += 15
+            for i in InfQ.get_Detection( t ): # Possible detection/isolation
+                pr_i = random.random()
+                if pr_i <= pA*pD: # I isolated and detected.
+                    i.set_On( 0 )
+                    i.isol = 1
+                    if i.replica != None:
+                        i.replica.set_On( 0 )
+                        i.replica.isol = 1
+                    Detected_RM_Cum[0][i.order_CUTh()] += 15
+                    
+                elif  (pA*pD) < pr_i <= ((pA*pD)+(pA*(1-pD))): #Isolated, not detected
+                    i.set_On( 0 )
+                    i.isol = 1
+                    if i.replica != None:
+                        i.replica.set_On( 0 )
+                        i.replica.isol = 1
+                elif  ((pA*pD)+(pA*(1-pD))) < pr_i <= ((pA*pD)+(pA*(1-pD))+((1-pA)*pD)): #Not isolated, detected
+                    Detected_RM_Cum[0][i.order_CUTh()] += 15
+                    
+                else: #Not isolated, not detected
+                    pass   
+            Timer.mark( 'detection' )
                                     
             #Move people jobcat==6 (servicio doméstico puertas adentro) (we assume that in case of confinement the employee stays with the employer)
             
             for i in T4: 
                 if i.isol == 1:
                     i.work = 0
-                    i.on = 0
-                    i.replica.on = 0
+                    i.set_On( 0 )
+                    i.replica.set_On( 0 )
                 elif i.isol == 2:
                     i.work = 1
-                    i.on = 0
-                    i.replica.on = 1
+                    i.set_On( 0 )
+                    i.replica.set_On( 1 )
                 else:
                     if d >= 1 and d <= 6 and (t not in [40,61,81,120,137]):
-                        i.on = 0
-                        i.replica.on = 1
+                        i.set_On( 0 )
+                        i.replica.set_On( 1 )
                         i.work = 1
                         if i.comm == 1 or i.comm == 2:
                             Mobility[ t ][0] += 1
                     else: # d == 7
                         i.work = 1
                         if i.conf == 0:
-                            i.on = 1
-                            i.replica.on = 0
+                            i.set_On( 1 )
+                            i.replica.set_On( 0 )
                         else:
-                            i.on = 0
-                            i.replica.on = 1
+                            i.set_On( 0 )
+                            i.replica.set_On( 1 )
                             
                     
             #Checking who is working at home (from those workers that always work at home)
@@ -968,6 +1888,7 @@ def LaborEpiRM( sim, a , b, tmax, B, Nm, Ks, Kns, pD, pA, q, tau0, tau1, SystRM,
                 else:
                     w_i = i.does_Work()
                     i.work = int( w_i )
+            Timer.mark( 'work' )
                 
             #Moving commuters
             
@@ -1069,34 +1990,14 @@ def LaborEpiRM( sim, a , b, tmax, B, Nm, Ks, Kns, pD, pA, q, tau0, tau1, SystRM,
                         i.work = 0
                         
                                                     
+            Timer.mark( 'commuting' )
+            
             #First round of contagion
             
-            agents_to_update = []
+            agents_to_update = SystRM.get_Infected( S_rea, tau0, B, Nm, Ks, Kns, rng )
             
-            for x in range( 51 ):
-                if len( S_rea[x] ) > 0:
-                    Nx = 0
-                    if x >= 32:
-                        Nx = max( int( SystRM.ListSU[x].get_N() ), Nm )
-                    else:
-                        Nx = int( SystRM.ListSU[x].get_N() )
-                    Ix = int( SystRM.ListSU[x].get_I() )
-                    if Ix > 0:
-                        for i in S_rea[x]:
-                            if i.on == 1:
-                                pr_i = random.random()
-                                pc = 0
-                                if i.home == 1 and (i.conf in [1,21,3]):
-                                    if i.conf == 3:
-                                        pc = 1-( (1-((B/Nx)*tau0*Ks))**Ix )
-                                    else:
-                                        pc = 1-( (1-((B/Nx)*tau0*Kns))**Ix )
-                                else:
-                                    pc = 1-( (1-((B/Nx)*tau0))**Ix )
-                                if pr_i <= pc:
-                                    agents_to_update.append( i )
+            Timer.mark( 'contagion1' )
             
-                            
             #T2_morning return
             
             for i in CommRMT2:
@@ -1155,176 +2056,656 @@ def LaborEpiRM( sim, a , b, tmax, B, Nm, Ks, Kns, pD, pA, q, tau0, tau1, SystRM,
                             
             
                             
+            Timer.mark( 'commuting', call=False )
+            
             #Second round of contagion
-               
-            for x in range( 51 ):
-                if len( S_rea[x] ) > 0:
-                    Nx = 0
-                    if x >= 32:
-                        Nx = max( int( SystRM.ListSU[x].get_N() ), Nm )
-                    else:
-                        Nx = int( SystRM.ListSU[x].get_N())
-                    Ix = int( SystRM.ListSU[x].get_I() )
-                    if Ix > 0:
-                        for i in S_rea[x]:
-                            if i.on == 1:
-                                pr_i = random.random()
-                                pc = 0
-                                if i.home == 1 and (i.conf in [1,21,3]):
-                                    if i.conf == 3:
-                                        pc = 1-( (1-((B/Nx)*tau0*Ks))**Ix )
-                                    else:
-                                        pc = 1-( (1-((B/Nx)*tau0*Kns))**Ix )
-                                else:
-                                    pc = 1-( (1-((B/Nx)*tau0))**Ix )
-                                if pr_i <= pc:
-                                    agents_to_update.append( i )
-                                                        
+            
+            agents_to_update += SystRM.get_Infected( S_rea, tau0, B, Nm, Ks, Kns, rng )
                         
             #All the commuters return
            
+            Timer.mark( 'contagion2' )
             for i in CommRMT1 + CommRMT2_after:
                 i.back_Home()
+            Timer.mark( 'commuting', call=False )
             
             
             #Third round of contagion
-                                        
-            for x in range( 51 ):
-                if len( S_rea[x] ) > 0:
-                    Nx = 0
-                    if x >= 32:
-                        Nx = max( int( SystRM.ListSU[x].get_N() ), Nm )
-                    else:
-                        Nx = int( SystRM.ListSU[x].get_N())
-                    Ix = int( SystRM.ListSU[x].get_I() )
-                    if Ix > 0:
-                        for i in S_rea[x]:
-                            if i.on == 1:
-                                pr_i = random.random()
-                                pc = 0
-                                if i.home == 1 and (i.conf in [1,21,3]):
-                                    if i.conf == 3:
-                                        pc = 1-( (1-((B/Nx)*tau1*Ks))**Ix )
-                                    else:
-                                        pc = 1-( (1-((B/Nx)*tau1*Kns))**Ix )
-                                else:
-                                    pc = 1-( (1-((B/Nx)*tau1))**Ix )
-                                if pr_i <= pc:
-                                    agents_to_update.append( i )
-                                
             
+            agents_to_update += SystRM.get_Infected( S_rea, tau1, B, Nm, Ks, Kns, rng )
+            
+            Timer.mark( 'contagion3' )
+            
+            NewI = [] #newly infected agents (not replicas)
             for i in agents_to_update:
                 if i.status == 0:
                     i.update_Status( 1, q )
                     if i.home == 1:
-                        I_rea.append( i )
+                        NewI.append( i )
                         
                         S_rea[i.su].remove( i )
                         if i.replica != None:
                             S_rea[ i.replica.su ].remove( i.replica )
                     else:
-                        I_rea.append( i.replica )
+                        NewI.append( i.replica )
                         
                         S_rea[i.replica.su].remove( i.replica )
                         S_rea[i.su].remove( i )
+            InfQ.add( t, NewI )
+            Timer.mark( 'infection' )
            
                         
             #Writing information rea, t, to files (if calib 1=1)
             #Output: for rea, day for each ident type (row) the distribution of 
             #agents among the compartiments {S,I,R}x{work=0,work=1,work=2}
                         
-            DistDay = np.zeros( ( 19584,9 ) )
-            S_extended = []
-            for x in range( 51 ):
-                S_extended += S_rea[x]
-            UpdateDay = S_extended + I_rea + R_rea
-            for i in UpdateDay:
-                if i.home == 1:
-                    DistDay[i.ident][i.status + int(3*i.work)] += 1
-            np.savetxt("S"+str(sim)+"_rea_"+str(rea)+"_day_"+str(t)+".csv",DistDay,delimiter=",",fmt="%s")
+            DistDay = SystRM.get_DistDay( )
+            Run.add_Day( t, DistDay )
             del( DistDay )
             
             
-            Detected_RM [t] = Detected_RM_Cum [0]
-            
+            if Run.end_Day( t, Fall ):
+                break #(the realization is stopped by the monitor)
+            Timer.mark( 'output' )
             
-            if t == 151:
-                DeadRM[rea-a][0] = Fall
                                 
             t += 1
             if d == 7:
                 d = 1
             else:
                 d += 1
+            Timer.end_Day( t-1 )
                 
         
                  
         
-        np.savetxt("S"+str(sim)+"_Mob_Tot_rea_"+str(rea)+".csv",Mobility,delimiter=",",fmt="%s")
-        np.savetxt("S"+str(sim)+"_Detected_rea_"+str(rea)+".csv",Detected_RM,delimiter=",",fmt="%s")
+        del(Mobility)
+        if Run.end_Realization( t, SystRM ): #stopped by the monitor: the realization is not saved, and no more realizations are run
+            break
+    
+        
+
+    return Run.finish( )
+
+
+
+
+def LaborEpiArrayRM( Run, SystRM, B, Nm, Ks, Kns, pD, pA, q, tau0, situation, policies, rules, crn ):
+    """ Same process as LaborEpiRM, for SystRM an (initialized) ArraySystemRM """
+    #Run: realizations, outputs and checkpoints of the run (RunRM, built by LaborEpiRM); other parameters: see LaborEpiRM
+    
+    rng = np.random.default_rng()
+    
+    Timer = Run.Timer
+    
+    Policies = PolicyTimeline( policies, rules, situation )
+    Policies.compile( SystRM )
+    
+    #Potential commuters (see LaborEpiRM)
+    T0 = SystRM.select_Residents( parse_Who( 'activ=1&jobcat!=6&comm=0' ) )
+    T1 = np.union1d( SystRM.select_Residents( parse_Who( 'activ=1&jobcat!=6&comm=3' ) ),
+                     SystRM.select_Residents( parse_Who( 'activ=1&jobcat!=6&comm=1|2&jornada=1' ) ) )
+    T2 = SystRM.select_Residents( parse_Who( 'activ=1&jobcat!=6&comm=1|2&jornada=2' ) )
+    T4 = SystRM.select_Residents( parse_Who( 'jobcat=6&comm=1|2' ) )
+    T4rep = SystRM.replica[ T4 ]
+    
+    for rea in range( Run.a , Run.b ):  #for each realization
+        
+        if Run.seed != None:
+            rng = np.random.default_rng( seed_Realization( Run.seed, rea ) )
+        Streams = RandomStreams( rng, Run.seed, rea, SystRM.nR + SystRM.nW, crn )
         
+        tau1 = 6.0/24.0 #initial time fraction of last round of contagion (it will change due to the curfew)
         
-        del(Mobility)
+        Fall = 0
         
-        SystRM.reset_Realization( )
+        State = Run.begin_Realization( rea )
+        Mobility, Detected_RM_Cum = Run.Mobility, Run.Detected_RM_Cum
+        
+        if State == None:
+            
+            InfQ = InfectionQueue( arrays=True )
+            
+            #Initial cases (March 1)
+            for x in range( 51 ):
+                if I_Init[x] > 0:
+                    rows = SystRM.rowsSU[ x ]
+                    S_Su = rows[ ( SystRM.home[ rows ] == 1 ) & ( SystRM.status[ rows ] == 0 ) ]
+                    Inx = SystRM.start_Infection( Streams.choice( 'initial', S_Su, I_Init[x] ) )
+                    Detected_RM_Cum[0][x] += 15*len( Inx )
+                    InfQ.add( -1, Inx )
+            
+            #Shifts of the T2 commuters
+            T2_morning = np.sort( Streams.choice( 'shift', T2, int( 0.5*len( T2 ) ) ) )
+            T2_afternoon = np.setdiff1d( T2, T2_morning )
+            
+            t = 0 #assumed to be March 1, Sunday
+            
+            d = 7
+        
+        else: #continues from the checkpoint
+            
+            SystRM.set_State( State['System'] )
+            Streams.set_State( State['Streams'] )
+            InfQ = State['InfQ']
+            T2_morning, T2_afternoon = State['T2']
+            t, d, tau1, Fall = State['t'], State['d'], State['tau1'], State['Fall']
+            del( State )
+        
+        Run.start_Days( t )
+        
+        while t < Run.tmax:
+            
+            #Measures of the scenario
+            
+            Streams.set_Day( t )
+            tau1 = Policies.apply_Day( SystRM, t, tau1, Streams )
+            Timer.mark( 'policies' )
+            
+            
+            #A day begins
+            #Detecting, isolating I
+            
+            I6 = InfQ.get_Detection( t ) #possible detection/isolation
+            I13 = InfQ.pop_Recovered( t ) #recovered
+            
+            pr_i = Streams.random( 'detection', I6 )
+            isolated = I6[ pr_i <= pA ]
+            detected = I6[ ( pr_i <= pA*pD ) | ( ( pA < pr_i ) & ( pr_i <= pA+((1-pA)*pD) ) ) ]
+            both = SystRM.with_Replicas( isolated )
+            SystRM.on[ both ] = 0
+            SystRM.isol[ both ] = 1
+            np.add.at( Detected_RM_Cum[0], SystRM.su[ detected ], 15 )
+            
+            dead = SystRM.end_Infection( I13, q, Streams )
+            Fall += 15*int( dead.sum() )
+            Timer.mark( 'detection' )
+            
+            #Move people jobcat==6 (servicio doméstico puertas adentro)
+            
+            isolT4 = SystRM.isol[ T4 ]
+            m = isolT4 == 1
+            SystRM.work[ T4[m] ] = 0
+            SystRM.on[ T4[m] ] = 0
+            SystRM.on[ T4rep[m] ] = 0
+            m = isolT4 == 2
+            SystRM.work[ T4[m] ] = 1
+            SystRM.on[ T4[m] ] = 0
+            SystRM.on[ T4rep[m] ] = 1
+            m = isolT4 == 0
+            SystRM.work[ T4[m] ] = 1
+            if d >= 1 and d <= 6 and (t not in [40,61,81,120,137]):
+                SystRM.on[ T4[m] ] = 0
+                SystRM.on[ T4rep[m] ] = 1
+                Mobility[ t ][0] += int( m.sum() )
+            else: # d == 7
+                free = SystRM.conf[ T4 ] == 0
+                SystRM.on[ T4[ m & free ] ] = 1
+                SystRM.on[ T4rep[ m & free ] ] = 0
+                SystRM.on[ T4[ m & ~free ] ] = 0
+                SystRM.on[ T4rep[ m & ~free ] ] = 1
+            
+            #Checking who is working at home
+            
+            m = SystRM.isol[ T0 ] == 1
+            SystRM.work[ T0[m] ] = 0
+            SystRM.work[ T0[~m] ] = SystRM.does_Work( T0[~m], Streams )
+            Timer.mark( 'work' )
+            
+            #Moving commuters
+            
+            CommRMT1 = SystRM.move_Shift( T1, d, t, Streams )
+            Mobility[ t ][0] += int( np.isin( SystRM.comm[ CommRMT1 ], [1,2] ).sum() )
+            CommRMT2 = SystRM.move_Shift( T2_morning, d, t, Streams )
+            Mobility[ t ][0] += 0.5*int( np.isin( SystRM.comm[ CommRMT2 ], [1,2] ).sum() )
+            Timer.mark( 'commuting' )
+            
+            #First round of contagion
+            
+            agents_to_update = [ SystRM.get_Infected( tau0, B, Nm, Ks, Kns, Streams ) ]
+            Timer.mark( 'contagion1' )
+            
+            #T2_morning return, T2_afternoon commute
+            
+            SystRM.back_Home( CommRMT2 )
+            CommRMT2_after = SystRM.move_Shift( T2_afternoon, d, t, Streams )
+            Mobility[ t ][0] += 0.5*int( np.isin( SystRM.comm[ CommRMT2_after ], [1,2] ).sum() )
+            Timer.mark( 'commuting', call=False )
+            
+            #Second round of contagion
+            
+            agents_to_update.append( SystRM.get_Infected( tau0, B, Nm, Ks, Kns, Streams ) )
+            Timer.mark( 'contagion2' )
+            
+            #All the commuters return
+            
+            SystRM.back_Home( CommRMT1 )
+            SystRM.back_Home( CommRMT2_after )
+            Timer.mark( 'commuting', call=False )
+            
+            #Third round of contagion
+            
+            agents_to_update.append( SystRM.get_Infected( tau1, B, Nm, Ks, Kns, Streams ) )
+            Timer.mark( 'contagion3' )
+            
+            InfQ.add( t, SystRM.start_Infection( np.concatenate( agents_to_update ) ) )
+            Timer.mark( 'infection' )
+            
+            #Writing information rea, t, to files
+            
+            DistDay = SystRM.get_DistDay( )
+            Run.add_Day( t, DistDay )
+            del( DistDay )
+            
+            if Run.end_Day( t, Fall ):
+                break #(the realization is stopped by the monitor)
+            Timer.mark( 'output' )
+            
+            t += 1
+            if d == 7:
+                d = 1
+            else:
+                d += 1
+            
+            Run.checkpoint( t, d, tau1, Fall, SystRM, Streams, InfQ=InfQ, T2=( T2_morning, T2_afternoon ) )
+            Timer.end_Day( t-1 )
+        
+        del(Mobility)
+        if Run.end_Realization( t, SystRM ): #stopped by the monitor: the realization is not saved, and no more realizations are run
+            break
+    
+    return Run.finish( )
+
+
+def LaborEpiCohortRM( Run, SystRM, B, Nm, Ks, Kns, pD, pA, q, tau0, situation, policies, rules, crn ):
+    """ Same process as LaborEpiRM, for SystRM an (initialized) CohortSystemRM """
+    #Run: realizations, outputs and checkpoints of the run (RunRM, built by LaborEpiRM); other parameters: see LaborEpiRM
+    #Each day the cells are split by the work lottery into groups whose location in each round of contagion
+    #is known (home, workplace or off), and the S of each group get infected with a single binomial draw,
+    #with the probability of being infected in at least one of the three rounds
+    
+    rng = np.random.default_rng()
+    
+    Timer = Run.Timer
+    
+    Policies = PolicyTimeline( policies, rules, situation )
+    Policies.compile( SystRM )
+    
+    Kh = np.ones( 22 ) #confinement factor at home by conf (see ArraySystemRM.K_Factor)
+    Kh[3] = Ks
+    Kh[[1,21]] = Kns
     
+    for rea in range( Run.a , Run.b ):  #for each realization
+        
+        if Run.seed != None:
+            rng = np.random.default_rng( seed_Realization( Run.seed, rea ) )
+        Streams = RandomStreams( rng, Run.seed, rea, 0, crn )
+        
+        tau1 = 6.0/24.0 #initial time fraction of last round of contagion (it will change due to the curfew)
+        
+        Fall = 0
+        
+        State = Run.begin_Realization( rea )
+        Mobility, Detected_RM_Cum = Run.Mobility, Run.Detected_RM_Cum
+        
+        if State == None:
+            
+            #Initial cases (March 1)
+            for x in range( 51 ):
+                if I_Init[x] > 0:
+                    rows = SystRM.residents_In( x )
+                    Inx = SystRM.sample_Cells( rows[ SystRM.st[ rows ] == 0 ], I_Init[x], Streams.generator( 'initial' ) )
+                    SystRM.st[ Inx ] = 1
+                    Detected_RM_Cum[0][x] += 15*I_Init[x]
+            
+            #Shifts of the T2 commuters
+            rows = np.flatnonzero( SystRM.group[ SystRM.k ] == 3 )
+            morning = SystRM.sample_Cells( rows, int( 0.5*SystRM.n[ rows ].sum() ), Streams.generator( 'shift' ) )
+            SystRM.sh[ morning ] = 1
+            
+            t = 0 #assumed to be March 1, Sunday
+            
+            d = 7
+        
+        else: #continues from the checkpoint
+            
+            SystRM.set_State( State['System'] )
+            Streams.set_State( State['Streams'] )
+            t, d, tau1, Fall = State['t'], State['d'], State['tau1'], State['Fall']
+            del( State )
+        
+        Run.start_Days( t )
         
+        while t < Run.tmax:
+            
+            #Measures of the scenario
+            
+            Streams.set_Day( t )
+            tau1 = Policies.apply_Day( SystRM, t, tau1, Streams )
+            Timer.mark( 'policies' )
+            
+            
+            #A day begins
+            #Detecting, isolating I (infected at t-6)
+            
+            rows = np.flatnonzero( ( SystRM.st == 1 ) & ( SystRM.tinf == t-6 ) )
+            M = Streams.generator( 'detection' ).multinomial( SystRM.n[ rows ], [ pA*pD, pA*(1-pD), (1-pA)*pD, (1-pA)*(1-pD) ] ).reshape( ( len( rows ), 4 ) )
+            np.add.at( Detected_RM_Cum[0], SystRM.CUTh[ SystRM.k[ rows ] ], 15*( M[:,0]+M[:,2] ) )
+            isolated = SystRM.split_Cells( rows, M[:,0]+M[:,1] )
+            SystRM.isol[ isolated ] = 1
+            
+            #Recovered or dead (infected at t-13)
+            
+            rows = np.flatnonzero( ( SystRM.st == 1 ) & ( SystRM.tinf == t-13 ) )
+            dead = Streams.generator( 'recovery' ).binomial( SystRM.n[ rows ], 1-q )
+            Dx = SystRM.split_Cells( rows, dead )
+            SystRM.isol[ rows ] = 0
+            SystRM.isol[ Dx ] = 1
+            rows = np.concatenate( ( rows, Dx ) )
+            SystRM.st[ rows ] = 2
+            SystRM.tinf[ rows ] = -1
+            Fall += 15*int( dead.sum() )
+            Timer.mark( 'detection' )
+            
+            #Who is working: T0, T1, T2 (not isolated) by the work lottery, T4 (not isolated) always
+            
+            k = SystRM.k
+            g = SystRM.group[ k ]
+            Wr = np.zeros( ( len( k ), 3 ), dtype=np.int64 )
+            Wr[:,0] = SystRM.n
+            m = np.flatnonzero( ( g >= 1 ) & ( g <= 3 ) & ( SystRM.isol != 1 ) )
+            Wr[ m ] = SystRM.does_Work( m, Streams.generator( 'work' ) )
+            m = ( g == 4 ) & ( SystRM.isol != 1 )
+            Wr[ m, 1 ] = SystRM.n[ m ]
+            Wr[ m, 0 ] = 0
+            Timer.mark( 'work' )
+            
+            #Groups of residents (cell, Wr) and their location in each round (0 off, 1 home, 2 workplace)
+            
+            rows, work = np.nonzero( Wr )
+            cnt = Wr[ rows, work ]
+            kg = k[ rows ]
+            gg = g[ rows ]
+            isol = SystRM.isol[ rows ]
+            status = SystRM.st[ rows ]
+            loc = np.ones( ( 3, len( rows ) ), dtype=np.int8 )
+            loc[ :, isol == 1 ] = 0
+            
+            #jobcat==6 (servicio doméstico puertas adentro)
+            m = ( gg == 4 ) & ( isol != 1 )
+            if d >= 1 and d <= 6 and (t not in [40,61,81,120,137]):
+                Mobility[ t ][0] += int( cnt[ m & ( isol == 0 ) ].sum() )
+            else: # d == 7
+                m &= ( isol == 2 ) | ( SystRM.hc[ rows ] != 0 )
+            loc[ :, m ] = 2
+            
+            #commuters
+            if d <= 5 and (t not in [40,61,81,120,137]):
+                closed = np.zeros( len( rows ), dtype=bool )
+            elif d == 6 or (t in [40,120,137]):
+                closed = np.isin( SystRM.rama[ kg ], [11,15,16,21] )
+            else: #d == 7 or (t in [61,81])
+                closed = np.isin( SystRM.rama[ kg ], [3,6,10,11,12,13,14,15,16,19,20,21] )
+            moved = ( ( gg == 2 ) | ( gg == 3 ) ) & ( isol == 0 ) & ( work == 1 ) & ~closed
+            m = moved & ( gg == 2 )
+            loc[ 0:2, m ] = np.where( SystRM.hasRep[ kg[m] ], 2, 0 ) #comm=3 are out of the RM
+            Mobility[ t ][0] += int( cnt[ m & SystRM.hasRep[ kg ] ].sum() )
+            m = moved & ( gg == 3 )
+            loc[ 0, m & ( SystRM.sh[ rows ] == 1 ) ] = 2
+            loc[ 1, m & ( SystRM.sh[ rows ] == 0 ) ] = 2
+            Mobility[ t ][0] += 0.5*int( cnt[ m ].sum() )
+            Timer.mark( 'commuting' )
+            
+            #Three rounds of contagion
+            
+            pS = np.ones( len( rows ) ) #probability of not being infected
+            S = status == 0
+            Khome = Kh[ SystRM.hc[ rows ] ]
+            for r, tau in enumerate( [ tau0, tau0, tau1 ] ):
+                su = np.where( loc[r] == 2, SystRM.CUTw[ kg ], SystRM.CUTh[ kg ] )
+                on = loc[r] > 0
+                N = np.bincount( su[ on ], weights=cnt[ on ], minlength=SystRM.nSU )
+                I = np.bincount( su[ on & ( status == 1 ) ], weights=cnt[ on & ( status == 1 ) ], minlength=SystRM.nSU )
+                N[32:] = np.maximum( N[32:], Nm )
+                Sx = on & S & ( I[ su ] > 0 )
+                x = su[ Sx ]
+                K = np.where( loc[r][ Sx ] == 2, 1.0, Khome[ Sx ] )
+                pS[ Sx ] *= (1-((B/N[x])*tau*K))**I[x]
+                Timer.mark( 'contagion'+str( r+1 ) )
+            newI = np.zeros( len( rows ), dtype=np.int64 )
+            newI[ S ] = Streams.generator( 'contagion' ).binomial( cnt[ S ], 1-pS[ S ] )
+            Inx = SystRM.split_Cells( np.arange( len( k ) ), np.bincount( rows, weights=newI, minlength=len( k ) ).astype( np.int64 ) )
+            SystRM.st[ Inx ] = 1
+            SystRM.tinf[ Inx ] = t
+            SystRM.merge_Cells( ) #(once a day)
+            Timer.mark( 'infection' )
+            
+            #Writing information rea, t, to files (from the groups of the day, before the new infections)
+            
+            cell = SystRM.ident[ kg ].astype( np.int64 )*9 + status + 3*work
+            DistDay = np.bincount( np.concatenate( ( cell, cell+1 ) ), weights=np.concatenate( ( cnt-newI, newI ) ), minlength=SystRM.nTypes*9 )
+            DistDay = DistDay.reshape( ( SystRM.nTypes, 9 ) )
+            Run.add_Day( t, DistDay )
+            del( DistDay )
+            
+            if Run.end_Day( t, Fall ):
+                break #(the realization is stopped by the monitor)
+            Timer.mark( 'output' )
+            
+            t += 1
+            if d == 7:
+                d = 1
+            else:
+                d += 1
+            
+            Run.checkpoint( t, d, tau1, Fall, SystRM, Streams )
+            Timer.end_Day( t-1 )
+        
+        del(Mobility)
+        if Run.end_Realization( t, SystRM ): #stopped by the monitor: the realization is not saved, and no more realizations are run
+            break
+    
+    return Run.finish( )
 
-    np.savetxt("S"+str(sim)+"_Dead_a_"+str(a)+"_b_"+str(b)+".csv",DeadRM,delimiter=",",fmt="%s")
 
 
+"""
+Parallel realizations
+--------------------------------------------------------------------
+LaborEpiPoolRM runs the realizations of LaborEpiRM in a pool of processes,
+LaborEpiBranchRM the realizations of several scenarios that continue from the same checkpoints.
+"""
+PoolRM = None #system (SystemRM, ArraySystemRM or CohortSystemRM) of a worker process of LaborEpiPoolRM
+
+
+def init_PoolRM( data1, data2, backend, cache=None ):
+    #initializer of each worker process: creates and initializes its system once (from the build cache, if any)
+    global PoolRM
+    PoolRM = [ SystemRM, ArraySystemRM, CohortSystemRM ][ backend ]( data1=data1, data2=data2 )
+    PoolRM.InitialSystem( cache=cache )
+
+
+def rea_PoolRM( rea, params ):
+    #runs realization rea in a worker process, returns rea and D at t=151
+    DeadRea = LaborEpiRM( a=rea, b=rea+1, SystRM=PoolRM, saveDead=False, **params )
+    return rea, DeadRea[0][0]
+
+
+def aggregate_PoolRM( reas, params, realizations, data2 ):
+    #runs the realizations reas in a worker process with its own aggregators (OutcomeProcessSIRLabor.Aggregators, for
+    #realizations 0,...,realizations-1, not written by the worker), returns [ (rea, D at t=151) ] and the aggregators
+    Aggs = OutcomeProcessSIRLabor.Aggregators( params['sim'], realizations, params['tmax'], data2, None )
+    Dead = []
+    for rea in reas:
+        DeadRea = LaborEpiRM( a=rea, b=rea+1, SystRM=PoolRM, saveDead=False, aggregators=Aggs, **params )
+        Dead.append( ( rea, DeadRea[0][0] ) )
+    return Dead, Aggs
+
+
+def LaborEpiPoolRM( sim, a , b, tmax, B, Nm, Ks, Kns, pD, pA, q, tau0, tau1, data1, data2, situation, seed, backend=0, workers=None, output=0, policies='Policies_MP.csv', rules='PolicyRules_MP.csv', cache=None, crn=False, checkpoints=(), restart=None, origin=None, timing=0, aggregate=False ):
+    """
+    Runs the realizations a,...,b-1 of LaborEpiRM in a pool of (workers) processes,
+    and writes the same outcome files. Each worker creates the system once
+    (backend=0 SystemRM, =1 ArraySystemRM, =2 CohortSystemRM, from data1 and data2) and runs one
+    realization at a time. Realization rea is run with seed_Realization( seed, rea ),
+    so the outcomes are the same as those of LaborEpiRM( ..., seed=seed ),
+    whatever the number of workers.
+    workers: number of processes (None: number of cores)
+    output, policies, rules, crn, checkpoints, restart, origin, timing: see LaborEpiRM
+    cache: folder of the build cache of the system (see SystemRM.InitialSystem), built here
+    before starting the workers if it does not exist yet
+    aggregate: =True also computes the outcomes of OutcomeProcessSIRLabor (see LaborEpiBranchRM)
+    Returns DeadRM, or None if the options can not be used with this backend (see check_Options)
+    """
+    params = dict( sim=sim, tmax=tmax, situation=situation, checkpoints=checkpoints, restart=restart, origin=origin, timing=timing )
+    DeadRM = LaborEpiBranchRM( [ params ], origin=None, restart=None, a=a, b=b, B=B, Nm=Nm, Ks=Ks, Kns=Kns, pD=pD, pA=pA, q=q, tau0=tau0, tau1=tau1,
+                               data1=data1, data2=data2, seed=seed, backend=backend, workers=workers, output=output, policies=policies, rules=rules,
+                               cache=cache, crn=crn, aggregate=aggregate )
+    if DeadRM == None:
+        return None
+    return DeadRM[0]
+
+
+def LaborEpiBranchRM( branches, origin, restart, a , b, B, Nm, Ks, Kns, pD, pA, q, tau0, tau1, data1, data2, seed, backend=1, workers=None, output=0, policies='Policies_MP.csv', rules='PolicyRules_MP.csv', cache=None, crn=False, timing=0, aggregate=False ):
+    """
+    Runs the realizations a,...,b-1 of several scenarios (branches) in one pool
+    of (workers) processes (see LaborEpiPoolRM). Each branch continues from the
+    checkpoints of day restart of the simulation origin (see LaborEpiRM),
+    e.g. the realizations of S0 saved at the end of day 25 (checkpoints=[25]),
+    when S2 begins to differ from S0, so that the days they share are simulated once.
+    branches: list of dicts with the parameters sim, tmax and situation of each branch
+    (and optionally checkpoints, restart and origin, instead of those given here)
+    aggregate: =True the realizations of each branch are split among the workers, each one with its own
+    aggregators (OutcomeProcessSIRLabor.Aggregators), which are merged (Agg.merge) and then write the
+    outcome files of the branch (Agg.finish)
+    Returns the list of DeadRM of the branches (also written to the file of D of each branch), or None if the
+    options can not be used with this backend (see check_Options; checked before starting the workers)
+    """
+    for branch in branches:
+        if not check_Options( backend, seed, crn, branch.get( 'checkpoints', () ), branch.get( 'restart', restart ) ):
+            return None
+    common = dict( B=B, Nm=Nm, Ks=Ks, Kns=Kns, pD=pD, pA=pA, q=q, tau0=tau0, tau1=tau1, seed=seed, output=output, policies=policies, rules=rules, crn=crn, restart=restart, origin=origin, timing=timing )
+    DeadRM = [ np.full( ( (b-a),1 ), np.nan ) for branch in branches ]
+    if cache != None and backend < 2: #(CohortSystemRM has no build cache)
+        name = [ 'SystemRM', 'ArraySystemRM' ][ backend ]
+        if not os.path.exists( cache_Path( cache, name, data1, data2 )+[ ".pkl", "" ][ backend ] ):
+            init_PoolRM( data1, data2, backend, cache )
+    Aggs = [ None for branch in branches ] #merged aggregators of each branch (aggregate)
+    nw = workers if workers != None else os.cpu_count( )
+    with concurrent.futures.ProcessPoolExecutor( max_workers=workers, initializer=init_PoolRM, initargs=( data1, data2, backend, cache ) ) as pool:
+        jobs = {}
+        for k, branch in enumerate( branches ):
+            params = dict( common, **branch )
+            if aggregate:
+                for w in range( nw ):
+                    jobs[ pool.submit( aggregate_PoolRM, range( a+w, b, nw ), params, b, data2 ) ] = k
+            else:
+                for rea in range( a, b ):
+                    jobs[ pool.submit( rea_PoolRM, rea, params ) ] = k
+        for job in jobs: #(in the order of submission, so the aggregators are always merged in the same order)
+            k = jobs[ job ]
+            if aggregate:
+                Dead, Part = job.result()
+                if Aggs[k] == None:
+                    Aggs[k] = Part
+                else:
+                    for Agg, Other in zip( Aggs[k], Part ):
+                        Agg.merge( Other )
+            else:
+                Dead = [ job.result() ]
+            for rea, D in Dead:
+                DeadRM[k][rea-a][0] = D
+    for k, branch in enumerate( branches ):
+        if aggregate:
+            for Agg in Aggs[k]:
+                Agg.finish( )
+        np.savetxt("S"+str(branch['sim'])+"_Dead_a_"+str(a)+"_b_"+str(b)+".csv",DeadRM[k],delimiter=",",fmt="%s")
+    return DeadRM
 
 
 ## Parameters setup for simulation
 
+if __name__ == "__main__":
 
-data1_s='Data1_MP.csv'
-data2_s='Data2_MP.csv'
 
-a_s = 0 #first number of realization
-b_s = 2 #total number of realizations 
-#a_s and b_s can be set to any numbers, a_s < b_s; realizations in range( a_s, b_s )
-#but the names of the output files will consider these numbers, so it is possible
-#to run in different computers or cores different realizations of the same process
-#however, the random.seed for replication assumes that all the corresponding
-#realizations are run together.
+    data1_s='Data1_MP.csv'
+    data2_s='Data2_MP.csv'
+    policies_s='Policies_MP.csv' #measures of each scenario (situation_s)
+    rules_s='PolicyRules_MP.csv' #pConf rules used by the measures
+    cache_s='CacheRM' #folder of the build cache of the system (None: the system is built from data1_s, data2_s in each run)
 
-tmax_s = 154 #154 for S0 and calibration, 183 for S1, 275 for S2
+    a_s = 0 #first number of realization
+    b_s = 2 #total number of realizations 
+    #a_s and b_s can be set to any numbers, a_s < b_s; realizations in range( a_s, b_s )
+    #but the names of the output files will consider these numbers, so it is possible
+    #to run in different computers or cores different realizations of the same process
+    #for replication set seed_s (each realization is seeded from seed_s and its number),
+    #otherwise the realizations are not reproducible.
 
-Kns_s = 0.56
-pD_s = 1 #recall that the probability of detection is estimated ex-post (this is only valid for S0)
-tau0_s = 6.0/24.0
-tau1_s = 6.0/24.0 #initial value
-q_s = 0.996
-Nm_s = 10530 #this affects only small villages outside Great Santiago, ad-hoc to this implementation.
-             #to remove this assumption, set Nm_s=0.
+    tmax_s = 154 #154 for S0 and calibration, 183 for S1, 275 for S2
 
-situation_s = 0 #0 for actual scenario S0, 1 for scenario without lockdown, 2 for scenario with full lockdown
-                #any number different: scenario with any measure.
+    Kns_s = 0.56
+    pD_s = 1 #recall that the probability of detection is estimated ex-post (this is only valid for S0)
+    tau0_s = 6.0/24.0
+    tau1_s = 6.0/24.0 #initial value
+    q_s = 0.996
+    Nm_s = 10530 #this affects only small villages outside Great Santiago, ad-hoc to this implementation.
+                 #to remove this assumption, set Nm_s=0.
 
-B_s = 0.23    #contagion parameter. =0.23 calibrated value in our implementation
-pA_s = 0.05   #probability of isolation (infected agents). =0.05 calibrated value in our implementation
-Ks_s = 0.10   #strict confinement factor (for conf=3, at home). =0.10 calibrated value in our implementation
+    situation_s = 0 #0 for actual scenario S0, 1 for scenario without lockdown, 2 for scenario with full lockdown
+                    #any number different: scenario with any measure (or the scenario with that number in policies_s).
 
+    B_s = 0.23    #contagion parameter. =0.23 calibrated value in our implementation
+    pA_s = 0.05   #probability of isolation (infected agents). =0.05 calibrated value in our implementation
+    Ks_s = 0.10   #strict confinement factor (for conf=3, at home). =0.10 calibrated value in our implementation
 
-sim_s = "001" #"001" for S0, "002" for S1, "0031" for S2 
 
-t1=time.time()
+    sim_s = "001" #"001" for S0, "002" for S1, "0031" for S2 
 
-print("Initiating simulation")
+    backend_s = 0 #=0 population of Agent instances (SystemRM), =1 struct-of-arrays population (ArraySystemRM),
+                  #=2 counts of agents by type and state (CohortSystemRM, same distribution of outcomes, much faster)
 
-#Create initial system
+    seed_s = None #base seed of the realizations (None: not reproducible)
+    crn_s = False #=True common random numbers (requires seed_s and backend_s 1 or 2): the realizations of the scenarios
+                  #run with the same seed_s are paired (low-variance differences between scenarios)
+    checkpoints_s = [] #days at whose end the state of each realization is saved (backend_s 1 or 2), e.g. [25]
+    restart_s = None #None, or day of the checkpoints from which the realizations continue (see LaborEpiRM)
+    origin_s = None #simulation (sim_s) of the checkpoints of restart_s (None: sim_s, to continue a stopped run;
+                    #another one to run sim_s as a branch of it, e.g. "001" for S2 from day 26 on, restart_s = 25)
+    timing_s = 0 #=1 writes the time of each phase of the day by realization (S_Timing_rea_u.csv), =2 also the peak memory by day
+    workers_s = 1 #number of processes; >1 runs the realizations in parallel (LaborEpiPoolRM, requires seed_s)
+    output_s = 0 #=0 daily text files S_rea_day.csv, =1 one binary file S_rea.npy per realization, =2 none, =3 no files at all
+    aggregate_s = 0 #=1 computes the outcomes of OutcomeProcessSIRLabor during the simulation (requires a_s=0)
 
-RM = SystemRM( data1=data1_s, data2=data2_s )
-RM.InitialSystem()
+    t1=time.time()
 
+    print("Initiating simulation")
 
-#simulation
-               
-LaborEpiRM( sim=sim_s, a=a_s , b=b_s, tmax=tmax_s, B=B_s, Nm=Nm_s, Ks=Ks_s, Kns=Kns_s, pD=pD_s, pA=pA_s, q=q_s, tau0=tau0_s, tau1=tau1_s, SystRM=RM, situation=situation_s ) 
-RM.reset_Realization( )
+    #Create initial system
+
+    if workers_s > 1:
+    
+        LaborEpiPoolRM( sim=sim_s, a=a_s , b=b_s, tmax=tmax_s, B=B_s, Nm=Nm_s, Ks=Ks_s, Kns=Kns_s, pD=pD_s, pA=pA_s, q=q_s, tau0=tau0_s, tau1=tau1_s, data1=data1_s, data2=data2_s, situation=situation_s, seed=seed_s, backend=backend_s, workers=workers_s, output=output_s, policies=policies_s, rules=rules_s, cache=cache_s, crn=crn_s, checkpoints=checkpoints_s, restart=restart_s, origin=origin_s, timing=timing_s, aggregate=aggregate_s == 1 )
+
+    elif check_Options( backend_s, seed_s, crn_s, checkpoints_s, restart_s ): #(before building the system)
+    
+        RM = [ SystemRM, ArraySystemRM, CohortSystemRM ][ backend_s ]( data1=data1_s, data2=data2_s )
+        RM.InitialSystem( cache=cache_s )
+    
+    
+        #simulation
+                   
+        Aggs = []
+        if aggregate_s == 1:
+            Aggs = OutcomeProcessSIRLabor.Aggregators( sim=sim_s, realizations=b_s, days=tmax_s, data2=data2_s )
+                   
+        LaborEpiRM( sim=sim_s, a=a_s , b=b_s, tmax=tmax_s, B=B_s, Nm=Nm_s, Ks=Ks_s, Kns=Kns_s, pD=pD_s, pA=pA_s, q=q_s, tau0=tau0_s, tau1=tau1_s, SystRM=RM, situation=situation_s, seed=seed_s, output=output_s, aggregators=Aggs, policies=policies_s, rules=rules_s, crn=crn_s, checkpoints=checkpoints_s, restart=restart_s, origin=origin_s, timing=timing_s ) 
+        RM.reset_Realization( )
+        
+        for Agg in Aggs:
+            Agg.finish( )
 
-print ( "End", "processing time seconds",time.time()-t1 )
+    print ( "End", "processing time seconds",time.time()-t1 )
 
 
 